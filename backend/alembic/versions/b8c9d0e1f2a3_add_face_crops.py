@@ -0,0 +1,33 @@
+"""add_face_crops
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2026-10-17 16:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'b8c9d0e1f2a3'
+down_revision: Union[str, None] = 'a7b8c9d0e1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'face_crops',
+        sa.Column('face_id', sa.Uuid(), nullable=False),
+        sa.Column('pack', sa.String(length=100), nullable=False),
+        sa.Column('pack_offset', sa.BigInteger(), nullable=False),
+        sa.Column('length', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('face_id'),
+    )
+    op.create_index('ix_face_crops_pack', 'face_crops', ['pack'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_face_crops_pack', table_name='face_crops')
+    op.drop_table('face_crops')
@@ -0,0 +1,46 @@
+"""add_phone_suffixes
+
+Таблица суффиксов номеров для поиска по части номера через индекс
+и заполнение её из существующих message_phones.
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2026-10-17 12:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'e5f6a7b8c9d0'
+down_revision: Union[str, None] = 'd4e5f6a7b8c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MIN_SUFFIX = 3
+MAX_PHONE_LEN = 15
+
+
+def upgrade() -> None:
+    op.create_table(
+        'phone_suffixes',
+        sa.Column('suffix', sa.String(length=15), nullable=False),
+        sa.Column('phone', sa.String(length=15), nullable=False),
+        sa.PrimaryKeyConstraint('suffix', 'phone'),
+    )
+
+    # Суффикс, начинающийся с позиции n: SUBSTRING(phone, n), пока длина >= MIN_SUFFIX
+    positions = " UNION ALL ".join(f"SELECT {n} AS n" for n in range(1, MAX_PHONE_LEN + 1))
+    op.execute(
+        f"""
+        INSERT IGNORE INTO phone_suffixes (suffix, phone)
+        SELECT SUBSTRING(p.phone, pos.n), p.phone
+        FROM (SELECT DISTINCT phone FROM message_phones) AS p
+        JOIN ({positions}) AS pos ON CHAR_LENGTH(p.phone) - pos.n + 1 >= {MIN_SUFFIX}
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('phone_suffixes')
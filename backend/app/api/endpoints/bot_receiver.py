@@ -2,7 +2,9 @@
 Endpoint для приёма данных от бота (внутренний API).
 """
 import asyncio
+import base64
 import hashlib
+import json
 import uuid
 from datetime import datetime
 from zoneinfo import ZoneInfo
@@ -15,27 +17,22 @@ from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.models import Group, Message, MessagePhone
+from app.core.config import settings
 from app.core.database import get_db
-from app.services.storage_service import save_photo_to_qnap
+from app.services.storage_service import discard_spooled_photo, spool_upload
+from app.services.blob_store import commit_spooled_blob, release_unwritten, save_blob
 from app.services.phone_utils import extract_phones as extract_phones_util
+from app.services.phone_index import index_phones
+from app.services import bulk_writer, dedup_filter, group_cache, outbox, text_search
+from app.services.group_cache import CachedGroup
 
 router = APIRouter()
 
 LOCAL_TZ = ZoneInfo("Europe/Kyiv")
-MYSQL_DEADLOCK_CODES = {1205, 1213}
 MESSAGE_UNIQUE_CONSTRAINTS = {"uq_group_telegram_msg", "uq_group_external_msg"}
 SUPPORTED_SOURCE_PLATFORMS = {"telegram", "signal", "whatsapp"}
 
 
-def _is_mysql_deadlock(error: Exception) -> bool:
-    if not isinstance(error, OperationalError):
-        return False
-    original = getattr(error, "orig", None)
-    if isinstance(original, pymysql.MySQLError) and original.args:
-        return original.args[0] in MYSQL_DEADLOCK_CODES
-    return False
-
-
 def _is_duplicate_message_error(error: Exception) -> bool:
     if not isinstance(error, IntegrityError):
         return False
@@ -54,6 +51,10 @@ def _as_text(value: Any) -> str:
     return str(value)
 
 
+def _sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
 def _normalize_platform(value: Any) -> str:
     platform = _as_text(value).strip().lower() or "telegram"
     if platform not in SUPPORTED_SOURCE_PLATFORMS:
@@ -61,6 +62,79 @@ def _normalize_platform(value: Any) -> str:
     return platform
 
 
+def _parse_timestamp(value: str) -> datetime:
+    try:
+        ts = datetime.fromisoformat(value)
+        if ts.tzinfo is not None:
+            ts = ts.astimezone(LOCAL_TZ).replace(tzinfo=None)
+        return ts
+    except (ValueError, TypeError):
+        return datetime.now(LOCAL_TZ).replace(tzinfo=None)
+
+
+def _parse_message_fields(payload: dict[str, str]) -> dict[str, Any]:
+    """Разбирает и валидирует поля одного сообщения (общий код для /message и /messages:batch)."""
+    source_platform = _normalize_platform(payload.get("source_platform"))
+    group_external_id = _as_text(payload.get("group_external_id") or payload.get("group_telegram_id")).strip()
+    if not group_external_id:
+        raise HTTPException(status_code=400, detail="group_external_id is required")
+
+    message_id = _as_text(payload.get("message_id")).strip()
+    if not message_id:
+        raise HTTPException(status_code=400, detail="message_id is required")
+
+    sender_telegram_id = _as_text(payload.get("sender_telegram_id")).strip()
+    source_account_id = _as_text(payload.get("source_account_id")).strip()
+    src_account_uuid = None
+    if source_account_id:
+        try:
+            src_account_uuid = uuid.UUID(source_account_id)
+        except ValueError:
+            pass
+
+    return {
+        "source_platform": source_platform,
+        "group_external_id": group_external_id,
+        "group_name": _as_text(payload.get("group_name")).strip(),
+        "message_id": message_id,
+        "telegram_message_id": int(message_id) if source_platform == "telegram" and message_id.isdigit() else None,
+        "sender_telegram_id": sender_telegram_id,
+        "sender_external_id": _as_text(payload.get("sender_external_id") or sender_telegram_id).strip(),
+        "sender_name": _as_text(payload.get("sender_name")).strip(),
+        "text": _as_text(payload.get("text")),
+        "timestamp": _parse_timestamp(_as_text(payload.get("timestamp")).strip()),
+        "source_account_id": src_account_uuid,
+        "source_type": _as_text(payload.get("source_type")).strip() or "bot",
+        "document_text": _as_text(payload.get("document_text")),
+        "document_name": _as_text(payload.get("document_name")).strip(),
+    }
+
+
+def _build_message(fields: dict[str, Any], group_id: uuid.UUID, photo_path: str | None, photo_hash: str | None) -> Message:
+    document_text = fields["document_text"]
+    return Message(
+        id=uuid.uuid4(),
+        group_id=group_id,
+        telegram_message_id=fields["telegram_message_id"],
+        external_message_id=fields["message_id"] or None,
+        sender_telegram_id=int(fields["sender_telegram_id"]) if fields["sender_telegram_id"].isdigit() else None,
+        sender_external_id=fields["sender_external_id"] or None,
+        sender_name=fields["sender_name"] or None,
+        text=fields["text"] or None,
+        has_photo=photo_path is not None,
+        photo_path=photo_path,
+        photo_hash=photo_hash,
+        timestamp=fields["timestamp"],
+        imported_from_backup=False,
+        photo_processed_at=None,
+        source_platform=fields["source_platform"],
+        source_account_id=fields["source_account_id"],
+        source_type=fields["source_type"],
+        document_text=document_text[:50000] if document_text else None,
+        document_name=fields["document_name"] or None,
+    )
+
+
 async def _parse_request_payload(request: Request) -> tuple[dict[str, str], UploadFile | None]:
     content_type = request.headers.get("content-type", "").lower()
     if "application/json" in content_type:
@@ -89,7 +163,7 @@ async def _resolve_group(
     source_platform: str,
     group_external_id: str,
     group_name: str,
-) -> Group:
+) -> CachedGroup:
     group = None
     telegram_id = None
     if source_platform == "telegram":
@@ -98,6 +172,11 @@ async def _resolve_group(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid Telegram group ID")
 
+    cached = await group_cache.get_group(source_platform, group_external_id)
+    if cached is not None and (not group_name or cached.name == group_name):
+        return cached
+
+    if telegram_id is not None:
         result = await db.execute(select(Group).where(Group.telegram_id == telegram_id))
         group = result.scalar_one_or_none()
 
@@ -122,7 +201,7 @@ async def _resolve_group(
         db.add(group)
         await db.commit()
         await db.refresh(group)
-        return group
+        return await _cache_group(source_platform, group_external_id, group)
 
     changed = False
     if group.source_platform != source_platform:
@@ -142,12 +221,21 @@ async def _resolve_group(
         await db.commit()
         await db.refresh(group)
 
-    return group
+    return await _cache_group(source_platform, group_external_id, group)
+
+
+async def _cache_group(source_platform: str, group_external_id: str, group: Group) -> CachedGroup:
+    snapshot = CachedGroup.from_group(group)
+    await group_cache.set_group(source_platform, group_external_id, snapshot)
+    return snapshot
 
 
 async def _commit_message_with_retry(db: AsyncSession, msg: Message) -> bool:
     for attempt in range(3):
         db.add(msg)
+        # Задача в outbox — в той же транзакции (после rollback добавляется заново)
+        if msg.photo_path:
+            outbox.stage_photo_tasks(db, [bulk_writer.photo_task_args(msg)])
         try:
             await db.commit()
             return True
@@ -158,7 +246,7 @@ async def _commit_message_with_retry(db: AsyncSession, msg: Message) -> bool:
             raise
         except OperationalError as exc:
             await db.rollback()
-            if not _is_mysql_deadlock(exc) or attempt == 2:
+            if not bulk_writer.is_mysql_deadlock(exc) or attempt == 2:
                 raise
             await asyncio.sleep(0.2 * (attempt + 1))
     return False
@@ -171,130 +259,317 @@ async def receive_bot_message(
 ):
     """Принимает сообщение от бота/telethon и сохраняет в БД."""
     payload, photo = await _parse_request_payload(request)
+    fields = _parse_message_fields(payload)
 
-    source_platform = _normalize_platform(payload.get("source_platform"))
-    group_external_id = _as_text(payload.get("group_external_id") or payload.get("group_telegram_id")).strip()
-    if not group_external_id:
-        raise HTTPException(status_code=400, detail="group_external_id is required")
-
-    group_name = _as_text(payload.get("group_name")).strip()
-    message_id = _as_text(payload.get("message_id")).strip()
-    if not message_id:
-        raise HTTPException(status_code=400, detail="message_id is required")
-
-    sender_telegram_id = _as_text(payload.get("sender_telegram_id")).strip()
-    sender_external_id = _as_text(payload.get("sender_external_id") or sender_telegram_id).strip()
-    sender_name = _as_text(payload.get("sender_name")).strip()
-    text = _as_text(payload.get("text"))
-    timestamp = _as_text(payload.get("timestamp")).strip()
-    source_account_id = _as_text(payload.get("source_account_id")).strip()
-    source_type = _as_text(payload.get("source_type")).strip() or "bot"
-    document_text = _as_text(payload.get("document_text"))
-    document_name = _as_text(payload.get("document_name")).strip()
-
-    group = await _resolve_group(db, source_platform, group_external_id, group_name)
+    group = await _resolve_group(db, fields["source_platform"], fields["group_external_id"], fields["group_name"])
 
     if not group.is_approved:
         return {"ok": False, "status": "pending_approval"}
 
-    tg_msg_id = int(message_id) if source_platform == "telegram" and message_id.isdigit() else None
-    external_message_id = message_id
+    tg_msg_id = fields["telegram_message_id"]
+    external_message_id = fields["message_id"]
+
+    # Pre-check в Redis: в БД идём только при положительном ответе фильтра
+    tg_key, ext_key = None, None
     if tg_msg_id is not None:
+        tg_key = dedup_filter.message_keys(group.id, telegram_message_id=tg_msg_id)[0]
+    if external_message_id:
+        ext_key = dedup_filter.message_keys(group.id, external_message_id=external_message_id)[0]
+    seen = await dedup_filter.check([key for key in (tg_key, ext_key) if key])
+    if dedup_filter.HOT in seen.values():
+        return {"ok": True, "duplicate": True}
+
+    if tg_msg_id is not None and seen[tg_key] == dedup_filter.MAYBE:
         dup = await db.execute(
-            select(Message).where(
+            select(Message.id).where(
                 Message.group_id == group.id,
                 Message.telegram_message_id == tg_msg_id
-            )
+            ).limit(1)
         )
         if dup.scalar_one_or_none():
+            await dedup_filter.add([tg_key])
             return {"ok": True, "duplicate": True}
-    if external_message_id:
+    if external_message_id and seen[ext_key] == dedup_filter.MAYBE:
         dup = await db.execute(
-            select(Message).where(
+            select(Message.id).where(
                 Message.group_id == group.id,
                 Message.external_message_id == external_message_id,
-            )
+            ).limit(1)
         )
         if dup.scalar_one_or_none():
+            await dedup_filter.add([ext_key])
             return {"ok": True, "duplicate": True}
 
-    ts = None
-    try:
-        ts = datetime.fromisoformat(timestamp)
-        if ts.tzinfo is not None:
-            ts = ts.astimezone(LOCAL_TZ).replace(tzinfo=None)
-    except (ValueError, TypeError):
-        ts = datetime.now(LOCAL_TZ).replace(tzinfo=None)
-
     photo_path = None
-    has_photo = False
     photo_hash = None
     if photo:
-        photo_data = await photo.read()
-        if photo_data:
-            photo_hash = hashlib.sha256(photo_data).hexdigest()
-            dup_photo = await db.execute(select(Message).where(Message.photo_hash == photo_hash))
-            if dup_photo.scalars().first():
+        # Загрузка потоково пишется во временный файл, SHA-256 считается по ходу
+        spooled = await spool_upload(photo)
+        if spooled:
+            photo_hash = spooled.sha256
+            # Дубликат — то же фото в этой же группе; из других групп распознавание переиспользуется
+            photo_key = dedup_filter.photo_key(group.id, photo_hash)
+            photo_seen = (await dedup_filter.check([photo_key]))[photo_key]
+            is_duplicate = photo_seen == dedup_filter.HOT
+            if photo_seen == dedup_filter.MAYBE:
+                dup_photo = await db.execute(
+                    select(Message.id)
+                    .where(Message.group_id == group.id, Message.photo_hash == photo_hash)
+                    .limit(1)
+                )
+                is_duplicate = dup_photo.scalars().first() is not None
+            if is_duplicate:
+                await asyncio.to_thread(discard_spooled_photo, spooled.tmp_path)
                 return {"ok": True, "duplicate": True, "reason": "photo_duplicated"}
 
-            has_photo = True
-            ts_str = ts.strftime("%Y-%m-%dT%H-%M-%S") if ts else "unknown"
-            photo_path = save_photo_to_qnap(photo_data, str(group.id), message_id, ts_str)
-
-    # Resolve source_account_id
-    src_account_uuid = None
-    if source_account_id:
-        try:
-            src_account_uuid = uuid.UUID(source_account_id)
-        except ValueError:
-            pass
+            photo_path = await asyncio.to_thread(commit_spooled_blob, spooled.tmp_path, photo_hash)
 
-    msg = Message(
-        id=uuid.uuid4(),
-        group_id=group.id,
-        telegram_message_id=tg_msg_id,
-        external_message_id=external_message_id or None,
-        sender_telegram_id=int(sender_telegram_id) if sender_telegram_id.isdigit() else None,
-        sender_external_id=sender_external_id or None,
-        sender_name=sender_name or None,
-        text=text or None,
-        has_photo=has_photo,
-        photo_path=photo_path,
-        photo_hash=photo_hash,
-        timestamp=ts,
-        imported_from_backup=False,
-        photo_processed_at=None,
-        source_platform=source_platform,
-        source_account_id=src_account_uuid,
-        source_type=source_type or "bot",
-        document_text=document_text[:50000] if document_text else None,
-        document_name=document_name or None,
-    )
-    inserted = await _commit_message_with_retry(db, msg)
+    msg = _build_message(fields, group.id, photo_path, photo_hash)
+    try:
+        inserted = await _commit_message_with_retry(db, msg)
+    except Exception:
+        await release_unwritten(db, [msg])
+        raise
     if not inserted:
+        await release_unwritten(db, [msg], set())
         return {"ok": True, "duplicate": True}
 
-    if text or document_text:
-        search_text = text or document_text
+    await dedup_filter.add(dedup_filter.keys_for_message(msg))
+    await text_search.index_messages([msg])
+
+    search_text = msg.text or msg.document_text
+    if search_text:
         phones = extract_phones_util(search_text)
         if phones:
             for phone in phones:
                 db.add(MessagePhone(id=uuid.uuid4(), message_id=msg.id, phone=phone))
             try:
+                await index_phones(db, phones)
                 await db.commit()
             except IntegrityError:
                 await db.rollback()
             except OperationalError as exc:
                 await db.rollback()
-                if not _is_mysql_deadlock(exc):
+                if not bulk_writer.is_mysql_deadlock(exc):
                     raise
 
     if photo_path:
-        from app.worker.tasks import process_photo
-        process_photo.delay(str(msg.id), photo_path, str(group.id), ts.isoformat() if ts else "")
+        outbox.dispatch_photo_tasks([bulk_writer.photo_task_args(msg)])
 
     return {"ok": True, "message_id": str(msg.id)}
 
+
+async def _parse_batch_payload(request: Request) -> list[tuple[dict[str, str], bytes | None]]:
+    """
+    Тело батча:
+      - application/x-ndjson: по JSON-объекту на строку, фото — в поле photo_base64;
+      - multipart/form-data: поле messages (NDJSON), фото — файловые части,
+        на которые сообщение ссылается полем photo_field.
+    """
+    content_type = request.headers.get("content-type", "").lower()
+    files: dict[str, UploadFile] = {}
+    if "multipart/form-data" in content_type:
+        limit = settings.BOT_BATCH_MAX_MESSAGES
+        form = await request.form(max_files=limit, max_fields=limit + 10)
+        raw = form.get("messages")
+        if raw is None:
+            raise HTTPException(status_code=400, detail="messages field is required")
+        raw = await raw.read() if hasattr(raw, "read") else raw
+        for key, value in form.multi_items():
+            if hasattr(value, "filename") and callable(getattr(value, "read", None)):
+                files[key] = value
+    else:
+        raw = await request.body()
+
+    lines = [line for line in _as_text(raw).splitlines() if line.strip()]
+    if len(lines) > settings.BOT_BATCH_MAX_MESSAGES:
+        raise HTTPException(status_code=413, detail=f"Batch limit is {settings.BOT_BATCH_MAX_MESSAGES} messages")
+
+    items = []
+    for line_no, line in enumerate(lines, start=1):
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON on line {line_no}")
+        if not isinstance(obj, dict):
+            raise HTTPException(status_code=400, detail=f"Line {line_no} must be a JSON object")
+
+        photo_data = None
+        photo_field = _as_text(obj.pop("photo_field", None))
+        photo_b64 = obj.pop("photo_base64", None)
+        if photo_field:
+            upload = files.get(photo_field)
+            if upload is None:
+                raise HTTPException(status_code=400, detail=f"Line {line_no}: file part {photo_field} not found")
+            photo_data = await upload.read()
+        elif photo_b64:
+            try:
+                photo_data = base64.b64decode(photo_b64)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Line {line_no}: invalid photo_base64")
+        items.append(({key: _as_text(value) for key, value in obj.items()}, photo_data or None))
+    return items
+
+
+async def _existing_message_keys(db: AsyncSession, candidates: list[dict], seen: dict[str, str]) -> set[str]:
+    """Ключи из candidates, уже сохранённые в БД: по одному IN-запросу на группу и тип id."""
+    tg_ids: dict[uuid.UUID, set[int]] = {}
+    ext_ids: dict[uuid.UUID, set[str]] = {}
+    for item in candidates:
+        if item["tg_key"] and seen[item["tg_key"]] == dedup_filter.MAYBE:
+            tg_ids.setdefault(item["group"].id, set()).add(item["fields"]["telegram_message_id"])
+        if item["ext_key"] and seen[item["ext_key"]] == dedup_filter.MAYBE:
+            ext_ids.setdefault(item["group"].id, set()).add(item["fields"]["message_id"])
+
+    existing = set()
+    for group_id, ids in tg_ids.items():
+        res = await db.execute(
+            select(Message.telegram_message_id)
+            .where(Message.group_id == group_id, Message.telegram_message_id.in_(ids))
+        )
+        existing.update(dedup_filter.message_keys(group_id, telegram_message_id=tg_id)[0] for tg_id in res.scalars())
+    for group_id, ids in ext_ids.items():
+        res = await db.execute(
+            select(Message.external_message_id)
+            .where(Message.group_id == group_id, Message.external_message_id.in_(ids))
+        )
+        existing.update(dedup_filter.message_keys(group_id, external_message_id=ext_id)[0] for ext_id in res.scalars())
+    return existing
+
+
+def _save_batch_photos(items: list[dict]):
+    for item in items:
+        item["photo_path"], _ = save_blob(item["photo"], item["photo_hash"])
+
+
+@router.post("/messages:batch")
+async def receive_bot_messages_batch(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Пакетный приём сообщений (NDJSON или multipart, см. _parse_batch_payload).
+    Группы резолвятся один раз, дубликаты отсекаются set-запросами, вставка — одним executemany.
+    В results — статус каждого сообщения в порядке входа.
+    """
+    raw_items = await _parse_batch_payload(request)
+    results: list[dict | None] = [None] * len(raw_items)
+
+    # ── Разбор полей и резолв групп (один раз на группу) ──
+    groups: dict[tuple[str, str], CachedGroup | HTTPException] = {}
+    candidates = []
+    for index, (payload, photo_data) in enumerate(raw_items):
+        try:
+            fields = _parse_message_fields(payload)
+        except HTTPException as exc:
+            results[index] = {"ok": False, "error": exc.detail}
+            continue
+
+        group_key = (fields["source_platform"], fields["group_external_id"])
+        if group_key not in groups:
+            try:
+                groups[group_key] = await _resolve_group(db, *group_key, fields["group_name"])
+            except HTTPException as exc:
+                groups[group_key] = exc
+        group = groups[group_key]
+        if isinstance(group, HTTPException):
+            results[index] = {"ok": False, "error": group.detail}
+            continue
+        if not group.is_approved:
+            results[index] = {"ok": False, "status": "pending_approval"}
+            continue
+
+        tg_key, ext_key = None, None
+        if fields["telegram_message_id"] is not None:
+            tg_key = dedup_filter.message_keys(group.id, telegram_message_id=fields["telegram_message_id"])[0]
+        ext_key = dedup_filter.message_keys(group.id, external_message_id=fields["message_id"])[0]
+        candidates.append({
+            "index": index, "fields": fields, "group": group, "photo": photo_data,
+            "tg_key": tg_key, "ext_key": ext_key, "photo_hash": None, "photo_path": None,
+        })
+
+    # ── Дубликаты сообщений: внутри батча, Redis-фильтр, затем IN-запросы ──
+    keys = [key for item in candidates for key in (item["tg_key"], item["ext_key"]) if key]
+    seen = await dedup_filter.check(keys)
+    existing = await _existing_message_keys(db, candidates, seen)
+    batch_keys: set[str] = set()
+    unique = []
+    for item in candidates:
+        item_keys = [key for key in (item["tg_key"], item["ext_key"]) if key]
+        if any(seen[key] == dedup_filter.HOT or key in existing or key in batch_keys for key in item_keys):
+            results[item["index"]] = {"ok": True, "duplicate": True}
+            continue
+        batch_keys.update(item_keys)
+        unique.append(item)
+    candidates = unique
+
+    # ── Фото: SHA-256 в потоке, дубликаты (тот же хеш в той же группе) одним IN-запросом ──
+    with_photo = [item for item in candidates if item["photo"]]
+    if with_photo:
+        hashes = await asyncio.to_thread(lambda: [_sha256_hex(item["photo"]) for item in with_photo])
+        for item, photo_hash in zip(with_photo, hashes):
+            item["photo_hash"] = photo_hash
+            item["photo_key"] = dedup_filter.photo_key(item["group"].id, photo_hash)
+
+        photo_seen = await dedup_filter.check(list({item["photo_key"] for item in with_photo}))
+        dup_keys = {key for key, status in photo_seen.items() if status == dedup_filter.HOT}
+        maybe = {item["photo_hash"] for item in with_photo if photo_seen[item["photo_key"]] == dedup_filter.MAYBE}
+        if maybe:
+            res = await db.execute(
+                select(Message.group_id, Message.photo_hash).where(Message.photo_hash.in_(maybe)).distinct()
+            )
+            dup_keys.update(dedup_filter.photo_key(group_id, photo_hash) for group_id, photo_hash in res.all())
+
+        batch_photo_keys: set[str] = set()
+        unique = []
+        for item in candidates:
+            photo_key = item.get("photo_key")
+            if photo_key and (photo_key in dup_keys or photo_key in batch_photo_keys):
+                results[item["index"]] = {"ok": True, "duplicate": True, "reason": "photo_duplicated"}
+                continue
+            if photo_key:
+                batch_photo_keys.add(photo_key)
+            unique.append(item)
+        candidates = unique
+
+        await asyncio.to_thread(_save_batch_photos, [item for item in candidates if item["photo_hash"]])
+
+    # ── Вставка одним executemany и один commit ──
+    messages = [
+        _build_message(item["fields"], item["group"].id, item["photo_path"], item["photo_hash"])
+        for item in candidates
+    ]
+    try:
+        inserted = await bulk_writer.write_messages(db, messages)
+    except Exception:
+        await release_unwritten(db, messages)
+        raise
+    await release_unwritten(db, messages, inserted)
+
+    saved = []
+    photo_tasks = []
+    for item, msg in zip(candidates, messages):
+        if msg.id not in inserted:
+            results[item["index"]] = {"ok": True, "duplicate": True}
+            continue
+        saved.append(msg)
+        results[item["index"]] = {"ok": True, "message_id": str(msg.id)}
+        if msg.photo_path:
+            photo_tasks.append(bulk_writer.photo_task_args(msg))
+
+    await dedup_filter.add([key for msg in saved for key in dedup_filter.keys_for_message(msg)])
+    await text_search.index_messages(saved)
+    outbox.dispatch_photo_tasks(photo_tasks)
+
+    return {
+        "ok": True,
+        "received": len(raw_items),
+        "inserted": len(saved),
+        "duplicates": sum(1 for r in results if r and r.get("duplicate")),
+        "results": results,
+    }
+
+
 @router.post("/approve")
 async def approve_group(group_telegram_id: str = Form(...), db: AsyncSession = Depends(get_db)):
     """Одобрение новой группы."""
@@ -311,6 +586,7 @@ async def approve_group(group_telegram_id: str = Form(...), db: AsyncSession = D
     group.is_approved = True
     group.bot_active = True
     await db.commit()
+    await group_cache.invalidate(group)
     return {"ok": True, "status": "approved"}
 
 @router.post("/reject")
@@ -329,4 +605,5 @@ async def reject_group(group_telegram_id: str = Form(...), db: AsyncSession = De
     group.is_approved = False
     group.bot_active = False
     await db.commit()
+    await group_cache.invalidate(group)
     return {"ok": True, "status": "rejected"}
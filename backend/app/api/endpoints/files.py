@@ -0,0 +1,113 @@
+"""
+Файлы поверх StaticFiles (/files): кропы лиц из pack-файлов (/files/facepacks/{face_id}.jpg)
+и превью для галерей (/files/thumb/{size}/{path}). Роутер подключается до монтирования
+StaticFiles на /files. Поддерживают ETag/If-None-Match, кропы — ещё и Range.
+"""
+import asyncio
+import re
+import uuid
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
+from PIL import UnidentifiedImageError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.models.models import FaceCrop
+from app.services import face_pack_store, thumbnails
+
+router = APIRouter()
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+# Кроп по face_id не меняется никогда
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """Один диапазон bytes=start-end (или суффикс bytes=-N) → (start, end) включительно."""
+    match = RANGE_RE.match(header.strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    if not match.group(1):
+        suffix = int(match.group(2))
+        if not suffix:
+            return None
+        return max(0, size - suffix), size - 1
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else size - 1
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+@router.get("/facepacks/{face_id}.jpg")
+async def get_face_crop(face_id: str, request: Request, db: AsyncSession = Depends(get_db)):
+    try:
+        face_uuid = uuid.UUID(face_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    crop = await db.get(FaceCrop, face_uuid)
+    if crop is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    etag = f'"{face_uuid.hex}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    start, end = 0, crop.length - 1
+    status_code = 200
+    range_header = request.headers.get("range")
+    if range_header:
+        byte_range = _parse_range(range_header, crop.length)
+        if byte_range is None:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{crop.length}"})
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{crop.length}"
+
+    try:
+        data = await asyncio.to_thread(
+            face_pack_store.read_crop, crop.pack, crop.pack_offset + start, end - start + 1
+        )
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(content=data, status_code=status_code, media_type="image/jpeg", headers=headers)
+
+
+@router.get("/thumb/{size}/{path:path}")
+async def get_thumbnail(
+    size: int,
+    path: str,
+    request: Request,
+    format: str = Query("webp", pattern="^(webp|jpeg)$"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Превью фото или кропа: path — тот же путь, что после /files/. Создаётся при первом запросе."""
+    if size not in settings.THUMB_SIZES:
+        raise HTTPException(status_code=400, detail=f"Размер превью: один из {settings.THUMB_SIZES}")
+
+    try:
+        crop_id = thumbnails.pack_crop_id(path)
+        if crop_id is not None:
+            crop = await db.get(FaceCrop, crop_id)
+            if crop is None:
+                raise HTTPException(status_code=404, detail="Not Found")
+            version, load_source = thumbnails.load_pack_crop(crop)
+        else:
+            version, load_source = await asyncio.to_thread(thumbnails.load_file, path)
+
+        etag = f'"{thumbnails.thumb_key(path, version, size, format)}"'
+        headers = {"ETag": etag, "Cache-Control": f"public, max-age={settings.THUMB_CACHE_MAX_AGE}"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+
+        thumb_path, _ = await asyncio.to_thread(thumbnails.get_thumbnail, path, version, size, format, load_source)
+    except (thumbnails.ThumbnailSourceNotFound, FileNotFoundError, IsADirectoryError):
+        raise HTTPException(status_code=404, detail="Not Found")
+    except UnidentifiedImageError:
+        raise HTTPException(status_code=415, detail="Не изображение")
+
+    return FileResponse(thumb_path, media_type=thumbnails.FORMATS[format][1], headers=headers)
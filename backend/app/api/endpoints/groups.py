@@ -10,6 +10,8 @@ from pydantic import BaseModel
 from app.core.database import get_db
 from app.models.models import Group, Message
 from app.api.deps import get_current_user, require_admin
+from app.services import group_cache, text_search
+from app.services.blob_store import release_photos
 
 router = APIRouter()
 
@@ -83,6 +85,7 @@ async def toggle_group_public(
 
     group.is_public = not group.is_public
     await db.commit()
+    await group_cache.invalidate(group)
     return {"id": group_id, "is_public": group.is_public}
 
 
@@ -105,7 +108,11 @@ async def delete_group(
 
     # Удаляем сообщения и связанные данные
     messages = await db.execute(select(Message).where(Message.group_id == gid))
+    deleted_ids = []
+    photo_hashes = set()
     for msg in messages.scalars().all():
+        deleted_ids.append(str(msg.id))
+        photo_hashes.add(msg.photo_hash)
         faces = await db.execute(select(Face).where(Face.message_id == msg.id))
         for face in faces.scalars().all():
             await db.delete(face)
@@ -113,4 +120,8 @@ async def delete_group(
 
     await db.delete(group)
     await db.commit()
+    await group_cache.invalidate(group)
+    await text_search.delete_messages(deleted_ids)
+    # Фото из blob-хранилища удаляются, только если на них не ссылаются другие группы
+    await release_photos(db, photo_hashes)
     return {"deleted": True, "id": group_id}
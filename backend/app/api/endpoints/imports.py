@@ -1,88 +1,52 @@
 """
 Endpoint импорта резервной копии Telegram Desktop.
-Принимает ZIP-архив, парсит messages.html, сохраняет фото → QNAP → Celery.
+Принимает ZIP-архив, сохраняет его на QNAP и ставит фоновую задачу (очередь Celery imports):
+разбор result.json / messages*.html, фото → QNAP, запись в БД — app.services.telegram_import.
+Прогресс — GET /jobs/{id} и поток SSE /jobs/{id}/events. После ошибки архив остаётся:
+POST /jobs/{id}/retry продолжает импорт с последней пачки, DELETE /jobs/{id} удаляет архив.
 """
 from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from bs4 import BeautifulSoup
-from datetime import datetime
-from pathlib import Path
-import tempfile
-import zipfile
+import asyncio
+import logging
 import shutil
 import uuid
 import json
-import io
 import os
-import re
 
 from app.core.database import get_db
-from app.core.config import settings
-from app.models.models import Group, Message
+from app.models.models import Group
 from app.api.deps import get_current_user
+from app.services import import_jobs
+from app.services.storage_service import SPOOL_CHUNK_SIZE
+from app.services.telegram_import import ImportArchiveError, check_archive, default_state_path
+from app.worker.import_tasks import import_telegram_archive
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# SSE: как часто перечитывать задачу и через сколько опросов без изменений слать keep-alive
+EVENTS_POLL_SECONDS = 1.0
+EVENTS_KEEPALIVE_POLLS = 15
 
-def parse_telegram_messages_html(html_content: str, photos_dir: str):
-    """
-    Парсит messages.html из экспорта Telegram Desktop.
-    Возвращает список словарей с ключами:
-        message_id, sender_name, timestamp, text, photo_rel_path
-    """
-    soup = BeautifulSoup(html_content, "html.parser")
-    messages_divs = soup.find_all("div", class_=re.compile(r"message\s+default"))
-
-    parsed = []
-    current_sender = None
-
-    for div in messages_divs:
-        # Извлекаем message_id
-        msg_id_attr = div.get("id", "")
-        msg_id_num = re.sub(r"\D", "", msg_id_attr)
-
-        # Если это первое сообщение серии — извлекаем from_name
-        from_name_div = div.find("div", class_="from_name")
-        if from_name_div:
-            current_sender = from_name_div.get_text(strip=True)
-
-        # Дата/время
-        date_div = div.find("div", class_="date")
-        timestamp_str = None
-        timestamp = None
-        if date_div:
-            timestamp_str = date_div.get("title", "")
-            try:
-                timestamp = datetime.strptime(timestamp_str[:19], "%d.%m.%Y %H:%M:%S")
-            except ValueError:
-                pass
-
-        # Текст
-        text_div = div.find("div", class_="text")
-        text = text_div.get_text(strip=True) if text_div else None
-
-        # Фото
-        photo_wrap = div.find("a", class_="photo_wrap")
-        photo_rel_path = None
-        if photo_wrap:
-            href = photo_wrap.get("href", "")
-            if href:
-                photo_rel_path = href
-
-        parsed.append({
-            "message_id": msg_id_num,
-            "sender_name": current_sender,
-            "timestamp": timestamp,
-            "text": text if text else None,
-            "photo_rel_path": photo_rel_path,
-        })
-
-    return parsed
-
-
-@router.post("/")
+
+def _save_upload(src, zip_path: str) -> int:
+    with open(zip_path, "wb") as f:
+        shutil.copyfileobj(src, f, SPOOL_CHUNK_SIZE)
+        return f.tell()
+
+
+def _remove_upload(zip_path: str):
+    try:
+        os.remove(zip_path)
+    except FileNotFoundError:
+        pass
+
+
+@router.post("/", status_code=202)
 async def import_backup(
     file: UploadFile = File(...),
     group_name: str = Form(""),
@@ -91,11 +55,25 @@ async def import_backup(
     _=Depends(get_current_user),
 ):
     """
-    Импорт резервной копии Telegram Desktop (ZIP).
+    Импорт резервной копии Telegram Desktop (ZIP): архив сохраняется и проверяется,
+    сам импорт идёт в фоне. Возвращает задачу (id, status, group_id, ...).
     """
     if not file.filename.endswith(".zip"):
         raise HTTPException(status_code=400, detail="Ожидается ZIP-файл")
 
+    # ZIP сохраняется как есть (zipfile нужен seekable-файл), без распаковки
+    job_id = import_jobs.new_job_id()
+    zip_path = str(await asyncio.to_thread(import_jobs.upload_path, job_id))
+    try:
+        size = await asyncio.to_thread(_save_upload, file.file, zip_path)
+        await asyncio.to_thread(check_archive, zip_path)
+    except ImportArchiveError as e:
+        await asyncio.to_thread(_remove_upload, zip_path)
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        await asyncio.to_thread(_remove_upload, zip_path)
+        raise
+
     # Создаём или находим группу
     group = None
     if group_id:
@@ -105,107 +83,94 @@ async def import_backup(
     if not group:
         group = Group(id=uuid.uuid4(), name=group_name or file.filename.replace(".zip", ""))
         db.add(group)
-        await db.flush()
+        await db.commit()
 
-    # Распаковываем ZIP во временную директорию
-    tmp_dir = tempfile.mkdtemp()
+    job = await import_jobs.create_job(job_id, str(group.id), group.name, file.filename, size)
     try:
-        zip_path = os.path.join(tmp_dir, "backup.zip")
-        with open(zip_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-
-        with zipfile.ZipFile(zip_path, "r") as z:
-            z.extractall(tmp_dir)
-
-        # Ищем все файлы вида messages*.html
-        export_dir = None
-        html_files = []
-        for root, dirs, files in os.walk(tmp_dir):
-            for file_name in files:
-                if re.match(r"^messages.*\.html$", file_name):
-                    export_dir = root
-                    html_files.append(file_name)
-
-        if not export_dir or not html_files:
-            raise HTTPException(status_code=400, detail="Файлы сообщений (messages*.html) не найдены в архиве")
-
-        # Функция для сортировки файлов (messages.html -> 0, messages2.html -> 2)
-        def sort_key(filename):
-            match = re.search(r"messages(\d*)\.html", filename)
-            if not match:
-                return 0
-            num_str = match.group(1)
-            return int(num_str) if num_str else 0
-
-        html_files.sort(key=sort_key)
-        photos_dir = os.path.join(export_dir, "photos")
-
-        messages_data = []
-        for html_file in html_files:
-            html_path = os.path.join(export_dir, html_file)
-            with open(html_path, "r", encoding="utf-8") as f:
-                html_content = f.read()
-            # Добавляем распарсенные сообщения к общему списку
-            messages_data.extend(
-                parse_telegram_messages_html(html_content, photos_dir if os.path.exists(photos_dir) else "")
-            )
-
-        # Сохраняем сообщения в БД и фото на QNAP
-        stats = {"messages": 0, "photos": 0, "faces_queued": 0}
-        queued_tasks = []
-
-        for msg_data in messages_data:
-            has_photo = bool(msg_data["photo_rel_path"])
-            photo_qnap_path = None
-
-            if has_photo and os.path.exists(photos_dir):
-                # Ищем фото относительно export_dir
-                src_photo = os.path.join(export_dir, msg_data["photo_rel_path"])
-                if os.path.isfile(src_photo):
-                    ts_str = msg_data["timestamp"].strftime("%Y-%m") if msg_data["timestamp"] else "unknown"
-                    dest_dir = Path(settings.QNAP_MOUNT_PATH) / "photos" / str(group.id) / ts_str
-                    dest_dir.mkdir(parents=True, exist_ok=True)
-                    dest_file = dest_dir / f"{msg_data['message_id']}_{uuid.uuid4().hex[:8]}.jpg"
-                    shutil.copy2(src_photo, str(dest_file))
-                    photo_qnap_path = str(dest_file)
-                    stats["photos"] += 1
-
-            msg = Message(
-                id=uuid.uuid4(),
-                group_id=group.id,
-                telegram_message_id=int(msg_data["message_id"]) if msg_data["message_id"] else None,
-                sender_name=msg_data["sender_name"],
-                text=msg_data["text"],
-                has_photo=has_photo,
-                photo_path=photo_qnap_path,
-                timestamp=msg_data["timestamp"],
-                imported_from_backup=True,
-                photo_processed_at=None,
-            )
-            db.add(msg)
-            stats["messages"] += 1
-
-            # Ставим задачи в очередь только после commit, иначе воркер может
-            # забрать task раньше, чем Message станет видимым в БД.
-            if photo_qnap_path:
-                queued_tasks.append((
-                    str(msg.id),
-                    photo_qnap_path,
-                    str(group.id),
-                    msg_data["timestamp"].isoformat() if msg_data["timestamp"] else "",
-                ))
-
-        await db.commit()
-        if queued_tasks:
-            from app.worker.tasks import process_photo
-            for task_args in queued_tasks:
-                process_photo.delay(*task_args)
-            stats["faces_queued"] = len(queued_tasks)
-
-        return {
-            "group_id": str(group.id),
-            "group_name": group.name,
-            "stats": stats,
-        }
-    finally:
-        shutil.rmtree(tmp_dir, ignore_errors=True)
+        import_telegram_archive.delay(job_id, zip_path, str(group.id))
+    except Exception as e:
+        logger.exception("Не удалось поставить импорт %s в очередь", job_id)
+        await import_jobs.update_job(job_id, status=import_jobs.FAILED, error=str(e))
+        await asyncio.to_thread(_remove_upload, zip_path)
+        raise HTTPException(status_code=503, detail="Очередь импорта недоступна")
+    return job
+
+
+@router.get("/jobs/{job_id}")
+async def get_import_job(job_id: str, _=Depends(get_current_user)):
+    job = await import_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача импорта не найдена")
+    return job
+
+
+@router.post("/jobs/{job_id}/retry", status_code=202)
+async def retry_import_job(job_id: str, _=Depends(get_current_user)):
+    """Повтор упавшего импорта: та же задача снова в очереди, продолжит по файлу состояния."""
+    job = await import_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача импорта не найдена")
+    if job["status"] != import_jobs.FAILED:
+        raise HTTPException(status_code=409, detail="Повторить можно только задачу с ошибкой")
+    zip_path = str(await asyncio.to_thread(import_jobs.upload_path, job_id))
+    if not await asyncio.to_thread(os.path.exists, zip_path):
+        raise HTTPException(status_code=410, detail="Архив задачи уже удалён, загрузите его заново")
+
+    job = await import_jobs.update_job(job_id, status=import_jobs.QUEUED, error=None)
+    try:
+        import_telegram_archive.delay(job_id, zip_path, job["group_id"])
+    except Exception as e:
+        logger.exception("Не удалось поставить импорт %s в очередь", job_id)
+        await import_jobs.update_job(job_id, status=import_jobs.FAILED, error=str(e))
+        raise HTTPException(status_code=503, detail="Очередь импорта недоступна")
+    return job
+
+
+@router.delete("/jobs/{job_id}")
+async def discard_import_job(job_id: str, _=Depends(get_current_user)):
+    """Отказ от повтора упавшего импорта: архив и файл состояния удаляются с QNAP."""
+    job = await import_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача импорта не найдена")
+    if job["status"] not in import_jobs.TERMINAL:
+        raise HTTPException(status_code=409, detail="Импорт ещё выполняется")
+    zip_path = str(await asyncio.to_thread(import_jobs.upload_path, job_id))
+    state_path = default_state_path(zip_path)
+    for path in (zip_path, state_path, f"{state_path}.tmp"):
+        await asyncio.to_thread(_remove_upload, path)
+    await import_jobs.delete_job(job_id)
+    return {"ok": True}
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_import_job(job_id: str, _=Depends(get_current_user)):
+    """SSE: состояние задачи при каждом изменении; поток закрывается после done/failed."""
+    if await import_jobs.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Задача импорта не найдена")
+
+    async def event_stream():
+        last_update = None
+        idle_polls = 0
+        while True:
+            job = await import_jobs.get_job(job_id)
+            if job is None:
+                # Истёк TTL
+                return
+            if job["updated_at"] != last_update:
+                last_update = job["updated_at"]
+                idle_polls = 0
+                yield f"data: {json.dumps(job, ensure_ascii=False)}\n\n"
+                if job["status"] in import_jobs.TERMINAL:
+                    return
+            else:
+                idle_polls += 1
+                if idle_polls % EVENTS_KEEPALIVE_POLLS == 0:
+                    yield ": keep-alive\n\n"
+            await asyncio.sleep(EVENTS_POLL_SECONDS)
+
+    # X-Accel-Buffering: nginx не должен копить поток в буфере
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
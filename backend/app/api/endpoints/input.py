@@ -6,14 +6,16 @@ from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from datetime import datetime
-from pathlib import Path
+import asyncio
 import uuid
 import os
 
 from app.core.database import get_db
-from app.core.config import settings
 from app.models.models import Group, Message
 from app.api.deps import get_current_user
+from app.services import dedup_filter, outbox, text_search
+from app.services.storage_service import discard_spooled_photo, spool_upload
+from app.services.blob_store import commit_spooled_blob, release_unwritten
 
 router = APIRouter()
 
@@ -46,17 +48,18 @@ async def input_photo(
             db.add(group)
             await db.flush()
 
-    # Читаем фото
-    contents = await photo.read()
-    if not contents:
+    # Потоково пишем фото во временный файл на QNAP, SHA-256 — по ходу чтения
+    spooled = await spool_upload(photo)
+    if not spooled:
         raise HTTPException(status_code=400, detail="Пустой файл")
+    photo_hash = spooled.sha256
 
-    import hashlib
-    photo_hash = hashlib.sha256(contents).hexdigest()
-
-    # Проверка на дубликат
-    dup_photo = await db.execute(select(Message).where(Message.photo_hash == photo_hash))
+    # Проверка на дубликат: то же фото в этой же группе
+    dup_photo = await db.execute(
+        select(Message.id).where(Message.group_id == group.id, Message.photo_hash == photo_hash).limit(1)
+    )
     if dup_photo.scalars().first():
+        await asyncio.to_thread(discard_spooled_photo, spooled.tmp_path)
         return {
             "message_id": "",
             "group_id": str(group.id),
@@ -67,16 +70,10 @@ async def input_photo(
             "faces_queued": False,
         }
 
-    # Сохраняем на QNAP
+    # Атомарно переносим в blob-хранилище на QNAP
     now = datetime.utcnow()
-    ts_str = now.strftime("%Y-%m")
     msg_id = uuid.uuid4()
-    dest_dir = Path(settings.QNAP_MOUNT_PATH) / "photos" / str(group.id) / ts_str
-    dest_dir.mkdir(parents=True, exist_ok=True)
-    filename = f"{msg_id}_{now.strftime('%Y%m%d_%H%M%S')}.jpg"
-    file_path = dest_dir / filename
-    with open(file_path, "wb") as f:
-        f.write(contents)
+    file_path = await asyncio.to_thread(commit_spooled_blob, spooled.tmp_path, photo_hash)
 
     # Создаём Message
     msg = Message(
@@ -92,16 +89,18 @@ async def input_photo(
         photo_processed_at=None,
     )
     db.add(msg)
-    await db.commit()
+    photo_task = (str(msg.id), str(file_path), str(group.id), now.isoformat())
+    outbox.stage_photo_tasks(db, [photo_task])
+    try:
+        await db.commit()
+    except Exception:
+        await release_unwritten(db, [msg])
+        raise
+    await dedup_filter.add(dedup_filter.keys_for_message(msg))
+    await text_search.index_messages([msg])
 
-    # Запускаем Celery task
-    from app.worker.tasks import process_photo
-    process_photo.delay(
-        str(msg.id),
-        str(file_path),
-        str(group.id),
-        now.isoformat(),
-    )
+    # Запускаем Celery task (при TASK_OUTBOX_ENABLED — через outbox_relay.py)
+    outbox.dispatch_photo_tasks([photo_task])
 
     return {
         "message_id": str(msg.id),
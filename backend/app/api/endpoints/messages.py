@@ -12,6 +12,8 @@ import uuid
 from app.core.database import get_db
 from app.models.models import Message, Group, Face
 from app.api.deps import get_current_user, require_admin
+from app.services import text_search
+from app.services.blob_store import release_photos
 
 router = APIRouter()
 
@@ -198,6 +200,9 @@ async def delete_message(
     for face in faces.scalars().all():
         await db.delete(face)
 
+    photo_hash = msg.photo_hash
     await db.delete(msg)
     await db.commit()
+    await text_search.delete_messages([str(mid)])
+    await release_photos(db, [photo_hash])
     return {"deleted": True, "id": message_id}
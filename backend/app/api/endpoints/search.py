@@ -3,81 +3,59 @@ Endpoints для поиска: по фото (лицу) и по тексту.
 """
 from fastapi import APIRouter, Depends, UploadFile, File, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func, text
+from sqlalchemy import select, and_, or_, func
 from typing import Optional
 import asyncio
 import os
 import uuid
 import cv2
 import numpy as np
-import threading
 import logging
-import onnxruntime as ort
 
+from app.core.config import settings
 from app.core.database import get_db, AsyncSessionLocal
 from app.models.models import Message, Face, Group, MessagePhone
 from app.services.qdrant_service import ensure_collection_exists, search_similar_faces
+from app.services import face_cache, inference_client, text_search
+from app.services.face_models import FaceModelRegistry
 from app.services.phone_utils import extract_phones as extract_phones_util
+from app.services.phone_index import phone_filter
+from app.services.context_loader import load_context_windows, serialize_context_message as ser
 from app.api.deps import get_current_user
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# ── ONNX threading config для backend (поиск) ──
+# ── ONNX threading config для backend (поиск без сервиса инференса) ──
 SEARCH_ORT_THREADS = int(os.getenv("SEARCH_ORT_THREADS", "8"))
 
 os.environ.setdefault("OMP_NUM_THREADS", str(SEARCH_ORT_THREADS))
 os.environ.setdefault("MKL_NUM_THREADS", str(SEARCH_ORT_THREADS))
 os.environ.setdefault("OPENBLAS_NUM_THREADS", str(SEARCH_ORT_THREADS))
 
-# ── Lazy singleton для InsightFace (поиск — меньший det_size) ──
-_face_app = None
-_face_app_lock = threading.Lock()
-
-
-def _get_face_app():
-    global _face_app
-    if _face_app is None:
-        with _face_app_lock:
-            if _face_app is None:
-                from insightface.app import FaceAnalysis
-
-                sess_options = ort.SessionOptions()
-                sess_options.intra_op_num_threads = SEARCH_ORT_THREADS
-                sess_options.inter_op_num_threads = 2
-                sess_options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
-
-                logger.info(
-                    "Инициализация InsightFace для search (det_size=320, threads=%d)...",
-                    SEARCH_ORT_THREADS,
-                )
-                app = FaceAnalysis(
-                    name="buffalo_l",
-                    providers=["CPUExecutionProvider"],
-                )
-                # Меньший det_size для поиска — лицо обычно крупное, 320 достаточно
-                app.prepare(ctx_id=-1, det_size=(320, 320))
-
-                # Применяем session options для многопоточности
-                for model in app.models:
-                    if hasattr(model, 'session') and model.session is not None:
-                        model_path = getattr(model.session, '_model_path', None)
-                        if model_path:
-                            model.session = ort.InferenceSession(
-                                model_path,
-                                sess_options=sess_options,
-                                providers=["CPUExecutionProvider"],
-                            )
-
-                _face_app = app
-                logger.info("InsightFace загружен для search (ORT %s).", ort.__version__)
-    return _face_app
-
-
-def _detect_faces_sync(img):
-    """Синхронная детекция лиц (для запуска в потоке)."""
-    face_app = _get_face_app()
-    return face_app.get(img)
+# ── Модели в API-процессе — только если INFERENCE_URL/INFERENCE_UDS не заданы ──
+_face_models = FaceModelRegistry(SEARCH_ORT_THREADS, inter_threads=2)
+
+
+def warm_up_face_models():
+    """Прогрев локальных моделей при старте API (не нужен при внешнем сервисе инференса)."""
+    _face_models.load()
+
+
+def _detect_faces_sync(contents: bytes) -> list[dict] | None:
+    """Синхронная локальная детекция лиц (для запуска в потоке). None — изображение не читается."""
+    img = cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    [faces] = _face_models.analyze([img], settings.SEARCH_DET_SCALES, settings.FACE_REC_BATCH_SIZE)
+    return [{"bbox": face.bbox.tolist(), "embedding": face.embedding.tolist()} for face in faces]
+
+
+async def _detect_faces(contents: bytes) -> list[dict] | None:
+    """Детекция и эмбеддинги: через сервис инференса или локально в отдельном потоке."""
+    if inference_client.is_enabled():
+        return await inference_client.embed_image(contents)
+    return await asyncio.to_thread(_detect_faces_sync, contents)
 
 
 @router.post("/face")
@@ -100,21 +78,28 @@ async def search_by_face(
     t_start = time.time()
 
     contents = await photo.read()
-    nparr = np.frombuffer(contents, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-    if img is None:
-        return {"error": "Не удалось прочитать изображение"}
-
-    # Детекция лиц в отдельном потоке (не блокируем event loop)
-    try:
-        detected_faces = await asyncio.to_thread(_detect_faces_sync, img)
-    except Exception as e:
-        logger.error("Ошибка детекции лиц: %s", e, exc_info=True)
-        return {"error": f"Ошибка детекции лиц: {str(e)}"}
+    cache_key = face_cache.image_hash(contents)
+    detected_faces = await face_cache.get_cached_faces(cache_key)
+
+    if detected_faces is None:
+        # Детекция вне event loop: сервис инференса или поток
+        try:
+            faces = await _detect_faces(contents)
+        except Exception as e:
+            logger.error("Ошибка детекции лиц: %s", e, exc_info=True)
+            return {"error": f"Ошибка детекции лиц: {str(e)}"}
+
+        if faces is None:
+            return {"error": "Не удалось прочитать изображение"}
+
+        detected_faces = [{"bbox": face["bbox"], "embedding": face["embedding"]} for face in faces]
+        await face_cache.set_cached_faces(cache_key, detected_faces)
+        cache_state = "miss"
+    else:
+        cache_state = "hit"
 
     t_detect = time.time()
-    logger.info("TIMING detect=%.2fs faces=%d", t_detect - t_start, len(detected_faces))
+    logger.info("TIMING detect=%.2fs faces=%d cache=%s", t_detect - t_start, len(detected_faces), cache_state)
 
     if not detected_faces:
         return {"faces_detected": 0, "results": []}
@@ -123,7 +108,7 @@ async def search_by_face(
         all_results = []
         for face_data in detected_faces:
             all_results.append({
-                "bbox": face_data.bbox.tolist(),
+                "bbox": face_data["bbox"],
                 "matches": []
             })
         return {
@@ -138,7 +123,7 @@ async def search_by_face(
     selected_index = face_index if face_index is not None and face_index < len(detected_faces) else 0
     face_to_process = detected_faces[selected_index]
 
-    vector = face_to_process.embedding.tolist()
+    vector = face_to_process["embedding"]
 
     score_threshold = threshold / 100.0
     
@@ -159,7 +144,7 @@ async def search_by_face(
         for i in range(len(detected_faces)):
             final_results.append({
                 "face_index": i,
-                "bbox": detected_faces[i].bbox.tolist(),
+                "bbox": detected_faces[i]["bbox"],
                 "matches": []
             })
         return {
@@ -170,32 +155,31 @@ async def search_by_face(
 
     # ── BATCH загрузка данных (вместо N отдельных запросов) ──
 
-    # Собираем все уникальные ID из Qdrant результатов
-    msg_ids = set()
-    face_ids = set()
-    for match in similar:
-        p = match.payload
-        if p.get("message_id"):
-            msg_ids.add(uuid.UUID(p["message_id"]))
-        if p.get("face_id"):
-            face_ids.add(uuid.UUID(p["face_id"]))
-
-    # 1) Batch: все сообщения
-    messages_map = {}
-    if msg_ids:
-        result = await db.execute(select(Message).where(Message.id.in_(msg_ids)))
-        for m in result.scalars().all():
-            messages_map[str(m.id)] = m
-
-    # 3) Batch: все лица (crop_path)
-    faces_map = {}
-    if face_ids:
-        result = await db.execute(select(Face).where(Face.id.in_(face_ids)))
-        for f in result.scalars().all():
-            faces_map[str(f.id)] = f
-
-    # 4) Batch: все группы для контекста
-    group_ids = {m.group_id for m in messages_map.values() if m.group_id}
+    # Точка Qdrant может быть общей для нескольких сообщений (фото переслано в разные группы):
+    # все Face-записи точки одним запросом, для результата — сообщение из доступной группы
+    allowed_groups = set(allowed_group_ids) if allowed_group_ids is not None else None
+    point_ids = {uuid.UUID(str(match.id)) for match in similar}
+    # face_id из payload — для лиц, у которых qdrant_point_id ещё не проставлен
+    payload_face_points = {
+        match.payload["face_id"]: str(match.id) for match in similar if match.payload.get("face_id")
+    }
+    faces_by_point = {}
+    result = await db.execute(
+        select(Face, Message)
+        .join(Message, Face.message_id == Message.id)
+        .where(or_(
+            Face.qdrant_point_id.in_(point_ids),
+            Face.id.in_([uuid.UUID(face_id) for face_id in payload_face_points]),
+        ))
+    )
+    for face, msg in result.all():
+        if allowed_groups is not None and str(msg.group_id) not in allowed_groups:
+            continue
+        point_id = str(face.qdrant_point_id) if face.qdrant_point_id else payload_face_points.get(str(face.id))
+        faces_by_point.setdefault(point_id, []).append((face, msg))
+
+    # Batch: все группы для контекста
+    group_ids = {msg.group_id for pairs in faces_by_point.values() for _, msg in pairs if msg.group_id}
     groups_map = {}
     if group_ids:
         result = await db.execute(select(Group).where(Group.id.in_(group_ids)))
@@ -203,28 +187,28 @@ async def search_by_face(
             groups_map[str(g.id)] = g
 
     t_db = time.time()
-    logger.info("TIMING db_batch=%.2fs msgs=%d total=%.2fs", t_db - t_qdrant, len(messages_map), t_db - t_start)
+    logger.info("TIMING db_batch=%.2fs points=%d total=%.2fs", t_db - t_qdrant, len(faces_by_point), t_db - t_start)
 
     # ── Сборка лёгких результатов (без контекста — он загружается по клику) ──
 
     face_results = []
     for match in similar:
         payload = match.payload
-        msg_id = payload.get("message_id")
         face_id_str = payload.get("face_id")
 
+        face_crop_path = None
         matched_photo_path = None
         group_name = None
-        if msg_id and msg_id in messages_map:
-            msg = messages_map[msg_id]
+        pairs = faces_by_point.get(str(match.id), [])
+        if pairs:
+            # Предпочитаем исходное лицо точки, иначе — первое доступное
+            face, msg = next((pair for pair in pairs if str(pair[0].id) == face_id_str), pairs[0])
+            face_id_str = str(face.id)
+            face_crop_path = face.crop_path
             matched_photo_path = msg.photo_path
             group = groups_map.get(str(msg.group_id)) if msg.group_id else None
             group_name = group.name if group else None
 
-        face_crop_path = None
-        if face_id_str and face_id_str in faces_map:
-            face_crop_path = faces_map[face_id_str].crop_path
-
         face_results.append({
             "similarity": round(match.score * 100, 1),
             "face_id": face_id_str,
@@ -239,13 +223,13 @@ async def search_by_face(
         if i == selected_index:
             final_results.append({
                 "face_index": i,
-                "bbox": detected_faces[i].bbox.tolist(),
+                "bbox": detected_faces[i]["bbox"],
                 "matches": face_results
             })
         else:
             final_results.append({
                 "face_index": i,
-                "bbox": detected_faces[i].bbox.tolist(),
+                "bbox": detected_faces[i]["bbox"],
                 "matches": []
             })
 
@@ -286,43 +270,15 @@ async def get_face_context(
         g_result = await db.execute(select(Group).where(Group.id == msg.group_id))
         group = g_result.scalar_one_or_none()
 
-    # 4) Загрузить контекст ±5 сообщений (индексированные запросы)
-    def ser(m):
-        return {
-            "id": str(m.id), "text": m.text, "has_photo": m.has_photo,
-            "photo_path": m.photo_path,
-            "timestamp": m.timestamp.isoformat() if m.timestamp else None,
-            "sender_name": m.sender_name,
-        }
-
-    before = []
-    after = []
-    if msg.timestamp and msg.group_id:
-        before_q = await db.execute(
-            select(Message)
-            .where(Message.group_id == msg.group_id, Message.timestamp <= msg.timestamp)
-            .order_by(Message.timestamp.desc())
-            .limit(6)
-        )
-        b_list = before_q.scalars().all()
-        before = [m for m in b_list if str(m.id) != str(msg.id)][:5]
-        before = list(reversed(before))
-
-        after_q = await db.execute(
-            select(Message)
-            .where(Message.group_id == msg.group_id, Message.timestamp >= msg.timestamp)
-            .order_by(Message.timestamp.asc())
-            .limit(6)
-        )
-        a_list = after_q.scalars().all()
-        after = [m for m in a_list if str(m.id) != str(msg.id)][:5]
+    # 4) Загрузить контекст ±5 сообщений (один запрос)
+    ctx = (await load_context_windows(db, [msg], size=5))[str(msg.id)]
 
     return {
         "context": {
             "group_name": group.name if group else None,
-            "before": [ser(m) for m in before],
+            "before": [ser(m) for m in ctx["before"]],
             "message": ser(msg),
-            "after": [ser(m) for m in after],
+            "after": [ser(m) for m in ctx["after"]],
         }
     }
 
@@ -332,85 +288,33 @@ async def search_by_text(
     q: str = Query(..., min_length=1),
     page: int = Query(1, ge=1),
     limit: int = Query(20, le=100),
+    sort: str = Query("relevance", pattern="^(relevance|date)$"),
     db: AsyncSession = Depends(get_db),
     user=Depends(get_current_user),
 ):
-    """Полнотекстовый поиск по полю text сообщений (FULLTEXT MATCH AGAINST)."""
+    """Полнотекстовый поиск по сообщениям (движок — TEXT_SEARCH_BACKEND, см. text_search)."""
     offset = (page - 1) * limit
 
-    # FULLTEXT поиск — используем сырой SQL MATCH AGAINST для MariaDB
-    # Экранируем запрос, убираем спецсимволы boolean mode
-    safe_q = q.replace("'", "''").replace("+", "").replace("-", "").replace("*", "").replace("(", "").replace(")", "")
-    
-    stmt = (
-        select(Message, Group.name.label("group_name"))
-        .join(Group, Message.group_id == Group.id, isouter=False)
+    ids, total = await text_search.search_message_ids(
+        db, q, public_only=user.role != "admin", offset=offset, limit=limit, sort=sort
     )
-    if user.role != "admin":
-        stmt = stmt.where(Group.is_public == True)
+    if not ids:
+        return {"query": q, "total": total, "results": []}
 
-    stmt_ft = stmt.where(text("MATCH(messages.text) AGAINST(:q IN BOOLEAN MODE)")).order_by(Message.timestamp.desc()).offset(offset).limit(limit)
-    
-    try:
-        result = await db.execute(stmt_ft, {"q": safe_q})
-        rows = result.all()
-    except Exception:
-        # Fallback на LIKE если FULLTEXT-индекс ещё не создан
-        stmt_fallback = stmt.where(Message.text.like(f"%{q}%")).order_by(Message.timestamp.desc()).offset(offset).limit(limit)
-        result = await db.execute(stmt_fallback)
-        rows = result.all()
+    result = await db.execute(
+        select(Message, Group.name.label("group_name"))
+        .join(Group, Message.group_id == Group.id)
+        .where(Message.id.in_([uuid.UUID(mid) for mid in ids]))
+    )
+    # Порядок выдачи задаёт движок поиска (релевантность или дата)
+    by_id = {str(msg.id): (msg, gname) for msg, gname in result.all()}
+    rows = [by_id[mid] for mid in ids if mid in by_id]
 
     if not rows:
-        return {"query": q, "total": 0, "results": []}
-
-    def ser(m):
-        return {
-            "id": str(m.id), "text": m.text, "has_photo": m.has_photo,
-            "photo_path": m.photo_path,
-            "timestamp": m.timestamp.isoformat() if m.timestamp else None,
-            "sender_name": m.sender_name,
-        }
-
-    # ── Индекс-оптимизированная последовательная загрузка контекста ──
-    async def _fetch_ctx(msg_id_str: str, msg) -> tuple:
-        if not msg.timestamp or not msg.group_id:
-            return msg_id_str, {"before": [], "after": []}
-            
-        before_q = await db.execute(
-            select(Message)
-            .where(
-                Message.group_id == msg.group_id,
-                Message.timestamp <= msg.timestamp
-            )
-            .order_by(Message.timestamp.desc())
-            .limit(6)
-        )
-        b_list = before_q.scalars().all()
-        
-        after_q = await db.execute(
-            select(Message)
-            .where(
-                Message.group_id == msg.group_id,
-                Message.timestamp >= msg.timestamp
-            )
-            .order_by(Message.timestamp.asc())
-            .limit(6)
-        )
-        a_list = after_q.scalars().all()
-        
-        before = [m for m in b_list if str(m.id) != str(msg.id)][:5]
-        after = [m for m in a_list if str(m.id) != str(msg.id)][:5]
-        
-        return msg_id_str, {
-            "before": list(reversed(before)),
-            "after": list(after),
-        }
+        return {"query": q, "total": total, "results": []}
 
-    context_map = {}
-    if rows:
-        for msg, _ in rows:
-            _, ctx = await _fetch_ctx(str(msg.id), msg)
-            context_map[str(msg.id)] = ctx
+    # ── Контекст всей страницы одним запросом ──
+    context_map = await load_context_windows(db, [msg for msg, _ in rows], size=5)
 
     results_data = []
     for msg, gname in rows:
@@ -435,7 +339,7 @@ async def search_by_text(
 
     return {
         "query": q,
-        "total": len(rows),
+        "total": total,
         "results": results_data,
     }
 
@@ -463,6 +367,7 @@ async def search_by_phone(
     else:
         # Используем как частичный поиск
         search_phone = digits
+    full_phone = search_phone if phones else None
 
     offset = (page - 1) * limit
 
@@ -474,7 +379,8 @@ async def search_by_phone(
     if user.role != "admin":
         stmt = stmt.where(Group.is_public == True)
 
-    stmt = stmt.where(MessagePhone.phone.like(f"%{search_phone}%"))
+    # Полный номер — по ix_message_phones_phone, часть номера — через phone_suffixes
+    stmt = stmt.where(phone_filter(search_phone, full_phone))
     stmt = stmt.distinct().order_by(Message.timestamp.desc()).offset(offset).limit(limit)
 
     result = await db.execute(stmt)
@@ -483,47 +389,32 @@ async def search_by_phone(
     if not rows:
         return {"query": q, "normalized": search_phone, "total": 0, "results": []}
 
-    def ser(m):
-        return {
-            "id": str(m.id), "text": m.text, "has_photo": m.has_photo,
-            "photo_path": m.photo_path,
-            "timestamp": m.timestamp.isoformat() if m.timestamp else None,
-            "sender_name": m.sender_name,
-        }
+    page_messages = [msg for msg, _ in rows]
+
+    # Номера всех сообщений страницы — одним запросом
+    phones_map: dict[str, list[str]] = {}
+    phones_res = await db.execute(
+        select(MessagePhone.message_id, MessagePhone.phone)
+        .where(MessagePhone.message_id.in_([msg.id for msg in page_messages]))
+    )
+    for message_id, phone in phones_res.all():
+        phones_map.setdefault(str(message_id), []).append(phone)
+
+    # Контекст: 3 до и 3 после — для всей страницы одним запросом
+    context_map = await load_context_windows(db, page_messages, size=3)
 
     results_data = []
     for msg, gname in rows:
-        # Получаем номера для этого сообщения
-        phones_res = await db.execute(select(MessagePhone.phone).where(MessagePhone.message_id == msg.id))
-        msg_phones = [p[0] for p in phones_res.all()]
+        msg_phones = phones_map.get(str(msg.id), [])
 
-        # Контекст: 3 до и 3 после
         context = None
         if msg.timestamp and msg.group_id:
-            before_q = await db.execute(
-                select(Message)
-                .where(Message.group_id == msg.group_id, Message.timestamp <= msg.timestamp)
-                .order_by(Message.timestamp.desc())
-                .limit(4)
-            )
-            b_list = before_q.scalars().all()
-            before = [m for m in b_list if str(m.id) != str(msg.id)][:3]
-            before = list(reversed(before))
-
-            after_q = await db.execute(
-                select(Message)
-                .where(Message.group_id == msg.group_id, Message.timestamp >= msg.timestamp)
-                .order_by(Message.timestamp.asc())
-                .limit(4)
-            )
-            a_list = after_q.scalars().all()
-            after = [m for m in a_list if str(m.id) != str(msg.id)][:3]
-
+            ctx = context_map[str(msg.id)]
             context = {
                 "group_name": gname,
-                "before": [ser(m) for m in before],
+                "before": [ser(m) for m in ctx["before"]],
                 "message": ser(msg),
-                "after": [ser(m) for m in after],
+                "after": [ser(m) for m in ctx["after"]],
             }
 
         results_data.append({
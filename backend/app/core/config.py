@@ -13,8 +13,66 @@ class Settings(BaseSettings):
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
 
+    # Профиль коллекции faces: default | int8 | int8_disk | binary (см. qdrant_service)
+    QDRANT_COLLECTION_PROFILE: str = "default"
+    QDRANT_HNSW_M: int = 16
+    QDRANT_HNSW_EF_CONSTRUCT: int = 200
+    QDRANT_SEARCH_EF: int = 128
+
+    # Write-behind для векторов: воркеры пишут в outbox, outbox_relay.py — в Redis stream,
+    # vector_flusher.py — в Qdrant
+    QDRANT_WRITE_BEHIND: bool = False
+    VECTOR_QUEUE_STREAM: str = "facewatch:face_vectors"
+    VECTOR_FLUSH_BATCH: int = 1000
+    # Записи, зависшие у consumer дольше этого, забирает другой флашер (XAUTOCLAIM)
+    VECTOR_CLAIM_IDLE_MS: int = 60_000
+
+    # Текстовый поиск: mariadb (FULLTEXT по text) | fts5 (локальный индекс SQLite, text + document_text)
+    TEXT_SEARCH_BACKEND: str = "mariadb"
+    # Файл индекса FTS5 — на локальном диске, не на QNAP (SQLite WAL не работает по сети)
+    TEXT_INDEX_PATH: str = "/var/lib/facewatch/text_index.sqlite3"
+
+    # Кэш резолва групп при приёме сообщений: Redis (общий) и LRU в процессе (только одобренные)
+    GROUP_CACHE_TTL: int = 600
+    GROUP_CACHE_LOCAL_TTL: int = 30
+
+    # Pre-check дубликатов в Redis (Bloom-фильтр + горячие ключи), заполняется rebuild_dedup_filter.py
+    DEDUP_FILTER_ENABLED: bool = False
+    DEDUP_BLOOM_BITS: int = 2 ** 27  # 16 МБ: ~1% ложных срабатываний на ~14 млн ключей
+    DEDUP_BLOOM_HASHES: int = 7
+    DEDUP_HOT_TTL: int = 3600
+
+    # Transactional outbox для задач распознавания: публикует outbox_relay.py
+    TASK_OUTBOX_ENABLED: bool = False
+    OUTBOX_RELAY_BATCH: int = 500
+
+    # Максимум сообщений в одном запросе /api/bot/messages:batch
+    BOT_BATCH_MAX_MESSAGES: int = 500
+
+    # Фоновый импорт архивов (/api/import): очередь Celery imports, прогресс задач в Redis
+    IMPORT_WORKERS: int = 8
+    IMPORT_BATCH_SIZE: int = 500
+    IMPORT_TASK_TIME_LIMIT: int = 48 * 3600
+    IMPORT_JOB_TTL: int = 7 * 24 * 3600
+
     # Хранилище файлов (QNAP mount)
     QNAP_MOUNT_PATH: str = "/mnt/qnap_photos"
+    # blob без ссылок, переиспользованный приёмом недавнее этого срока, удаляется не сразу, а отложенной задачей
+    BLOB_RELEASE_GRACE_SECONDS: int = 3600
+    # Кропы лиц: "files" — JPEG-файл на лицо, "pack" — append-only pack-файлы (face_pack_store)
+    FACE_CROP_STORE: str = "files"
+    FACE_PACK_MAX_BYTES: int = 1024 * 1024 * 1024
+    # Превью для галерей (/files/thumb/{size}/...): кэш на локальном SSD, не на QNAP
+    THUMB_CACHE_DIR: str = "/var/cache/facewatch/thumbs"
+    THUMB_SIZES: list[int] = [160, 320, 640]
+    THUMB_QUALITY: int = 80
+    THUMB_CACHE_MAX_AGE: int = 7 * 24 * 3600
+    # Очистка кэша превью (prune_thumbnails.py): удалять не запрошенные дольше N дней и сверх объёма
+    THUMB_CACHE_KEEP_DAYS: int = 30
+    THUMB_CACHE_MAX_BYTES: int = 50 * 1024 * 1024 * 1024
+    # Воркер заранее делает превью этих размеров после распознавания (пусто — только лениво)
+    THUMB_EAGER_SIZES: list[int] = []
+    THUMB_EAGER_FORMATS: list[str] = ["webp"]
 
     # JWT
     JWT_SECRET: str = "change_me_in_production"
@@ -35,6 +93,22 @@ class Settings(BaseSettings):
     # InsightFace
     FACE_SIMILARITY_THRESHOLD: float = 0.75
     FACE_CROP_PADDING: float = 0.3
+    # Масштабы детектора в воркере (детекции со всех масштабов объединяются через NMS)
+    FACE_DET_SCALES: list[int] = [320, 160, 640]
+    # Сервис инференса для поиска (app.inference.server). Пусто — модель грузится в API-процесс
+    INFERENCE_URL: str = ""
+    INFERENCE_UDS: str = ""  # путь к Unix-сокету, если сервис слушает сокет
+    INFERENCE_TIMEOUT: float = 30.0
+    INFERENCE_MAX_BATCH: int = 16
+    INFERENCE_MAX_WAIT_MS: int = 10
+    # Поиск: лицо на фото обычно крупное, одного масштаба 320 достаточно
+    SEARCH_DET_SCALES: list[int] = [320]
+    # TTL кэша детекции/эмбеддингов для поиска по фото (секунды)
+    FACE_CACHE_TTL: int = 3600
+    # Батчевый режим воркера: сколько фото обрабатывает одна задача process_photo_batch
+    PHOTO_BATCH_SIZE: int = 1
+    # Максимум лиц в одном прогоне ArcFace (ограничивает пиковую память)
+    FACE_REC_BATCH_SIZE: int = 64
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,94 @@
+"""
+Коалесцер запросов инференса: одновременные поиски собираются в один батч
+(до max_batch изображений или max_wait_ms ожидания) и проходят через ONNX вместе.
+"""
+import asyncio
+import logging
+
+from app.services.face_models import FaceModelRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceCoalescer:
+    def __init__(
+        self,
+        registry: FaceModelRegistry,
+        scales: list[int],
+        max_batch: int,
+        max_wait_ms: int,
+        rec_batch_size: int = 64,
+    ):
+        self.registry = registry
+        self.scales = scales
+        self.rec_batch_size = rec_batch_size
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, img) -> list[dict]:
+        """Ставит изображение в очередь и ждёт результат своего батча."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((img, future))
+        return await future
+
+    async def _collect(self) -> list[tuple]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _analyze(self, images: list) -> list[list[dict]]:
+        return [
+            [
+                {
+                    "bbox": face.bbox.tolist(),
+                    "det_score": float(face.det_score),
+                    "embedding": face.embedding.tolist(),
+                }
+                for face in faces
+            ]
+            for faces in self.registry.analyze(images, self.scales, self.rec_batch_size)
+        ]
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            batch = [(img, future) for img, future in batch if not future.cancelled()]
+            if not batch:
+                continue
+            try:
+                # Один поток инференса: ORT сам распараллеливает внутри батча
+                results = await asyncio.to_thread(self._analyze, [img for img, _ in batch])
+            except Exception as e:
+                logger.error("Ошибка инференса батча из %d изображений: %s", len(batch), e, exc_info=True)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            if len(batch) > 1:
+                logger.info("Коалесцирован батч из %d изображений", len(batch))
+            for (_, future), faces in zip(batch, results):
+                if not future.done():
+                    future.set_result(faces)
@@ -0,0 +1,68 @@
+"""
+FaceWatch Inference — локальный сервис детекции и эмбеддингов лиц для поиска.
+Держит модели buffalo_l в одном процессе, API-воркеры обращаются к нему по HTTP
+или Unix-сокету (см. app.services.inference_client).
+
+Запуск:
+    uvicorn app.inference.server:app --host 0.0.0.0 --port 8100 --workers 1
+    uvicorn app.inference.server:app --uds /run/facewatch/inference.sock --workers 1
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+import cv2
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request
+
+from app.core.config import settings
+
+INFERENCE_ORT_THREADS = int(os.getenv("INFERENCE_ORT_THREADS", "8"))
+
+os.environ.setdefault("OMP_NUM_THREADS", str(INFERENCE_ORT_THREADS))
+os.environ.setdefault("MKL_NUM_THREADS", str(INFERENCE_ORT_THREADS))
+os.environ.setdefault("OPENBLAS_NUM_THREADS", str(INFERENCE_ORT_THREADS))
+
+from app.inference.coalescer import InferenceCoalescer  # noqa: E402
+from app.services.face_models import FaceModelRegistry  # noqa: E402
+
+registry = FaceModelRegistry(INFERENCE_ORT_THREADS, inter_threads=2)
+coalescer = InferenceCoalescer(
+    registry,
+    scales=settings.SEARCH_DET_SCALES,
+    max_batch=settings.INFERENCE_MAX_BATCH,
+    max_wait_ms=settings.INFERENCE_MAX_WAIT_MS,
+    rec_batch_size=settings.FACE_REC_BATCH_SIZE,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Модели грузятся до приёма запросов — сервис готов, когда отвечает /health
+    await asyncio.to_thread(registry.load)
+    coalescer.start()
+    yield
+    await coalescer.stop()
+
+
+app = FastAPI(title="FaceWatch Inference", version="1.0.0", lifespan=lifespan)
+
+
+def _decode(contents: bytes):
+    return cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+
+
+@app.post("/embed")
+async def embed(request: Request):
+    """Тело — байты изображения. Возвращает bbox, det_score и эмбеддинг каждого лица."""
+    contents = await request.body()
+    img = await asyncio.to_thread(_decode, contents) if contents else None
+    if img is None:
+        raise HTTPException(status_code=400, detail="Не удалось прочитать изображение")
+    faces = await coalescer.submit(img)
+    return {"faces": faces}
+
+
+@app.get("/health")
+async def health():
+    return {"ok": True}
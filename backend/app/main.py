@@ -12,7 +12,7 @@ from app.core.security import hash_password
 from app.models.models import User, UserRole
 from app.services.qdrant_service import ensure_collection_exists
 
-from app.api.endpoints import auth, messages, search, groups, imports, webhook, bot_receiver, users, input, tg_accounts, ai, platforms
+from app.api.endpoints import auth, messages, search, groups, imports, webhook, bot_receiver, users, input, tg_accounts, ai, platforms, files
 
 
 @asynccontextmanager
@@ -43,14 +43,16 @@ async def lifespan(app: FastAPI):
     except Exception:
         pass  # Qdrant может быть недоступен при запуске
 
-    # Прогрев InsightFace — загружаем модель при старте, не при первом запросе
-    try:
-        import asyncio as _asyncio
-        from app.api.endpoints.search import _get_face_app
-        await _asyncio.to_thread(_get_face_app)
-        print("InsightFace модель загружена при старте (warm-up OK)")
-    except Exception as e:
-        print(f"InsightFace warm-up: {e}")
+    # Прогрев InsightFace — только если поиск не вынесен в сервис инференса
+    from app.services import inference_client
+    if not inference_client.is_enabled():
+        try:
+            import asyncio as _asyncio
+            from app.api.endpoints.search import warm_up_face_models
+            await _asyncio.to_thread(warm_up_face_models)
+            print("InsightFace модель загружена при старте (warm-up OK)")
+        except Exception as e:
+            print(f"InsightFace warm-up: {e}")
 
     yield
 
@@ -76,6 +78,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Кропы лиц из pack-файлов — до StaticFiles, иначе /files перехватит запрос
+app.include_router(files.router, prefix="/files", tags=["Файлы"])
+
 # Монтирование файлового хранилища (для отдачи фото)
 try:
     app.mount("/files", StaticFiles(directory=settings.QNAP_MOUNT_PATH), name="files")
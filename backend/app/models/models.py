@@ -177,6 +177,33 @@ class Face(Base):
     )
 
 
+class FaceCrop(Base):
+    """Кроп лица в pack-файле (FACE_CROP_STORE=pack): facepacks/packs/{pack}, length байт со смещения pack_offset."""
+    __tablename__ = "face_crops"
+
+    face_id = Column(Uuid, primary_key=True)
+    pack = Column(String(100), nullable=False)
+    pack_offset = Column(BigInteger, nullable=False)
+    length = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_face_crops_pack", "pack"),
+    )
+
+
+class PhotoFaceResult(Base):
+    """
+    Результат распознавания по хешу фото: одинаковое фото из других сообщений и групп
+    не прогоняется через ONNX повторно. faces — [{point_id, bbox, confidence, crop_path}],
+    векторы хранятся в Qdrant под point_id; пустой список — лиц на фото нет.
+    """
+    __tablename__ = "photo_face_results"
+
+    photo_hash = Column(String(64), primary_key=True)
+    faces = Column(JSON, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+
 class MessagePhone(Base):
     __tablename__ = "message_phones"
 
@@ -192,6 +219,14 @@ class MessagePhone(Base):
     )
 
 
+class PhoneSuffix(Base):
+    """Все суффиксы номера (от 3 цифр): поиск по части номера — диапазон по PK вместо LIKE '%…%'."""
+    __tablename__ = "phone_suffixes"
+
+    suffix = Column(String(15), primary_key=True)
+    phone = Column(String(15), primary_key=True)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -260,3 +295,18 @@ class AiReport(Base):
         Index("ix_ai_reports_user_id", "user_id"),
         Index("ix_ai_reports_type", "report_type"),
     )
+
+
+class TaskOutbox(Base):
+    """Задачи Celery, записанные в одной транзакции с данными; публикует outbox_relay.py."""
+    __tablename__ = "task_outbox"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    task_name = Column(String(64), nullable=False)
+    args = Column(JSON, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    sent_at = Column(TIMESTAMP, nullable=True)
+
+    __table_args__ = (
+        Index("ix_task_outbox_sent_at", "sent_at", "id"),
+    )
@@ -0,0 +1,168 @@
+"""
+Контентно-адресуемое хранилище фото на QNAP: /blobs/ab/cd/<sha256>.jpg.
+
+Одинаковые байты хранятся один раз, сколько бы сообщений (и групп) на них ни ссылались.
+Счётчик ссылок — сами сообщения: blob жив, пока есть Message с таким photo_hash;
+release_photos() удаляет файлы, на которые больше никто не ссылается, release_unwritten() —
+blob сообщений, которые так и не записались (дубликат при вставке, откат).
+
+Гонка с приёмом: приём видит готовый blob и не пишет копию, а сообщение со ссылкой
+коммитит позже. Поэтому приём обновляет mtime переиспользуемого blob, а удаление сначала
+атомарно переименовывает файл (приём после этого blob не найдёт и запишет заново)
+и проверяет mtime: blob, тронутый за последние BLOB_RELEASE_GRACE_SECONDS, возвращается
+на место, а решение откладывается задачей release_blobs (ссылки перепроверяются).
+Расширение .jpg оставлено, чтобы StaticFiles (/files) отдавал правильный Content-Type.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.models import Message
+from app.services.storage_service import incoming_dir, discard_spooled_photo, get_qnap_path
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def blob_path(sha256: str) -> Path:
+    return get_qnap_path() / "blobs" / sha256[:2] / sha256[2:4] / f"{sha256}.jpg"
+
+
+def _reuse_blob(path: Path) -> bool:
+    """Есть ли blob; существующий отмечается как переиспользованный (mtime) — см. _release_blob."""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def commit_spooled_blob(tmp_path: str, sha256: str) -> str:
+    """
+    Переносит временный файл (spool_upload) в blob. Если такой blob уже есть —
+    временный файл удаляется, повторная запись не нужна.
+    """
+    path = blob_path(sha256)
+    if _reuse_blob(path):
+        discard_spooled_photo(tmp_path)
+        return str(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp_path, path)
+    return str(path)
+
+
+def save_blob(data: bytes, sha256: str | None = None) -> tuple[str, str]:
+    """Сохраняет байты в blob (через временный файл и атомарный rename). Возвращает (путь, sha256)."""
+    sha256 = sha256 or hashlib.sha256(data).hexdigest()
+    path = blob_path(sha256)
+    if _reuse_blob(path):
+        return str(path), sha256
+    tmp_path = incoming_dir() / f"{uuid.uuid4().hex}.part"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    return commit_spooled_blob(str(tmp_path), sha256), sha256
+
+
+def hash_file(src_path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(src_path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def copy_file_to_blob(src_path: str, sha256: str | None = None) -> tuple[str, str]:
+    """Для импортёров: копирует файл в blob, если его там ещё нет. Возвращает (путь, sha256)."""
+    sha256 = sha256 or hash_file(src_path)
+    path = blob_path(sha256)
+    if _reuse_blob(path):
+        return str(path), sha256
+    tmp_path = incoming_dir() / f"{uuid.uuid4().hex}.part"
+    shutil.copyfile(src_path, tmp_path)
+    return commit_spooled_blob(str(tmp_path), sha256), sha256
+
+
+def _release_blob(sha256: str) -> bool:
+    """
+    Удаляет blob без ссылок. False — blob недавно переиспользован приёмом,
+    он остаётся на месте до повторной проверки.
+    """
+    path = blob_path(sha256)
+    released = path.with_name(f"{sha256}.{uuid.uuid4().hex}.released")
+    try:
+        os.rename(path, released)
+    except FileNotFoundError:
+        return True
+    # rename сохраняет mtime: свежий — значит, приём успел взять blob до переименования
+    if time.time() - released.stat().st_mtime < settings.BLOB_RELEASE_GRACE_SECONDS:
+        os.replace(released, path)
+        return False
+    os.remove(released)
+    return True
+
+
+def _referenced_query(hashes: set[str]):
+    return select(Message.photo_hash).where(Message.photo_hash.in_(hashes)).distinct()
+
+
+def release_blobs_sync(session, photo_hashes) -> tuple[int, list[str]]:
+    """Синхронный вариант для Celery: (удалено, отложено)."""
+    hashes = {h for h in photo_hashes if h}
+    if not hashes:
+        return 0, []
+    orphaned = hashes - set(session.execute(_referenced_query(hashes)).scalars())
+    deferred = [sha256 for sha256 in orphaned if not _release_blob(sha256)]
+    return len(orphaned) - len(deferred), deferred
+
+
+def _schedule_release(hashes: list[str]):
+    # По имени: API не импортирует модуль задач (он тянет ONNX)
+    from app.worker.celery_app import celery_app
+    celery_app.send_task("release_blobs", args=[hashes], countdown=settings.BLOB_RELEASE_GRACE_SECONDS)
+
+
+async def release_photos(db: AsyncSession, photo_hashes) -> int:
+    """
+    Вызывать после commit удаления сообщений: удаляет blob-файлы,
+    на которые не ссылается ни одно сообщение. Возвращает число удалённых.
+    """
+    hashes = {h for h in photo_hashes if h}
+    if not hashes:
+        return 0
+    orphaned = hashes - set((await db.execute(_referenced_query(hashes))).scalars())
+    deferred = [sha256 for sha256 in orphaned if not await asyncio.to_thread(_release_blob, sha256)]
+    if deferred:
+        try:
+            await asyncio.to_thread(_schedule_release, deferred)
+        except Exception:
+            logger.exception("Не удалось отложить удаление %d blob", len(deferred))
+    removed = len(orphaned) - len(deferred)
+    if removed:
+        logger.info("Удалено %d blob без ссылок", removed)
+    return removed
+
+
+async def release_unwritten(db: AsyncSession, messages, inserted=None) -> int:
+    """
+    Blob кладётся в хранилище до INSERT: если сообщение не записано (дубликат
+    при вставке или откат транзакции — inserted=None), его blob освобождается,
+    иначе на него никто не сошлётся. Ошибки только логируются.
+    """
+    hashes = [msg.photo_hash for msg in messages if inserted is None or msg.id not in inserted]
+    try:
+        if inserted is None:
+            await db.rollback()
+        return await release_photos(db, hashes)
+    except Exception:
+        logger.exception("Не удалось освободить blob незаписанных сообщений")
+        return 0
@@ -0,0 +1,110 @@
+"""
+Пакетная запись сообщений: бот (/messages:batch) и импорт архивов (/api/import, import_local.py).
+
+Вместо ORM unit-of-work — INSERT ... ON DUPLICATE KEY UPDATE id=id через executemany
+чанками по CHUNK_SIZE строк: дубликаты по uq_group_telegram_msg / uq_group_external_msg
+пропускаются, реально вставленные определяются по id. INSERT IGNORE не подходит:
+он превращает в предупреждения и другие ошибки (обрезку, NOT NULL, внешние ключи). Номера телефонов из текста пишутся
+в message_phones и phone_suffixes той же транзакцией, тоже пачкой.
+"""
+import asyncio
+import uuid
+
+import pymysql
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import mysql
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import Message, MessagePhone
+from app.services import outbox
+from app.services.phone_index import index_phones
+from app.services.phone_utils import extract_phones
+
+MYSQL_DEADLOCK_CODES = {1205, 1213}
+CHUNK_SIZE = 1000
+
+
+def is_mysql_deadlock(error: Exception) -> bool:
+    if not isinstance(error, OperationalError):
+        return False
+    original = getattr(error, "orig", None)
+    if isinstance(original, pymysql.MySQLError) and original.args:
+        return original.args[0] in MYSQL_DEADLOCK_CODES
+    return False
+
+
+def photo_task_args(msg: Message) -> tuple:
+    return (str(msg.id), msg.photo_path, str(msg.group_id), msg.timestamp.isoformat() if msg.timestamp else "")
+
+
+def _chunks(items: list, size: int = CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def message_rows(messages: list[Message]) -> list[dict]:
+    """
+    Строки для insert(Message.__table__). Python-default колонок (source_platform и т.п.)
+    ORM подставил бы при flush — здесь они проставляются в сами объекты.
+    """
+    columns = [c for c in Message.__table__.columns if c.key != "created_at"]
+    rows = []
+    for msg in messages:
+        for column in columns:
+            default = column.default
+            if getattr(msg, column.key) is None and default is not None and (default.is_scalar or default.is_callable):
+                setattr(msg, column.key, default.arg if default.is_scalar else default.arg(None))
+        rows.append({column.key: getattr(msg, column.key) for column in columns})
+    return rows
+
+
+async def insert_messages(db: AsyncSession, messages: list[Message]) -> set[uuid.UUID]:
+    """
+    Вставка сообщений (дубликаты пропускаются) и их номеров телефонов в текущую транзакцию (commit — на вызывающем).
+    Возвращает id реально вставленных.
+    """
+    inserted = set()
+    table = Message.__table__
+    stmt = mysql.insert(table).on_duplicate_key_update(id=table.c.id)
+    for chunk in _chunks(message_rows(messages)):
+        await db.execute(stmt, chunk)
+    for chunk in _chunks([msg.id for msg in messages]):
+        inserted.update((await db.execute(select(Message.id).where(Message.id.in_(chunk)))).scalars())
+
+    phone_rows = []
+    phones = set()
+    for msg in messages:
+        search_text = msg.text or msg.document_text
+        if msg.id not in inserted or not search_text:
+            continue
+        for phone in extract_phones(search_text):
+            phone_rows.append({"id": uuid.uuid4(), "message_id": msg.id, "phone": phone})
+            phones.add(phone)
+    for chunk in _chunks(phone_rows):
+        await db.execute(insert(MessagePhone.__table__), chunk)
+    await index_phones(db, phones)
+    return inserted
+
+
+async def write_messages(db: AsyncSession, messages: list[Message]) -> set[uuid.UUID]:
+    """
+    insert_messages + задачи распознавания в outbox, один commit; при deadlock — повтор.
+    Возвращает id реально вставленных (остальные — дубликаты).
+    """
+    if not messages:
+        return set()
+    for attempt in range(3):
+        try:
+            inserted = await insert_messages(db, messages)
+            outbox.stage_photo_tasks(
+                db, [photo_task_args(msg) for msg in messages if msg.id in inserted and msg.photo_path]
+            )
+            await db.commit()
+            return inserted
+        except OperationalError as exc:
+            await db.rollback()
+            if not is_mysql_deadlock(exc) or attempt == 2:
+                raise
+            await asyncio.sleep(0.2 * (attempt + 1))
+    return set()
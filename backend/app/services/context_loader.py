@@ -0,0 +1,62 @@
+"""
+Загрузка контекста (±N соседних сообщений в группе) для целой страницы результатов
+одним запросом: по два keyset-подзапроса на сообщение (до/после по timestamp),
+объединённых UNION ALL. Каждый подзапрос идёт по индексу ix_messages_group_timestamp.
+"""
+from sqlalchemy import literal, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.models.models import Message
+
+
+def serialize_context_message(m: Message) -> dict:
+    return {
+        "id": str(m.id), "text": m.text, "has_photo": m.has_photo,
+        "photo_path": m.photo_path,
+        "timestamp": m.timestamp.isoformat() if m.timestamp else None,
+        "sender_name": m.sender_name,
+    }
+
+
+async def load_context_windows(db: AsyncSession, messages: list[Message], size: int) -> dict[str, dict]:
+    """
+    Возвращает {message_id: {"before": [...], "after": [...]}} — по size сообщений
+    до и после каждого сообщения (в хронологическом порядке), без самого сообщения.
+    Сообщения без timestamp/group_id получают пустой контекст.
+    """
+    windows = {str(m.id): {"before": [], "after": []} for m in messages}
+    anchors = [m for m in messages if m.timestamp and m.group_id]
+    if not anchors:
+        return windows
+
+    table = Message.__table__
+    parts = []
+    for m in anchors:
+        anchor_id = literal(str(m.id)).label("anchor_id")
+        parts.append(
+            select(table, anchor_id, literal("before").label("side"))
+            .where(table.c.group_id == m.group_id, table.c.timestamp <= m.timestamp)
+            .order_by(table.c.timestamp.desc())
+            .limit(size + 1)
+        )
+        parts.append(
+            select(table, anchor_id, literal("after").label("side"))
+            .where(table.c.group_id == m.group_id, table.c.timestamp >= m.timestamp)
+            .order_by(table.c.timestamp.asc())
+            .limit(size + 1)
+        )
+
+    window = union_all(*parts).subquery("context_window")
+    neighbour = aliased(Message, window)
+    result = await db.execute(select(neighbour, window.c.anchor_id, window.c.side))
+
+    for msg, anchor_id, side in result.all():
+        if str(msg.id) == anchor_id:
+            continue
+        windows[anchor_id][side].append(msg)
+
+    for ctx in windows.values():
+        ctx["before"] = sorted(ctx["before"], key=lambda m: m.timestamp)[-size:]
+        ctx["after"] = sorted(ctx["after"], key=lambda m: m.timestamp)[:size]
+    return windows
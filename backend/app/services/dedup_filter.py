@@ -0,0 +1,139 @@
+"""
+Вероятностный pre-check дубликатов при приёме сообщений.
+
+Bloom-фильтр на обычном Redis-битмапе (SETBIT/GETBIT — модуль RedisBloom не нужен)
+плюс "горячие" ключи недавно сохранённых сообщений с TTL.
+    HOT    — ключ точно сохранён недавно: дубликат без запроса к БД;
+    ABSENT — фильтр отрицательный: ключа в БД нет, SELECT не нужен;
+    MAYBE  — фильтр положительный, не готов или Redis недоступен: проверяем в БД.
+
+Бит 0 битмапа — флаг готовности, его ставит rebuild_dedup_filter.py после заполнения.
+Если Redis вытеснит битмап (allkeys-lru), флаг пропадёт вместе с ним
+и приём вернётся к проверкам в БД до следующей пересборки.
+
+Дубликат фото — тот же хеш в той же группе: пересылка в другую группу сохраняется
+(распознавание при этом не повторяется, см. photo_faces). Ключ битмапа версионирован —
+после смены формата ключей фильтр не готов, пока его не пересоберут.
+"""
+import hashlib
+import logging
+
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+BLOOM_KEY = "dedup:bloom:v2"
+HOT_PREFIX = "dedup:hot:"
+READY_BIT = 0
+
+HOT = "hot"
+ABSENT = "absent"
+MAYBE = "maybe"
+
+_redis = None
+
+
+def _get_redis():
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(settings.REDIS_URL)
+    return _redis
+
+
+def is_enabled() -> bool:
+    return settings.DEDUP_FILTER_ENABLED
+
+
+def message_keys(group_id, telegram_message_id=None, external_message_id=None) -> list[str]:
+    keys = []
+    if telegram_message_id is not None:
+        keys.append(f"tg:{group_id}:{telegram_message_id}")
+    if external_message_id:
+        keys.append(f"ext:{group_id}:{external_message_id}")
+    return keys
+
+
+def photo_key(group_id, photo_hash: str) -> str:
+    return f"photo:{group_id}:{photo_hash}"
+
+
+def keys_for_message(msg) -> list[str]:
+    """Все ключи сохранённого сообщения: id в группе и хеш фото."""
+    keys = message_keys(msg.group_id, msg.telegram_message_id, msg.external_message_id)
+    if msg.photo_hash:
+        keys.append(photo_key(msg.group_id, msg.photo_hash))
+    return keys
+
+
+def bit_positions(key: str) -> list[int]:
+    """k позиций двойным хешированием; бит 0 зарезервирован под флаг готовности."""
+    digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    size = settings.DEDUP_BLOOM_BITS - 1
+    return [1 + (h1 + i * h2) % size for i in range(settings.DEDUP_BLOOM_HASHES)]
+
+
+async def check(keys: list[str]) -> dict[str, str]:
+    """Статус каждого ключа одним round-trip в Redis."""
+    if not keys or not is_enabled():
+        return {key: MAYBE for key in keys}
+
+    try:
+        pipe = _get_redis().pipeline(transaction=False)
+        pipe.getbit(BLOOM_KEY, READY_BIT)
+        for key in keys:
+            pipe.exists(HOT_PREFIX + key)
+            for pos in bit_positions(key):
+                pipe.getbit(BLOOM_KEY, pos)
+        replies = await pipe.execute()
+    except Exception as e:
+        logger.warning("Dedup-фильтр недоступен: %s", e)
+        return {key: MAYBE for key in keys}
+
+    ready = bool(replies[0])
+    result = {}
+    idx = 1
+    for key in keys:
+        hot = bool(replies[idx])
+        bits = replies[idx + 1: idx + 1 + settings.DEDUP_BLOOM_HASHES]
+        idx += 1 + settings.DEDUP_BLOOM_HASHES
+        if hot:
+            result[key] = HOT
+        elif ready and not all(bits):
+            result[key] = ABSENT
+        else:
+            result[key] = MAYBE
+    return result
+
+
+async def fill(keys: list[str], hot: bool = False):
+    """Записывает ключи в фильтр; ошибки Redis пробрасываются (для пересборки)."""
+    pipe = _get_redis().pipeline(transaction=False)
+    for key in keys:
+        for pos in bit_positions(key):
+            pipe.setbit(BLOOM_KEY, pos, 1)
+        if hot:
+            pipe.set(HOT_PREFIX + key, 1, ex=settings.DEDUP_HOT_TTL)
+    await pipe.execute()
+
+
+async def add(keys: list[str], hot: bool = True):
+    """Добавляет ключи в фильтр (и в горячие — для только что сохранённых сообщений)."""
+    if not keys or not is_enabled():
+        return
+    try:
+        await fill(keys, hot=hot)
+    except Exception as e:
+        logger.warning("Не удалось обновить dedup-фильтр: %s", e)
+
+
+async def reset():
+    """Сбрасывает фильтр (и флаг готовности) перед пересборкой."""
+    await _get_redis().delete(BLOOM_KEY)
+
+
+async def mark_ready():
+    await _get_redis().setbit(BLOOM_KEY, READY_BIT, 1)
@@ -0,0 +1,71 @@
+"""
+Кэш результатов детекции для поиска по фото.
+Ключ — SHA-256 содержимого изображения, значение — bbox и эмбеддинги всех лиц.
+Повторные запросы с тем же фото (другой face_index / top_k / threshold)
+не запускают ONNX и даже не декодируют изображение.
+"""
+import base64
+import hashlib
+import json
+import logging
+
+import numpy as np
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "face_search:faces:"
+
+_redis = None
+
+
+def _get_redis():
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(settings.REDIS_URL)
+    return _redis
+
+
+def image_hash(contents: bytes) -> str:
+    return hashlib.sha256(contents).hexdigest()
+
+
+def _encode(faces: list[dict]) -> str:
+    return json.dumps([
+        {
+            "bbox": face["bbox"],
+            "embedding": base64.b64encode(np.asarray(face["embedding"], dtype=np.float32).tobytes()).decode(),
+        }
+        for face in faces
+    ])
+
+
+def _decode(raw: bytes | str) -> list[dict]:
+    return [
+        {
+            "bbox": item["bbox"],
+            "embedding": np.frombuffer(base64.b64decode(item["embedding"]), dtype=np.float32).tolist(),
+        }
+        for item in json.loads(raw)
+    ]
+
+
+async def get_cached_faces(key: str) -> list[dict] | None:
+    """Возвращает [{"bbox": [...], "embedding": [...]}] или None при промахе/недоступности Redis."""
+    try:
+        raw = await _get_redis().get(CACHE_PREFIX + key)
+    except Exception as e:
+        logger.warning("Кэш лиц недоступен: %s", e)
+        return None
+    if raw is None:
+        return None
+    return _decode(raw)
+
+
+async def set_cached_faces(key: str, faces: list[dict]):
+    try:
+        await _get_redis().setex(CACHE_PREFIX + key, settings.FACE_CACHE_TTL, _encode(faces))
+    except Exception as e:
+        logger.warning("Не удалось записать кэш лиц: %s", e)
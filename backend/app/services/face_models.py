@@ -0,0 +1,152 @@
+"""
+Реестр ONNX-моделей InsightFace (buffalo_l): один набор InferenceSession на процесс.
+От det_size зависит только входной размер детектора — остальные модели общие.
+"""
+import glob
+import logging
+import os.path as osp
+import threading
+
+import numpy as np
+import onnxruntime as ort
+
+logger = logging.getLogger(__name__)
+
+MODEL_PACK = "buffalo_l"
+# Воркеру и поиску нужны только bbox/kps детектора и эмбеддинг ArcFace
+DEFAULT_MODULES = ("detection", "recognition")
+
+
+class FaceModelRegistry:
+    """
+    Лениво загружает модели buffalo_l один раз с заданными ORT-потоками.
+    Детектор SCRFD в buffalo_l имеет динамический вход, поэтому любой масштаб
+    обслуживается той же сессией — новый det_size не создаёт новых сессий.
+    """
+
+    def __init__(self, intra_threads: int, inter_threads: int = 1, modules: tuple[str, ...] = DEFAULT_MODULES):
+        self.intra_threads = intra_threads
+        self.inter_threads = inter_threads
+        self.modules = modules
+        self._models = {}
+        self._lock = threading.Lock()
+        self._fixed_size_warned = False
+
+    def _session_options(self) -> ort.SessionOptions:
+        sess_options = ort.SessionOptions()
+        sess_options.intra_op_num_threads = self.intra_threads
+        sess_options.inter_op_num_threads = self.inter_threads
+        sess_options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        return sess_options
+
+    def load(self):
+        """Загружает модели (идемпотентно); вызывается лениво или для прогрева."""
+        if self._models:
+            return
+        with self._lock:
+            if self._models:
+                return
+            from insightface.model_zoo.model_zoo import ModelRouter
+            from insightface.utils import ensure_available
+
+            logger.info(
+                "Инициализация моделей %s (%s, ORT threads: intra=%d, inter=%d)...",
+                MODEL_PACK, ", ".join(self.modules), self.intra_threads, self.inter_threads,
+            )
+            model_dir = ensure_available("models", MODEL_PACK, root="~/.insightface")
+            models = {}
+            for onnx_file in sorted(glob.glob(osp.join(model_dir, "*.onnx"))):
+                model = ModelRouter(onnx_file).get_model(
+                    sess_options=self._session_options(),
+                    providers=["CPUExecutionProvider"],
+                )
+                if model is None or model.taskname not in self.modules or model.taskname in models:
+                    del model
+                    continue
+                models[model.taskname] = model
+
+            missing = set(self.modules) - set(models)
+            if missing:
+                raise RuntimeError(f"В {model_dir} нет моделей: {', '.join(sorted(missing))}")
+            self._models = models
+            logger.info("Модели %s загружены (ORT %s).", MODEL_PACK, ort.__version__)
+
+    @property
+    def detector(self):
+        self.load()
+        return self._models["detection"]
+
+    @property
+    def recognizer(self):
+        self.load()
+        return self._models["recognition"]
+
+    def detect(self, img, det_size: tuple[int, int]):
+        """Запускает только детектор на заданном масштабе. Возвращает (bboxes, kpss)."""
+        det_model = self.detector
+        if det_model.input_size is None:
+            return det_model.detect(img, input_size=det_size, max_num=0, metric="default")
+
+        if tuple(det_model.input_size) != tuple(det_size) and not self._fixed_size_warned:
+            logger.warning(
+                "Детектор экспортирован с фиксированным входом %s, det_size=%s игнорируется",
+                det_model.input_size, det_size,
+            )
+            self._fixed_size_warned = True
+        return det_model.detect(img, max_num=0, metric="default")
+
+    def detect_multiscale(self, img, scales: list[int]):
+        """
+        Один проход детектора на каждом масштабе; детекции всех масштабов
+        объединяются NMS. Возвращает (bboxes, kpss) или (None, None).
+        """
+        dets_list = []
+        kpss_list = []
+        for scale in scales:
+            bboxes, kpss = self.detect(img, (scale, scale))
+            if bboxes.shape[0] > 0:
+                dets_list.append(bboxes)
+                kpss_list.append(kpss)
+
+        if not dets_list:
+            return None, None
+        if len(dets_list) == 1:
+            return dets_list[0], kpss_list[0]
+
+        dets = np.vstack(dets_list)
+        kpss = np.vstack(kpss_list)
+        keep = self.detector.nms(dets)
+        return dets[keep], kpss[keep]
+
+    def analyze(self, images: list, scales: list[int], rec_batch_size: int = 64) -> list[list]:
+        """
+        Детекция по каждому изображению отдельно, затем один прогон ArcFace
+        по стеку выровненных кропов всех лиц всех изображений.
+        Возвращает списки лиц (bbox, kps, det_score, embedding) в порядке входных изображений.
+        """
+        from insightface.app.common import Face as DetectedFace
+        from insightface.utils import face_align
+
+        results = []
+        aligned = []
+        for img in images:
+            bboxes, kpss = self.detect_multiscale(img, scales)
+            faces = []
+            if bboxes is not None:
+                for i in range(bboxes.shape[0]):
+                    face = DetectedFace(bbox=bboxes[i, 0:4], kps=kpss[i], det_score=bboxes[i, 4])
+                    faces.append(face)
+                    aligned.append((face, img))
+            results.append(faces)
+
+        if aligned:
+            rec_model = self.recognizer
+            image_size = rec_model.input_size[0]
+            crops = [face_align.norm_crop(img, landmark=face.kps, image_size=image_size) for face, img in aligned]
+            batch = max(1, rec_batch_size)
+            for start in range(0, len(crops), batch):
+                embeddings = rec_model.get_feat(crops[start:start + batch])
+                for (face, _), embedding in zip(aligned[start:start + batch], embeddings):
+                    face.embedding = embedding.flatten()
+
+        return results
@@ -0,0 +1,143 @@
+"""
+Pack-хранилище кропов лиц (FACE_CROP_STORE=pack) вместо файла на каждое лицо.
+
+Каждый процесс дописывает кропы в свой append-only pack-файл facepacks/packs/*.pack
+(запись = заголовок [face_id 16 байт, длина 4 байта] + JPEG), индекс face_id →
+(pack, смещение, длина) — таблица face_crops в той же транзакции, что и Face.
+Face.crop_path — виртуальный путь facepacks/{face_id}.jpg, совместимый с /files:
+его отдаёт endpoints/files.py чтением диапазона из pack. Байты удалённых лиц
+освобождает compact_face_packs.py: переписанный pack переименовывается в *.dead
+(читатели со старым индексом дочитывают его) и удаляется следующим запуском.
+"""
+import io
+import os
+import socket
+import struct
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from app.core.config import settings
+from app.models.models import FaceCrop
+from app.services.storage_service import get_qnap_path, save_face_crop_to_qnap
+
+RECORD_HEADER = struct.Struct("<16sI")
+VIRTUAL_DIR = "facepacks"
+# Через час pack закрывается для записи; compact_face_packs.py трогает только pack-файлы старше суток
+PACK_SEAL_SECONDS = 3600
+DEAD_SUFFIX = ".dead"
+
+
+def is_enabled() -> bool:
+    return settings.FACE_CROP_STORE == "pack"
+
+
+def packs_dir() -> Path:
+    return get_qnap_path() / VIRTUAL_DIR / "packs"
+
+
+def pack_path(pack: str) -> Path:
+    return packs_dir() / pack
+
+
+def crop_path(face_id: str) -> str:
+    """Виртуальный путь кропа: /files/facepacks/{face_id}.jpg отдаётся из pack-файла."""
+    return str(get_qnap_path() / VIRTUAL_DIR / f"{face_id}.jpg")
+
+
+def encode_crop(face_crop: np.ndarray) -> bytes:
+    buf = io.BytesIO()
+    Image.fromarray(face_crop[:, :, ::-1]).save(buf, format="JPEG")  # BGR -> RGB
+    return buf.getvalue()
+
+
+class PackWriter:
+    """
+    Append-only pack текущего процесса. Новый файл — после FACE_PACK_MAX_BYTES,
+    PACK_SEAL_SECONDS или ошибки записи.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._file = None
+        self._name = None
+        self._size = 0
+        self._opened_at = 0.0
+
+    def _open_new(self):
+        packs_dir().mkdir(parents=True, exist_ok=True)
+        self._name = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}.pack"
+        self._file = open(pack_path(self._name), "ab")
+        self._size = 0
+        self._opened_at = time.monotonic()
+
+    def append(self, face_id: str, data: bytes) -> tuple[str, int]:
+        """Дописывает запись, возвращает (pack, смещение JPEG-данных)."""
+        with self._lock:
+            if (
+                self._file is None
+                or self._size >= settings.FACE_PACK_MAX_BYTES
+                or time.monotonic() - self._opened_at > PACK_SEAL_SECONDS
+            ):
+                self.close()
+                self._open_new()
+            try:
+                self._file.write(RECORD_HEADER.pack(uuid.UUID(face_id).bytes, len(data)) + data)
+                self._file.flush()
+            except Exception:
+                # Хвост файла мог остаться недописанным — продолжаем в новом pack
+                self.close()
+                raise
+            offset = self._size + RECORD_HEADER.size
+            self._size += RECORD_HEADER.size + len(data)
+            return self._name, offset
+
+    def close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            finally:
+                self._file = None
+
+
+_writer = None
+_writer_pid = None
+
+
+def get_writer() -> PackWriter:
+    """Свой writer (и свой pack-файл) у каждого процесса, пересоздаётся после fork."""
+    global _writer, _writer_pid
+    pid = os.getpid()
+    if _writer is None or _writer_pid != pid:
+        _writer = PackWriter()
+        _writer_pid = pid
+    return _writer
+
+
+def save_face_crop(session, face_crop: np.ndarray, face_id: str) -> str:
+    """
+    Сохраняет кроп лица и возвращает Face.crop_path. В режиме pack строка индекса
+    добавляется в session — кроп виден только вместе с закоммиченным Face.
+    """
+    if not is_enabled():
+        return save_face_crop_to_qnap(face_crop, face_id)
+    data = encode_crop(face_crop)
+    pack, offset = get_writer().append(face_id, data)
+    session.add(FaceCrop(face_id=uuid.UUID(face_id), pack=pack, pack_offset=offset, length=len(data)))
+    return crop_path(face_id)
+
+
+def read_crop(pack: str, offset: int, length: int) -> bytes:
+    try:
+        fd = os.open(pack_path(pack), os.O_RDONLY)
+    except FileNotFoundError:
+        # Индекс прочитан до commit компактизации — pack уже переименован в .dead
+        fd = os.open(pack_path(pack + DEAD_SUFFIX), os.O_RDONLY)
+    try:
+        return os.pread(fd, length, offset)
+    finally:
+        os.close(fd)
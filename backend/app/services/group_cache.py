@@ -0,0 +1,199 @@
+"""
+Кэш резолва групп для приёма сообщений (bot_receiver).
+Ключ — (source_platform, external_id), значение — снимок нужных полей группы.
+
+Два уровня:
+    - LRU в процессе с коротким TTL — только одобренные группы (горячий путь при бэкфилле);
+    - Redis с длинным TTL — общий для всех воркеров uvicorn.
+approve/reject/toggle/delete вызывают invalidate(): ключ удаляется из Redis и из LRU
+текущего процесса и публикуется в канал INVALIDATE_CHANNEL — остальные процессы
+сбрасывают его из своего LRU. Пока подписки на канал нет (старт, обрыв связи с Redis),
+LRU не используется, чтобы не пропустить сброс.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "groups:resolve:"
+INVALIDATE_CHANNEL = "groups:resolve:invalidate"
+LOCAL_MAX_SIZE = 4096
+LISTENER_RETRY_SECONDS = 5
+
+_redis = None
+_listener: asyncio.Task | None = None
+_subscribed = False
+
+
+@dataclass(frozen=True)
+class CachedGroup:
+    id: uuid.UUID
+    telegram_id: int | None
+    source_platform: str
+    external_id: str | None
+    name: str
+    is_approved: bool
+
+    @classmethod
+    def from_group(cls, group) -> "CachedGroup":
+        return cls(
+            id=group.id,
+            telegram_id=group.telegram_id,
+            source_platform=group.source_platform,
+            external_id=group.external_id,
+            name=group.name,
+            is_approved=bool(group.is_approved),
+        )
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data["id"] = str(self.id)
+        return json.dumps(data)
+
+    @classmethod
+    def from_json(cls, raw: bytes | str) -> "CachedGroup":
+        data = json.loads(raw)
+        data["id"] = uuid.UUID(data["id"])
+        return cls(**data)
+
+
+class _LocalCache:
+    """LRU с TTL на OrderedDict (используется только из event loop, без блокировок)."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: OrderedDict[tuple[str, str], tuple[float, CachedGroup]] = OrderedDict()
+
+    def get(self, key: tuple[str, str]) -> CachedGroup | None:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires_at, group = item
+        if expires_at < time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return group
+
+    def set(self, key: tuple[str, str], group: CachedGroup, ttl: float):
+        self._items[key] = (time.monotonic() + ttl, group)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def pop(self, key: tuple[str, str]):
+        self._items.pop(key, None)
+
+    def clear(self):
+        self._items.clear()
+
+
+_local = _LocalCache(LOCAL_MAX_SIZE)
+
+
+def _get_redis():
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(settings.REDIS_URL)
+    return _redis
+
+
+def _redis_key(source_platform: str, external_id: str) -> str:
+    return f"{CACHE_PREFIX}{source_platform}:{external_id}"
+
+
+async def _listen_invalidations():
+    """Сбрасывает ключи LRU, инвалидированные другими процессами; при обрыве переподписывается."""
+    global _subscribed
+    while True:
+        pubsub = _get_redis().pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATE_CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] == "subscribe":
+                    # Сбросы до подписки могли быть пропущены
+                    _local.clear()
+                    _subscribed = True
+                elif message["type"] == "message":
+                    for key in json.loads(message["data"]):
+                        _local.pop(tuple(key))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Подписка на сброс кэша групп прервана: %s", e)
+        finally:
+            _subscribed = False
+            _local.clear()
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+        await asyncio.sleep(LISTENER_RETRY_SECONDS)
+
+
+def _ensure_listener():
+    global _listener
+    if _listener is None or _listener.done():
+        _listener = asyncio.get_running_loop().create_task(_listen_invalidations())
+
+
+def _set_local(key: tuple[str, str], group: CachedGroup):
+    if group.is_approved and _subscribed:
+        _local.set(key, group, settings.GROUP_CACHE_LOCAL_TTL)
+
+
+async def get_group(source_platform: str, external_id: str) -> CachedGroup | None:
+    _ensure_listener()
+    key = (source_platform, external_id)
+    group = _local.get(key) if _subscribed else None
+    if group is not None:
+        return group
+
+    try:
+        raw = await _get_redis().get(_redis_key(*key))
+    except Exception as e:
+        logger.warning("Кэш групп недоступен: %s", e)
+        return None
+    if raw is None:
+        return None
+
+    group = CachedGroup.from_json(raw)
+    _set_local(key, group)
+    return group
+
+
+async def set_group(source_platform: str, external_id: str, group: CachedGroup):
+    key = (source_platform, external_id)
+    _set_local(key, group)
+    try:
+        await _get_redis().setex(_redis_key(*key), settings.GROUP_CACHE_TTL, group.to_json())
+    except Exception as e:
+        logger.warning("Не удалось записать кэш групп: %s", e)
+
+
+async def invalidate(group):
+    """Сбрасывает все ключи, под которыми группа могла попасть в кэш."""
+    keys = set()
+    if group.external_id:
+        keys.add((group.source_platform, group.external_id))
+    if group.telegram_id is not None:
+        keys.add(("telegram", str(group.telegram_id)))
+    if not keys:
+        return
+
+    for key in keys:
+        _local.pop(key)
+    try:
+        await _get_redis().delete(*(_redis_key(*key) for key in keys))
+        await _get_redis().publish(INVALIDATE_CHANNEL, json.dumps(sorted(keys)))
+    except Exception as e:
+        logger.warning("Не удалось сбросить кэш групп: %s", e)
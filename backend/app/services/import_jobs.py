@@ -0,0 +1,85 @@
+"""
+Состояние фоновых задач импорта архивов (/api/import/jobs/{id}) в Redis.
+
+Задача — JSON в ключе import:job:{id} (TTL IMPORT_JOB_TTL): статус queued → running →
+done | failed, статистика и прогресс по файлам сообщений. Пишет воркер задачи
+(app.worker.import_tasks), API читает и переводит failed → queued при повторе;
+SSE опрашивает ключ и отдаёт изменения.
+"""
+import json
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+from app.services.storage_service import get_qnap_path
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+TERMINAL = {DONE, FAILED}
+
+_redis = None
+
+
+def _get_redis():
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(settings.REDIS_URL)
+    return _redis
+
+
+def _key(job_id: str) -> str:
+    return f"import:job:{job_id}"
+
+
+def upload_path(job_id: str) -> Path:
+    """Загруженный архив ждёт воркер на QNAP (общий том backend и celery_import)."""
+    path = get_qnap_path() / "imports"
+    path.mkdir(parents=True, exist_ok=True)
+    return path / f"{job_id}.zip"
+
+
+async def _save(job: dict) -> dict:
+    job["updated_at"] = datetime.utcnow().isoformat()
+    await _get_redis().set(_key(job["id"]), json.dumps(job, ensure_ascii=False), ex=settings.IMPORT_JOB_TTL)
+    return job
+
+
+def new_job_id() -> str:
+    return str(uuid.uuid4())
+
+
+async def create_job(job_id: str, group_id: str, group_name: str, filename: str, size: int) -> dict:
+    return await _save({
+        "id": job_id,
+        "status": QUEUED,
+        "group_id": group_id,
+        "group_name": group_name,
+        "filename": filename,
+        "size": size,
+        "created_at": datetime.utcnow().isoformat(),
+        "stats": {"messages": 0, "photos": 0, "duplicates": 0, "faces_queued": 0},
+        "progress": {"members_done": 0, "members_total": 0, "member": None},
+        "error": None,
+    })
+
+
+async def get_job(job_id: str) -> dict | None:
+    raw = await _get_redis().get(_key(job_id))
+    return json.loads(raw) if raw else None
+
+
+async def update_job(job_id: str, **fields) -> dict | None:
+    job = await get_job(job_id)
+    if job is None:
+        return None
+    job.update(fields)
+    return await _save(job)
+
+
+async def delete_job(job_id: str):
+    await _get_redis().delete(_key(job_id))
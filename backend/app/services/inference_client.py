@@ -0,0 +1,40 @@
+"""
+Асинхронный клиент сервиса инференса (app.inference.server).
+"""
+import httpx
+
+from app.core.config import settings
+
+_client: httpx.AsyncClient | None = None
+
+
+def is_enabled() -> bool:
+    return bool(settings.INFERENCE_URL or settings.INFERENCE_UDS)
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        transport = httpx.AsyncHTTPTransport(uds=settings.INFERENCE_UDS) if settings.INFERENCE_UDS else None
+        _client = httpx.AsyncClient(
+            base_url=settings.INFERENCE_URL or "http://inference",
+            transport=transport,
+            timeout=settings.INFERENCE_TIMEOUT,
+        )
+    return _client
+
+
+async def embed_image(contents: bytes) -> list[dict] | None:
+    """
+    Отправляет изображение в сервис инференса.
+    Возвращает [{"bbox", "det_score", "embedding"}, ...] или None, если изображение не читается.
+    """
+    response = await _get_client().post(
+        "/embed",
+        content=contents,
+        headers={"Content-Type": "application/octet-stream"},
+    )
+    if response.status_code == 400:
+        return None
+    response.raise_for_status()
+    return response.json()["faces"]
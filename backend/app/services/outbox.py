@@ -0,0 +1,54 @@
+"""
+Transactional outbox для задач Celery (TASK_OUTBOX_ENABLED=true).
+
+stage_photo_tasks() добавляет строки task_outbox в ту же сессию, что и Message, —
+задача появляется только вместе с закоммиченным сообщением и не теряется при сбое брокера.
+outbox_relay.py публикует строки пачками и проставляет sent_at.
+Без outbox поведение прежнее: dispatch_photo_tasks() после commit ставит задачи сразу.
+
+stage_face_vectors() — векторы лиц для write-behind очереди (QDRANT_WRITE_BEHIND=true):
+пишутся всегда, независимо от TASK_OUTBOX_ENABLED, в одной транзакции с Face
+и photo_processed_at, relay дописывает их в Redis stream. Поэтому при write-behind
+outbox_relay.py должен быть запущен.
+"""
+from app.core.config import settings
+from app.models.models import TaskOutbox
+
+PROCESS_PHOTO = "process_photo"
+FACE_VECTORS = "face_vectors"
+# Лиц в одной строке outbox (вектор 512 float — ~10 KB JSON)
+FACE_VECTORS_PER_ROW = 100
+
+
+def is_enabled() -> bool:
+    return settings.TASK_OUTBOX_ENABLED
+
+
+def stage_photo_tasks(session, task_args: list[tuple]):
+    """
+    До commit: кладёт задачи распознавания в outbox текущей транзакции.
+    Работает и с AsyncSession, и с sync Session (только session.add).
+    """
+    if not is_enabled():
+        return
+    for args in task_args:
+        session.add(TaskOutbox(task_name=PROCESS_PHOTO, args=list(args)))
+
+
+def stage_face_vectors(session, items: list[tuple[str, list[float], dict]]):
+    """До commit: (face_id, vector, payload) лиц для vector_queue — в outbox текущей транзакции."""
+    for start in range(0, len(items), FACE_VECTORS_PER_ROW):
+        session.add(TaskOutbox(
+            task_name=FACE_VECTORS,
+            args=[list(item) for item in items[start:start + FACE_VECTORS_PER_ROW]],
+        ))
+
+
+def dispatch_photo_tasks(task_args: list[tuple]) -> int:
+    """После commit: без outbox публикует задачи сразу, с outbox — это работа relay."""
+    if not task_args:
+        return 0
+    if is_enabled():
+        return len(task_args)
+    from app.worker.tasks import enqueue_photo_tasks
+    return enqueue_photo_tasks(task_args)
@@ -0,0 +1,49 @@
+"""
+Индекс номеров телефонов для поиска по части номера.
+
+Для каждого номера в phone_suffixes хранятся все его суффиксы от MIN_SUFFIX цифр.
+Любая подстрока номера — префикс одного из суффиксов, поэтому
+"содержит 6762" превращается в диапазон по PK: suffix LIKE '6762%'.
+"""
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import MessagePhone, PhoneSuffix
+
+# Совпадает с минимальной длиной запроса в /search/phone
+MIN_SUFFIX = 3
+
+
+def phone_suffixes(phone: str) -> list[str]:
+    return [phone[i:] for i in range(len(phone) - MIN_SUFFIX + 1)]
+
+
+def suffix_rows(phones) -> list[dict]:
+    return [
+        {"suffix": suffix, "phone": phone}
+        for phone in set(phones)
+        for suffix in phone_suffixes(phone)
+    ]
+
+
+def suffix_insert_stmt():
+    """INSERT IGNORE — номер мог быть уже проиндексирован другим сообщением."""
+    return insert(PhoneSuffix).prefix_with("IGNORE")
+
+
+async def index_phones(db: AsyncSession, phones):
+    """Добавляет суффиксы номеров в текущую транзакцию (commit — на вызывающем)."""
+    rows = suffix_rows(phones)
+    if rows:
+        await db.execute(suffix_insert_stmt(), rows)
+
+
+def phone_filter(digits: str, full_phone: str | None = None):
+    """
+    Условие на MessagePhone.phone: точное совпадение для полного нормализованного
+    номера, иначе — номера, содержащие digits (через индекс суффиксов).
+    """
+    if full_phone:
+        return MessagePhone.phone == full_phone
+    matching = select(PhoneSuffix.phone).where(PhoneSuffix.suffix.like(f"{digits}%"))
+    return MessagePhone.phone.in_(matching)
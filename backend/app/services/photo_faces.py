@@ -0,0 +1,98 @@
+"""
+Переиспользование результатов распознавания по хешу фото (таблица photo_face_results).
+
+Фото, пересланное в несколько групп, распознаётся один раз: следующие сообщения
+с тем же photo_hash получают свои Face-записи, ссылающиеся на те же точки Qdrant.
+В payload точки group_ids — все группы, где встречается лицо, по нему фильтрует поиск.
+Синхронный код: вызывается из Celery-воркера и vector_flusher.py.
+"""
+import logging
+import uuid
+
+from sqlalchemy import insert, select
+
+from app.models.models import Face, Message, PhotoFaceResult
+
+logger = logging.getLogger(__name__)
+
+
+def find_result(session, photo_hash: str | None) -> PhotoFaceResult | None:
+    if not photo_hash:
+        return None
+    return session.get(PhotoFaceResult, photo_hash)
+
+
+def record_result(session, photo_hash: str | None, faces: list):
+    """
+    До commit: запоминает лица распознанного фото. Point id = face.id.
+    INSERT IGNORE — если то же фото параллельно распознал другой воркер, остаётся первый результат.
+    """
+    if not photo_hash:
+        return
+    session.execute(
+        insert(PhotoFaceResult.__table__).prefix_with("IGNORE").values(
+            photo_hash=photo_hash,
+            faces=[
+                {
+                    "point_id": str(face.id),
+                    "bbox": face.bbox,
+                    "confidence": face.confidence,
+                    "crop_path": face.crop_path,
+                }
+                for face in faces
+            ],
+        )
+    )
+
+
+def attach_faces(session, message, result: PhotoFaceResult) -> list:
+    """Создаёт для сообщения Face-записи по готовому результату (без ONNX и без новых векторов)."""
+    faces = []
+    for item in result.faces:
+        face = Face(
+            id=uuid.uuid4(),
+            message_id=message.id,
+            bbox=item["bbox"],
+            confidence=item["confidence"],
+            crop_path=item.get("crop_path"),
+            qdrant_point_id=uuid.UUID(item["point_id"]),
+        )
+        session.add(face)
+        faces.append(face)
+    return faces
+
+
+def point_group_ids(session, point_ids: list[str]) -> dict[str, list[str]]:
+    """Группы всех сообщений, чьи лица ссылаются на точки point_ids."""
+    rows = session.execute(
+        select(Face.qdrant_point_id, Message.group_id)
+        .join(Message, Face.message_id == Message.id)
+        .where(Face.qdrant_point_id.in_([uuid.UUID(point_id) for point_id in point_ids]))
+        .distinct()
+    ).all()
+    groups: dict[str, set[str]] = {}
+    for point_id, group_id in rows:
+        groups.setdefault(str(point_id), set()).add(str(group_id))
+    return {point_id: sorted(group_ids) for point_id, group_ids in groups.items()}
+
+
+def sync_point_groups(session, point_ids: list[str], min_groups: int = 1):
+    """
+    После commit: записывает group_ids точек из БД. Ошибки не пробрасываются —
+    в режиме write-behind точка может ещё не дойти до Qdrant, тогда group_ids
+    проставит vector_flusher.py после выгрузки.
+    """
+    if not point_ids:
+        return
+    try:
+        from app.services.qdrant_service import ensure_collection_exists, set_point_group_ids
+
+        point_groups = {
+            point_id: group_ids
+            for point_id, group_ids in point_group_ids(session, point_ids).items()
+            if len(group_ids) >= min_groups
+        }
+        if point_groups:
+            set_point_group_ids(ensure_collection_exists(), point_groups)
+    except Exception as e:
+        logger.warning("Не удалось обновить group_ids точек Qdrant (%d): %s", len(point_ids), e)
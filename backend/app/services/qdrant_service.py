@@ -1,41 +1,263 @@
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Distance,
+    HnswConfigDiff,
+    PointStruct,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    SetPayload,
+    SetPayloadOperation,
+    VectorParams,
+)
 from app.core.config import settings
+import logging
+import os
+import threading
+import time
 import uuid
 
+logger = logging.getLogger(__name__)
+
 COLLECTION_NAME = "faces"
 VECTOR_SIZE = 512
+UPSERT_BATCH_SIZE = 256
+
+# Пауза записи в Qdrant на время переключения коллекции (migrate_qdrant_collection.py):
+# флаг в Redis с TTL — если миграция упала, запись возобновится сама
+WRITE_PAUSE_KEY = "qdrant:writes_paused"
+WRITE_PAUSE_POLL_SECONDS = 1.0
+# Пока миграция копирует коллекцию, писатели складывают id изменённых точек в множество:
+# под паузой докопируется только эта дельта, а не вся коллекция
+TRACK_CHANGES_KEY = "qdrant:track_changes"
+CHANGED_POINTS_KEY = "qdrant:changed_points"
+# Параметры поиска берутся из конфигурации коллекции за алиасом и перечитываются с таким периодом
+SEARCH_PARAMS_TTL = 60
+
+# Профили коллекции: default — float32 в RAM и HNSW по умолчанию (как было).
+# Остальные держат в RAM только квантованные векторы, оригиналы — на диске,
+# поиск идёт с rescoring по оригиналам.
+COLLECTION_PROFILES = {
+    "default": {},
+    # int8 в RAM, HNSW-граф в RAM
+    "int8": {
+        "vectors_on_disk": True,
+        "tuned_hnsw": True,
+        "quantization": "int8",
+    },
+    # int8 в RAM, HNSW-граф тоже на диске — минимум RAM ценой латентности
+    "int8_disk": {
+        "vectors_on_disk": True,
+        "tuned_hnsw": True,
+        "hnsw_on_disk": True,
+        "quantization": "int8",
+    },
+    # 1 бит на измерение
+    "binary": {
+        "vectors_on_disk": True,
+        "tuned_hnsw": True,
+        "quantization": "binary",
+    },
+}
+
+# Oversampling при поиске по квантованным векторам: для 512-d ArcFace в 1 бит нужен больший
+QUANTIZATION_OVERSAMPLING = {"int8": 2.0, "binary": 3.0}
+
+# ── Один клиент на процесс (пересоздаётся после fork) и однократная проверка схемы ──
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+_collection_ready = False
+_search_params = None
+_search_params_at = None
 
 
 def get_qdrant_client() -> QdrantClient:
-    return QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
+    """Возвращает общий для процесса QdrantClient (HTTP-соединения переиспользуются)."""
+    global _client, _client_pid, _collection_ready
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
+                _client_pid = pid
+                _collection_ready = False
+    return _client
 
 
-def ensure_collection_exists():
-    """Создаёт коллекцию faces в Qdrant, если её нет."""
-    client = get_qdrant_client()
-    existing = [c.name for c in client.get_collections().collections]
-    if COLLECTION_NAME not in existing:
-        client.create_collection(
-            collection_name=COLLECTION_NAME,
-            vectors_config=VectorParams(size=VECTOR_SIZE, distance=Distance.COSINE),
+def _profile(name: str | None = None) -> dict:
+    name = name or settings.QDRANT_COLLECTION_PROFILE
+    if name not in COLLECTION_PROFILES:
+        raise ValueError(f"Неизвестный профиль коллекции Qdrant: {name}")
+    return COLLECTION_PROFILES[name]
+
+
+def build_collection_config(profile_name: str | None = None) -> dict:
+    """Параметры create_collection для профиля (векторы, HNSW, квантование)."""
+    profile = _profile(profile_name)
+    config = {
+        "vectors_config": VectorParams(
+            size=VECTOR_SIZE,
+            distance=Distance.COSINE,
+            on_disk=profile.get("vectors_on_disk", False),
+        ),
+    }
+    if profile.get("tuned_hnsw"):
+        config["hnsw_config"] = HnswConfigDiff(
+            m=settings.QDRANT_HNSW_M,
+            ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT,
+            on_disk=profile.get("hnsw_on_disk", False),
         )
-        # Payload-индексы для быстрой фильтрации при поиске
-        client.create_payload_index(
-            collection_name=COLLECTION_NAME,
-            field_name="message_id",
-            field_schema="keyword",
+    if profile.get("quantization") == "int8":
+        config["quantization_config"] = ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True),
+        )
+    elif profile.get("quantization") == "binary":
+        config["quantization_config"] = BinaryQuantization(
+            binary=BinaryQuantizationConfig(always_ram=True),
         )
+    return config
+
+
+def build_search_params(quantization: str | None) -> SearchParams | None:
+    """Параметры поиска: для квантованной коллекции — rescoring по оригинальным векторам."""
+    if not quantization:
+        return None
+    return SearchParams(
+        hnsw_ef=settings.QDRANT_SEARCH_EF,
+        quantization=QuantizationSearchParams(
+            rescore=True,
+            oversampling=QUANTIZATION_OVERSAMPLING.get(quantization, 2.0),
+        ),
+    )
+
+
+def collection_quantization(client: QdrantClient, collection_name: str) -> str | None:
+    """Тип квантования существующей коллекции: int8, binary, product или None."""
+    config = client.get_collection(collection_name).config.quantization_config
+    if config is None:
+        return None
+    if isinstance(config, ScalarQuantization):
+        return "int8"
+    if isinstance(config, BinaryQuantization):
+        return "binary"
+    return "product"
+
+
+def current_search_params(client: QdrantClient) -> SearchParams | None:
+    """
+    Параметры поиска по коллекции, на которую сейчас указывает faces (а не по
+    QDRANT_COLLECTION_PROFILE — после migrate_qdrant_collection.py они могут расходиться).
+    """
+    global _search_params, _search_params_at
+    now = time.monotonic()
+    if _search_params_at is None or now - _search_params_at > SEARCH_PARAMS_TTL:
+        collection = resolve_alias(client) or COLLECTION_NAME
+        _search_params = build_search_params(collection_quantization(client, collection))
+        _search_params_at = now
+    return _search_params
+
+
+def create_payload_indexes(client: QdrantClient, collection_name: str):
+    """Payload-индексы для быстрой фильтрации при поиске."""
+    for field_name in ("message_id", "face_id", "group_id", "group_ids"):
         client.create_payload_index(
-            collection_name=COLLECTION_NAME,
-            field_name="face_id",
+            collection_name=collection_name,
+            field_name=field_name,
             field_schema="keyword",
         )
-        client.create_payload_index(
+
+
+def resolve_alias(client: QdrantClient, name: str = COLLECTION_NAME) -> str | None:
+    """Возвращает коллекцию, на которую указывает алиас name, или None если это не алиас."""
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == name:
+            return alias.collection_name
+    return None
+
+
+def _redis():
+    from app.services.vector_queue import get_redis
+    return get_redis()
+
+
+def pause_writes(ttl: int):
+    """Ставит/продлевает паузу записи на ttl секунд."""
+    _redis().set(WRITE_PAUSE_KEY, "1", ex=ttl)
+
+
+def resume_writes():
+    _redis().delete(WRITE_PAUSE_KEY)
+
+
+def writes_paused() -> bool:
+    return bool(_redis().exists(WRITE_PAUSE_KEY))
+
+
+def wait_for_writes():
+    """Вызывается писателями (воркеры, флашер) перед записью: ждёт, пока идёт переключение коллекции."""
+    if not writes_paused():
+        return
+    logger.info("Запись в Qdrant приостановлена миграцией коллекции, ждём...")
+    while writes_paused():
+        time.sleep(WRITE_PAUSE_POLL_SECONDS)
+
+
+def start_tracking_changes(ttl: int):
+    """Миграция: включает/продлевает запись id изменённых точек на ttl секунд."""
+    pipe = _redis().pipeline(transaction=False)
+    pipe.set(TRACK_CHANGES_KEY, "1", ex=ttl)
+    pipe.expire(CHANGED_POINTS_KEY, ttl)
+    pipe.execute()
+
+
+def stop_tracking_changes():
+    _redis().delete(TRACK_CHANGES_KEY, CHANGED_POINTS_KEY)
+
+
+def record_changes(point_ids: list[str]):
+    """
+    Вызывается писателями ПОСЛЕ записи в Qdrant: если идёт миграция, id точек попадут
+    в дельту, которую она докопирует (запись до этого вызова уже видна в источнике).
+    """
+    if not point_ids:
+        return
+    client = _redis()
+    if client.exists(TRACK_CHANGES_KEY):
+        client.sadd(CHANGED_POINTS_KEY, *[str(point_id) for point_id in point_ids])
+
+
+def pop_changes(count: int) -> list[str]:
+    """Миграция: забирает до count id изменённых точек."""
+    return [point_id.decode() for point_id in _redis().spop(CHANGED_POINTS_KEY, count) or []]
+
+
+def ensure_collection_exists():
+    """
+    Создаёт коллекцию faces в Qdrant (по профилю QDRANT_COLLECTION_PROFILE), если её нет.
+    faces может быть и алиасом — после migrate_qdrant_collection.py.
+    Проверка выполняется один раз на процесс.
+    """
+    global _collection_ready
+    client = get_qdrant_client()
+    if _collection_ready:
+        return client
+
+    existing = [c.name for c in client.get_collections().collections]
+    if COLLECTION_NAME not in existing and resolve_alias(client) is None:
+        if writes_paused():
+            # Идёт переключение faces → алиас: пустую коллекцию на его месте не создаём
+            return client
+        client.create_collection(
             collection_name=COLLECTION_NAME,
-            field_name="group_id",
-            field_schema="keyword",
+            **build_collection_config(),
         )
+        create_payload_indexes(client, COLLECTION_NAME)
+    _collection_ready = True
     return client
 
 
@@ -46,14 +268,59 @@ def upsert_face_vector(
     payload: dict,
 ):
     """Сохраняет вектор лица в Qdrant."""
+    wait_for_writes()
     point_id = str(uuid.uuid4())
     client.upsert(
         collection_name=COLLECTION_NAME,
         points=[PointStruct(id=point_id, vector=vector, payload=payload)],
     )
+    record_changes([point_id])
     return point_id
 
 
+def upsert_face_vectors(
+    client: QdrantClient,
+    items: list[tuple[str, list[float], dict]],
+    wait: bool = True,
+    point_ids: list[str] | None = None,
+) -> list[str]:
+    """
+    Сохраняет векторы нескольких лиц одним запросом (пачками по UPSERT_BATCH_SIZE).
+    items — список (face_id, vector, payload). Возвращает point_id в том же порядке.
+    Если point_ids не заданы — генерируются новые UUID.
+    """
+    wait_for_writes()
+    if point_ids is None:
+        point_ids = [str(uuid.uuid4()) for _ in items]
+    points = [
+        PointStruct(id=point_id, vector=vector, payload=payload)
+        for point_id, (_, vector, payload) in zip(point_ids, items)
+    ]
+    for start in range(0, len(points), UPSERT_BATCH_SIZE):
+        client.upsert(
+            collection_name=COLLECTION_NAME,
+            points=points[start:start + UPSERT_BATCH_SIZE],
+            wait=wait,
+        )
+    record_changes(point_ids)
+    return point_ids
+
+
+def set_point_group_ids(client: QdrantClient, point_groups: dict[str, list[str]]):
+    """Перезаписывает payload group_ids у точек одним batch-запросом (значения у точек разные)."""
+    wait_for_writes()
+    operations = [
+        SetPayloadOperation(set_payload=SetPayload(payload={"group_ids": group_ids}, points=[point_id]))
+        for point_id, group_ids in point_groups.items()
+    ]
+    for start in range(0, len(operations), UPSERT_BATCH_SIZE):
+        client.batch_update_points(
+            collection_name=COLLECTION_NAME,
+            update_operations=operations[start:start + UPSERT_BATCH_SIZE],
+        )
+    record_changes(list(point_groups))
+
+
 def search_similar_faces(
     client: QdrantClient,
     vector: list[float],
@@ -66,12 +333,11 @@ def search_similar_faces(
 
     query_filter = None
     if group_ids is not None:
+        # group_id — группа первого сообщения, group_ids — все группы, куда фото переслали
         query_filter = Filter(
-            must=[
-                FieldCondition(
-                    key="group_id",
-                    match=MatchAny(any=group_ids)
-                )
+            should=[
+                FieldCondition(key="group_id", match=MatchAny(any=group_ids)),
+                FieldCondition(key="group_ids", match=MatchAny(any=group_ids)),
             ]
         )
 
@@ -81,6 +347,7 @@ def search_similar_faces(
         limit=top_k,
         score_threshold=score_threshold if score_threshold > 0 else None,
         query_filter=query_filter,
+        search_params=current_search_params(client),
     )
     return result.points
 
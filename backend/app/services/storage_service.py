@@ -1,6 +1,8 @@
+import asyncio
+import hashlib
 import os
-import shutil
 import uuid
+from dataclasses import dataclass
 from pathlib import Path
 from PIL import Image
 import numpy as np
@@ -12,22 +14,88 @@ def get_qnap_path() -> Path:
     return Path(settings.QNAP_MOUNT_PATH)
 
 
-def save_photo_to_qnap(
-    photo_data: bytes,
-    group_id: str,
-    message_id: str,
-    timestamp_str: str,
-) -> str:
-    """Сохраняет оригинальное фото на QNAP.
-    Структура: /photos/{group_id}/{YYYY-MM}/{message_id}_{timestamp}.jpg
+# Чанк потокового чтения загрузки: пиковая память запроса — один чанк
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class SpooledPhoto:
+    """Загрузка, записанная во временный файл на QNAP, с посчитанным SHA-256."""
+    tmp_path: str
+    sha256: str
+    size: int
+
+
+def incoming_dir() -> Path:
+    # Временные файлы — на той же ФС, что и blobs/, чтобы os.replace был атомарным
+    path = get_qnap_path() / "photos" / ".incoming"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _open_spool():
+    tmp_path = incoming_dir() / f"{uuid.uuid4().hex}.part"
+    return tmp_path, open(tmp_path, "wb")
+
+
+def _write_chunk(f, hasher, chunk: bytes):
+    hasher.update(chunk)
+    f.write(chunk)
+
+
+async def spool_upload(upload) -> SpooledPhoto | None:
     """
-    base = get_qnap_path() / "photos" / group_id / timestamp_str[:7]
-    base.mkdir(parents=True, exist_ok=True)
-    filename = f"{message_id}_{timestamp_str}.jpg"
-    file_path = base / filename
-    with open(file_path, "wb") as f:
-        f.write(photo_data)
-    return str(file_path)
+    Потоково пишет загрузку (UploadFile) во временный файл на QNAP, считая SHA-256 по ходу.
+    Запись и хеширование — в пуле потоков, event loop не блокируется на NFS.
+    Возвращает None для пустого файла.
+    """
+    tmp_path, f = await asyncio.to_thread(_open_spool)
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        while True:
+            chunk = await upload.read(SPOOL_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            await asyncio.to_thread(_write_chunk, f, hasher, chunk)
+    except BaseException:
+        await asyncio.to_thread(f.close)
+        await asyncio.to_thread(discard_spooled_photo, str(tmp_path))
+        raise
+    await asyncio.to_thread(f.close)
+
+    if not size:
+        await asyncio.to_thread(discard_spooled_photo, str(tmp_path))
+        return None
+    return SpooledPhoto(tmp_path=str(tmp_path), sha256=hasher.hexdigest(), size=size)
+
+
+def spool_stream(src) -> SpooledPhoto | None:
+    """Синхронный вариант spool_upload для файловых потоков (например, фото из ZIP при импорте)."""
+    tmp_path, f = _open_spool()
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with f:
+            for chunk in iter(lambda: src.read(SPOOL_CHUNK_SIZE), b""):
+                size += len(chunk)
+                _write_chunk(f, hasher, chunk)
+    except BaseException:
+        discard_spooled_photo(str(tmp_path))
+        raise
+
+    if not size:
+        discard_spooled_photo(str(tmp_path))
+        return None
+    return SpooledPhoto(tmp_path=str(tmp_path), sha256=hasher.hexdigest(), size=size)
+
+
+def discard_spooled_photo(tmp_path: str):
+    try:
+        os.remove(tmp_path)
+    except FileNotFoundError:
+        pass
 
 
 def save_face_crop_to_qnap(
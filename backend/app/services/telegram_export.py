@@ -0,0 +1,263 @@
+"""
+Потоковое чтение экспорта Telegram Desktop прямо из ZIP, без распаковки архива.
+
+Поддерживаются оба формата экспорта: HTML (messages*.html разбираются
+инкрементальным html.parser, chunk за chunk-ом, без полного DOM) и JSON
+(result.json читается ijson по одному сообщению, с точными id сообщений и
+отправителей). Если в архиве есть result.json, используется он. Фото — только те,
+на которые ссылаются сообщения, копируются потоком из архива.
+"""
+import io
+import posixpath
+import re
+import uuid
+import zipfile
+from datetime import datetime
+from html.parser import HTMLParser
+
+import ijson
+
+from app.models.models import Message
+from app.services.storage_service import SpooledPhoto, spool_stream
+
+HTML_RE = re.compile(r"^messages(\d*)\.html$")
+JSON_NAME = "result.json"
+# from_id в JSON: "user123456" — отправитель-пользователь; каналы и пр. не сохраняем
+USER_ID_RE = re.compile(r"^user(\d+)$")
+MESSAGE_CLASS_RE = re.compile(r"message\s+default")
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class TelegramExportParser(HTMLParser):
+    """
+    Инкрементальный разбор messages.html: feed() по кускам, готовые сообщения — pop_messages().
+    Словари с ключами message_id, sender_name, sender_id (в HTML всегда None), timestamp, text, photo_rel_path.
+    Как и раньше, берётся первое вхождение from_name/date/text/photo_wrap внутри сообщения,
+    отправитель переносится на следующие сообщения серии (joined).
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.current_sender = None
+        self._messages = []
+        self._message = None
+        self._depth = 0
+        self._capture = None
+        self._capture_depth = 0
+        self._pieces = []
+        self._node = []
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_node()
+        attrs = dict(attrs)
+        classes = (attrs.get("class") or "").split()
+        if self._message is None:
+            if tag == "div" and MESSAGE_CLASS_RE.search(attrs.get("class") or ""):
+                self._message = {
+                    "message_id": re.sub(r"\D", "", attrs.get("id") or ""),
+                    "sender_name": None,
+                    "sender_id": None,
+                    "timestamp": None,
+                    "text": None,
+                    "photo_rel_path": None,
+                    "_seen": set(),
+                }
+                self._depth = 1
+            return
+
+        seen = self._message["_seen"]
+        if tag == "a" and "photo_wrap" in classes and "photo" not in seen:
+            seen.add("photo")
+            self._message["photo_rel_path"] = attrs.get("href") or None
+        if tag != "div":
+            return
+
+        self._depth += 1
+        if "date" in classes and "date" not in seen:
+            seen.add("date")
+            title = attrs.get("title") or ""
+            try:
+                self._message["timestamp"] = datetime.strptime(title[:19], "%d.%m.%Y %H:%M:%S")
+            except ValueError:
+                pass
+        if self._capture is not None:
+            return
+        if "from_name" in classes and "from_name" not in seen:
+            seen.add("from_name")
+            self._start_capture("from_name")
+        elif "text" in classes and "text" not in seen:
+            seen.add("text")
+            self._start_capture("text")
+
+    def handle_endtag(self, tag):
+        self._flush_node()
+        if self._message is None or tag != "div":
+            return
+        self._depth -= 1
+        if self._capture is not None and self._depth < self._capture_depth:
+            self._finish_capture()
+        if self._depth == 0:
+            message = self._message
+            del message["_seen"]
+            message["sender_name"] = self.current_sender
+            self._messages.append(message)
+            self._message = None
+
+    def handle_data(self, data):
+        # Текстовый узел может прийти частями (граница chunk-а, сущности) — собираем до тега
+        if self._capture is not None:
+            self._node.append(data)
+
+    def _flush_node(self):
+        # Как get_text(strip=True): каждый текстовый узел обрезается, склейка без разделителя
+        if self._node:
+            self._pieces.append("".join(self._node).strip())
+            self._node = []
+
+    def _start_capture(self, field: str):
+        self._capture = field
+        self._capture_depth = self._depth
+        self._pieces = []
+
+    def _finish_capture(self):
+        self._flush_node()
+        value = "".join(self._pieces)
+        if self._capture == "from_name":
+            self.current_sender = value
+        else:
+            self._message["text"] = value or None
+        self._capture = None
+        self._pieces = []
+
+    def pop_messages(self) -> list[dict]:
+        messages, self._messages = self._messages, []
+        return messages
+
+
+def parse_messages_stream(stream, chunk_size: int = READ_CHUNK_SIZE):
+    """Генератор сообщений из текстового потока HTML; в памяти — один chunk и незакрытое сообщение."""
+    parser = TelegramExportParser()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        parser.feed(chunk)
+        yield from parser.pop_messages()
+    parser.close()
+    yield from parser.pop_messages()
+
+
+def _json_text(value) -> str | None:
+    # text: строка или список из строк и сущностей {"type": ..., "text": ...}
+    if isinstance(value, list):
+        value = "".join(part if isinstance(part, str) else part.get("text", "") for part in value)
+    return (value or "").strip() or None
+
+
+def parse_result_json(stream):
+    """
+    Генератор сообщений из result.json (бинарный поток) в том же формате, что и HTML-парсер.
+    ijson читает messages.item по одному — память не зависит от размера файла.
+    Служебные сообщения (type=service) пропускаются.
+    """
+    for item in ijson.items(stream, "messages.item"):
+        if item.get("type") != "message":
+            continue
+        user_id = USER_ID_RE.match(str(item.get("from_id") or ""))
+        try:
+            timestamp = datetime.fromisoformat(item["date"]) if item.get("date") else None
+        except ValueError:
+            timestamp = None
+        yield {
+            "message_id": str(item["id"]) if item.get("id") is not None else "",
+            "sender_name": item.get("from"),
+            "sender_id": int(user_id.group(1)) if user_id else None,
+            "timestamp": timestamp,
+            "text": _json_text(item.get("text")),
+            "photo_rel_path": item.get("photo") or None,
+        }
+
+
+def build_message(msg_data: dict, group_id, photo_path: str | None, photo_hash: str | None) -> Message:
+    """Message из разобранного сообщения экспорта (для bulk_writer, в сессию не добавляется)."""
+    return Message(
+        id=uuid.uuid4(),
+        group_id=group_id,
+        telegram_message_id=int(msg_data["message_id"]) if msg_data["message_id"] else None,
+        sender_telegram_id=msg_data["sender_id"],
+        sender_name=msg_data["sender_name"],
+        text=msg_data["text"],
+        has_photo=bool(msg_data["photo_rel_path"]),
+        photo_path=photo_path,
+        photo_hash=photo_hash,
+        timestamp=msg_data["timestamp"],
+        imported_from_backup=True,
+        photo_processed_at=None,
+    )
+
+
+def _html_sort_key(info: zipfile.ZipInfo):
+    # messages.html -> 0, messages2.html -> 2
+    number = HTML_RE.match(posixpath.basename(info.filename)).group(1)
+    return posixpath.dirname(info.filename), int(number) if number else 0
+
+
+class TelegramExportZip:
+    """Экспорт Telegram Desktop в ZIP: список messages*.html, потоковый разбор и фото по ссылке."""
+
+    def __init__(self, zip_path: str):
+        self.zip = zipfile.ZipFile(zip_path, "r")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.zip.close()
+
+    def message_members(self) -> list[zipfile.ZipInfo]:
+        """Файлы с сообщениями: result.json, если он есть (JSON-экспорт), иначе messages*.html."""
+        json_members = [
+            info for info in self.zip.infolist()
+            if not info.is_dir() and posixpath.basename(info.filename) == JSON_NAME
+        ]
+        if json_members:
+            # Экспорт одного чата: result.json в корне экспорта
+            return [min(json_members, key=lambda info: info.filename.count("/"))]
+        return self.html_members()
+
+    def html_members(self) -> list[zipfile.ZipInfo]:
+        members = [
+            info for info in self.zip.infolist()
+            if not info.is_dir() and HTML_RE.match(posixpath.basename(info.filename))
+        ]
+        return sorted(members, key=_html_sort_key)
+
+    def iter_messages(self, member: zipfile.ZipInfo):
+        """Сообщения одного файла (HTML или result.json) по мере распаковки; photo_member — ZipInfo фото или None."""
+        base_dir = posixpath.dirname(member.filename)
+        with self.zip.open(member) as raw:
+            if posixpath.basename(member.filename) == JSON_NAME:
+                messages = parse_result_json(raw)
+            else:
+                messages = parse_messages_stream(io.TextIOWrapper(raw, encoding="utf-8", errors="replace"))
+            for message in messages:
+                message["photo_member"] = self.photo_member(base_dir, message["photo_rel_path"])
+                yield message
+
+    def photo_member(self, base_dir: str, rel_path: str | None) -> zipfile.ZipInfo | None:
+        if not rel_path:
+            return None
+        name = posixpath.normpath(posixpath.join(base_dir, rel_path))
+        try:
+            info = self.zip.getinfo(name)
+        except KeyError:
+            return None
+        return None if info.is_dir() else info
+
+    def spool_photo(self, info: zipfile.ZipInfo) -> SpooledPhoto | None:
+        """Потоково копирует фото из архива во временный файл на QNAP (с SHA-256 по ходу)."""
+        with self.zip.open(info) as src:
+            return spool_stream(src)
@@ -0,0 +1,322 @@
+"""
+Конвейер импорта экспорта Telegram Desktop (ZIP) в группу: общий для import_local.py
+и фоновых задач импорта (app.worker.import_tasks).
+
+Три стадии:
+  1. разбор result.json (JSON-экспорт) или messages*.html потоково из архива (основной поток);
+  2. копирование фото из ZIP во временные файлы на QNAP с SHA-256 — пул потоков (workers);
+  3. запись в БД пачками (batch_size) через bulk_writer: одна проверка дублей фото на пачку,
+     вставка сообщений (дубликаты пропускаются) и номеров телефонов, один commit.
+
+После каждой пачки прогресс (файл сообщений и позиция в нём) сохраняется в файл состояния
+(ImportCheckpoint); повторный запуск с загруженным состоянием продолжает с последней пачки.
+Повтор пачки безопасен — сообщения с теми же telegram_message_id и фото с тем же хешем пропускаются.
+"""
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import time
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable
+
+from sqlalchemy import select
+
+from app.core.database import AsyncSessionLocal
+from app.models.models import Message
+from app.services import bulk_writer, dedup_filter, outbox, text_search
+from app.services.blob_store import commit_spooled_blob, release_unwritten
+from app.services.storage_service import SpooledPhoto, discard_spooled_photo
+from app.services.telegram_export import TelegramExportZip, build_message
+
+logger = logging.getLogger(__name__)
+STATE_VERSION = 1
+# Повторы копирования фото при сбоях NFS/SMB, пауза растёт: 2, 4, 8 секунд
+SPOOL_RETRIES = 3
+SPOOL_RETRY_DELAY = 2
+
+
+@dataclass
+class PendingMessage:
+    """Разобранное сообщение, ожидающее записи: position — порядковый номер в файле сообщений."""
+    data: dict
+    position: int
+    photo: concurrent.futures.Future | None = None
+
+
+class ImportCheckpoint:
+    """Файл состояния импорта: завершённые файлы сообщений и последняя записанная пачка текущего."""
+
+    def __init__(self, path: str, zip_path: str, group_id: str):
+        stat = os.stat(zip_path)
+        self.path = path
+        self.state = {
+            "version": STATE_VERSION,
+            "zip_path": os.path.abspath(zip_path),
+            "zip_size": stat.st_size,
+            "zip_mtime": int(stat.st_mtime),
+            "group_id": group_id,
+            "completed": [],
+            "current": None,
+            "stats": {"messages": 0, "photos": 0, "duplicates": 0, "faces_queued": 0},
+        }
+
+    def load(self):
+        """Загружает сохранённое состояние; архив и группа должны совпадать."""
+        with open(self.path, encoding="utf-8") as f:
+            saved = json.load(f)
+        for key in ("version", "zip_size", "zip_mtime", "group_id"):
+            if saved.get(key) != self.state[key]:
+                raise ValueError(f"файл состояния {self.path} относится к другому архиву или группе ({key})")
+        self.state = saved
+
+    @property
+    def stats(self) -> dict:
+        return self.state["stats"]
+
+    def is_completed(self, member: str) -> bool:
+        return member in self.state["completed"]
+
+    def resume_position(self, member: str) -> int:
+        """Позиция последнего записанного сообщения в файле, -1 — начинать сначала."""
+        current = self.state["current"]
+        return current["position"] if current and current["member"] == member else -1
+
+    def mark_batch(self, member: str, position: int, message_id: str | None):
+        self.state["current"] = {"member": member, "position": position, "message_id": message_id}
+        self.save()
+
+    def mark_completed(self, member: str):
+        self.state["completed"].append(member)
+        self.state["current"] = None
+        self.save()
+
+    def save(self):
+        # Через временный файл и rename: обрыв во время записи не портит состояние
+        self.state["updated_at"] = datetime.now().isoformat(timespec="seconds")
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        for path in (self.path, f"{self.path}.tmp"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def default_state_path(zip_path: str) -> str:
+    return f"{zip_path}.import-state.json"
+
+
+def _spool_photo(export: TelegramExportZip, info) -> SpooledPhoto | None:
+    """Стадия 2 (пул потоков): фото из архива во временный файл на QNAP, с повторами при сбоях."""
+    for attempt in range(1, SPOOL_RETRIES + 1):
+        try:
+            return export.spool_photo(info)
+        except OSError as e:
+            if attempt == SPOOL_RETRIES:
+                raise
+            delay = SPOOL_RETRY_DELAY * 2 ** (attempt - 1)
+            logger.warning("Ошибка копирования %s: %s, повтор через %d с", info.filename, e, delay)
+            time.sleep(delay)
+
+
+def _discard_photos(batch: list[PendingMessage]):
+    """Удаляет временные файлы уже скопированных фото пачки (после ошибки)."""
+    futures = [item.photo for item in batch if item.photo is not None]
+    concurrent.futures.wait(futures)
+    for future in futures:
+        if not future.cancelled() and future.exception() is None and future.result():
+            discard_spooled_photo(future.result().tmp_path)
+
+
+async def _collect_photos(batch: list[PendingMessage]) -> list[SpooledPhoto | None]:
+    """Ждёт копирования фото пачки, порядок — как у сообщений."""
+    futures = [item.photo for item in batch if item.photo is not None]
+    if futures:
+        await asyncio.wait([asyncio.wrap_future(future) for future in futures])
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    if errors:
+        await asyncio.to_thread(_discard_photos, batch)
+        raise errors[0]
+    return [item.photo.result() if item.photo is not None else None for item in batch]
+
+
+def _commit_blobs(photos: list[SpooledPhoto]) -> list[str]:
+    return [commit_spooled_blob(photo.tmp_path, photo.sha256) for photo in photos]
+
+
+
+async def _write_batch(group_id, batch: list[PendingMessage], stats: dict) -> int:
+    """
+    Стадия 3: пачка сообщений одной транзакцией. Дубли фото в группе проверяются одним
+    запросом на пачку (и внутри пачки), сообщение с таким фото пропускается целиком.
+    Возвращает число записанных сообщений.
+    """
+    photos = await _collect_photos(batch)
+    hashes = {photo.sha256 for photo in photos if photo}
+
+    async with AsyncSessionLocal() as db:
+        try:
+            seen_hashes = set()
+            if hashes:
+                result = await db.execute(
+                    select(Message.photo_hash).where(Message.group_id == group_id, Message.photo_hash.in_(hashes))
+                )
+                seen_hashes = set(result.scalars().all())
+
+            rows = []
+            new_photos = []
+            for item, photo in zip(batch, photos):
+                if photo and photo.sha256 in seen_hashes:
+                    # То же фото уже есть в этой группе, пропускаем всё сообщение
+                    discard_spooled_photo(photo.tmp_path)
+                    stats["duplicates"] += 1
+                    continue
+                if photo:
+                    seen_hashes.add(photo.sha256)
+                    new_photos.append(photo)
+                rows.append((item, photo))
+            blob_paths = dict(zip(
+                (photo.sha256 for photo in new_photos), await asyncio.to_thread(_commit_blobs, new_photos)
+            ))
+        except BaseException:
+            await asyncio.to_thread(_discard_photos, batch)
+            raise
+
+        new_messages = [
+            build_message(item.data, group_id, blob_paths[photo.sha256] if photo else None, photo.sha256 if photo else None)
+            for item, photo in rows
+        ]
+        try:
+            inserted = await bulk_writer.write_messages(db, new_messages)
+        except Exception:
+            await release_unwritten(db, new_messages)
+            raise
+        await release_unwritten(db, new_messages, inserted)
+
+    # Задачи ставятся только после commit, иначе воркер может
+    # успеть прочитать БД до появления Message и вернуть Message not found.
+    new_messages = [msg for msg in new_messages if msg.id in inserted]
+    await dedup_filter.add([key for msg in new_messages for key in dedup_filter.keys_for_message(msg)], hot=False)
+    await text_search.index_messages(new_messages)
+    stats["messages"] += len(new_messages)
+    stats["photos"] += len(new_photos)
+    stats["faces_queued"] += outbox.dispatch_photo_tasks(
+        [bulk_writer.photo_task_args(msg) for msg in new_messages if msg.photo_path]
+    )
+    return len(new_messages)
+
+
+class ImportArchiveError(Exception):
+    """Архив не похож на экспорт Telegram Desktop."""
+
+
+def check_archive(zip_path: str) -> int:
+    """Быстрая проверка по центральному каталогу ZIP: число файлов сообщений, иначе ImportArchiveError."""
+    try:
+        with TelegramExportZip(zip_path) as export:
+            members = export.message_members()
+    except zipfile.BadZipFile:
+        raise ImportArchiveError("Файл не является ZIP-архивом")
+    if not members:
+        raise ImportArchiveError("Файлы сообщений (result.json или messages*.html) не найдены в архиве")
+    return len(members)
+
+
+async def _existing_message_ids(group_id) -> set[int]:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Message.telegram_message_id)
+            .where(Message.group_id == group_id, Message.telegram_message_id.isnot(None))
+        )
+        return set(row[0] for row in result.all())
+
+
+async def _import_member(
+    export, pool, member, group_id, existing_msg_ids: set, checkpoint: ImportCheckpoint, batch_size: int, report
+) -> int:
+    """Один файл сообщений: стадия 1 ставит фото в пул сразу при разборе, пачки пишутся по мере набора."""
+    resume_from = checkpoint.resume_position(member.filename)
+    await report("member", member=member.filename, resume_from=resume_from)
+
+    written = 0
+    batch = []
+    try:
+        for position, msg_data in enumerate(export.iter_messages(member)):
+            if position <= resume_from:
+                continue
+            tg_msg_id = int(msg_data["message_id"]) if msg_data["message_id"] else None
+            if tg_msg_id and tg_msg_id in existing_msg_ids:
+                # Пропускаем дубликаты
+                continue
+            if tg_msg_id:
+                existing_msg_ids.add(tg_msg_id)
+
+            item = PendingMessage(data=msg_data, position=position)
+            if msg_data["photo_member"] is not None:
+                item.photo = pool.submit(_spool_photo, export, msg_data["photo_member"])
+            batch.append(item)
+
+            if len(batch) >= batch_size:
+                written += await _write_batch(group_id, batch, checkpoint.stats)
+                checkpoint.mark_batch(member.filename, position, msg_data["message_id"])
+                batch = []
+                await report("batch", member=member.filename, position=position)
+
+        if batch:
+            written += await _write_batch(group_id, batch, checkpoint.stats)
+            batch = []
+    except BaseException:
+        await asyncio.to_thread(_discard_photos, batch)
+        raise
+
+    checkpoint.mark_completed(member.filename)
+    await report("member_done", member=member.filename, written=written)
+    return written
+
+
+async def run_import(
+    zip_path: str,
+    group_id,
+    checkpoint: ImportCheckpoint,
+    workers: int = 8,
+    batch_size: int = 500,
+    on_progress: Callable[[dict], Awaitable[None]] | None = None,
+) -> dict:
+    """
+    Импортирует архив в группу, продолжая с checkpoint (если он загружен). Возвращает статистику.
+    on_progress(event) получает события start / member / batch / member_done / done
+    с текущей статистикой и числом обработанных файлов сообщений.
+    """
+    existing_msg_ids = await _existing_message_ids(group_id)
+
+    with TelegramExportZip(zip_path) as export, concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        members = export.message_members()
+        if not members:
+            raise ImportArchiveError("Файлы сообщений (result.json или messages*.html) не найдены в архиве")
+
+        async def report(event: str, **fields):
+            if on_progress is not None:
+                await on_progress({
+                    "event": event,
+                    "members_total": len(members),
+                    "members_done": sum(1 for m in members if checkpoint.is_completed(m.filename)),
+                    "stats": dict(checkpoint.stats),
+                    **fields,
+                })
+
+        await report("start", existing=len(existing_msg_ids))
+        for member in members:
+            if checkpoint.is_completed(member.filename):
+                continue
+            await _import_member(export, pool, member, group_id, existing_msg_ids, checkpoint, batch_size, report)
+
+    await report("done")
+    return dict(checkpoint.stats)
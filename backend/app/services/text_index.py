@@ -0,0 +1,161 @@
+"""
+Встроенный полнотекстовый индекс сообщений на SQLite FTS5.
+
+В индекс пишутся основы слов (text_stemmer) из text и document_text,
+поэтому поиск находит словоформы на украинском и русском. Ранжирование — bm25,
+общее количество совпадений считается по индексу.
+Файл индекса лежит на локальном диске (TEXT_INDEX_PATH), режим WAL позволяет
+читать из всех API-воркеров одновременно с записью.
+"""
+import logging
+import os
+import sqlite3
+import threading
+
+from app.core.config import settings
+from app.services.text_stemmer import tokenize, stem_text
+
+logger = logging.getLogger(__name__)
+
+# Вес документа ниже текста сообщения: совпадение в подписи важнее, чем в PDF
+BM25_WEIGHTS = (1.0, 0.4)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    rowid INTEGER PRIMARY KEY,
+    message_id TEXT NOT NULL UNIQUE,
+    group_id TEXT NOT NULL,
+    ts TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_docs_group_ts ON docs (group_id, ts);
+CREATE INDEX IF NOT EXISTS ix_docs_ts ON docs (ts);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(
+    body, document, tokenize = 'unicode61 remove_diacritics 0'
+);
+"""
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """Одно соединение на поток (и на процесс — после fork создаётся заново)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+
+    path = settings.TEXT_INDEX_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def build_match_query(q: str) -> str:
+    """
+    Запрос пользователя -> выражение FTS5: каждая основа как префикс,
+    все слова обязательны. Кавычки экранируют спецсимволы синтаксиса FTS5.
+    """
+    terms = [term for term in dict.fromkeys(tokenize(q)) if term]
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def index_messages(rows: list[dict]):
+    """
+    Добавляет или перезаписывает сообщения в индексе.
+    rows: [{"id", "group_id", "timestamp", "text", "document_text"}]
+    """
+    docs = [row for row in rows if row.get("text") or row.get("document_text")]
+    if not docs:
+        return
+
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for row in docs:
+            message_id = str(row["id"])
+            ts = row["timestamp"].isoformat() if row.get("timestamp") else None
+            existing = conn.execute("SELECT rowid FROM docs WHERE message_id = ?", (message_id,)).fetchone()
+            if existing:
+                rowid = existing[0]
+                conn.execute("UPDATE docs SET group_id = ?, ts = ? WHERE rowid = ?", (str(row["group_id"]), ts, rowid))
+                conn.execute("DELETE FROM docs_fts WHERE rowid = ?", (rowid,))
+            else:
+                rowid = conn.execute(
+                    "INSERT INTO docs (message_id, group_id, ts) VALUES (?, ?, ?)",
+                    (message_id, str(row["group_id"]), ts),
+                ).lastrowid
+            conn.execute(
+                "INSERT INTO docs_fts (rowid, body, document) VALUES (?, ?, ?)",
+                (rowid, stem_text(row.get("text") or ""), stem_text(row.get("document_text") or "")),
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def delete_messages(message_ids: list[str]):
+    if not message_ids:
+        return
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for message_id in message_ids:
+            existing = conn.execute("SELECT rowid FROM docs WHERE message_id = ?", (str(message_id),)).fetchone()
+            if existing:
+                conn.execute("DELETE FROM docs_fts WHERE rowid = ?", (existing[0],))
+                conn.execute("DELETE FROM docs WHERE rowid = ?", (existing[0],))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def clear():
+    conn = _connect()
+    conn.execute("DELETE FROM docs_fts")
+    conn.execute("DELETE FROM docs")
+
+
+def optimize():
+    """Сливает сегменты FTS5 — после массовой загрузки."""
+    _connect().execute("INSERT INTO docs_fts (docs_fts) VALUES ('optimize')")
+
+
+def search(
+    q: str,
+    group_ids: list[str] | None,
+    offset: int,
+    limit: int,
+    sort: str = "relevance",
+) -> tuple[list[str], int]:
+    """
+    Возвращает (message_id страницы, общее число совпадений).
+    group_ids=None — без фильтра по группам (админ).
+    """
+    match = build_match_query(q)
+    if not match or (group_ids is not None and not group_ids):
+        return [], 0
+
+    where = "docs_fts MATCH ?"
+    params: list = [match]
+    if group_ids is not None:
+        where += f" AND docs.group_id IN ({','.join('?' * len(group_ids))})"
+        params.extend(str(gid) for gid in group_ids)
+
+    order = "docs.ts DESC" if sort == "date" else f"bm25(docs_fts, {BM25_WEIGHTS[0]}, {BM25_WEIGHTS[1]}), docs.ts DESC"
+    base = f"FROM docs_fts JOIN docs ON docs.rowid = docs_fts.rowid WHERE {where}"
+
+    conn = _connect()
+    total = conn.execute(f"SELECT count(*) {base}", params).fetchone()[0]
+    if not total or offset >= total:
+        return [], total
+    rows = conn.execute(
+        f"SELECT docs.message_id {base} ORDER BY {order} LIMIT ? OFFSET ?",
+        [*params, limit, offset],
+    ).fetchall()
+    return [row[0] for row in rows], total
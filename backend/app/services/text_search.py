@@ -0,0 +1,123 @@
+"""
+Текстовый поиск по сообщениям с выбираемым движком (TEXT_SEARCH_BACKEND):
+    mariadb — FULLTEXT MATCH AGAINST по messages.text (как раньше, плюс честный total);
+    fts5    — встроенный индекс SQLite FTS5 (text_index): text + document_text,
+              стемминг uk/ru, bm25.
+Оба движка возвращают (message_id страницы в порядке выдачи, общее количество).
+"""
+import asyncio
+import logging
+
+import pymysql
+from sqlalchemy import func, select
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.models import Group, Message
+from app.services import text_index
+
+logger = logging.getLogger(__name__)
+
+BOOLEAN_MODE_CHARS = "'+-*()<>~\"@"
+# ER_FT_MATCHING_KEY_NOT_FOUND, ER_TABLE_CANT_HANDLE_FT: FULLTEXT-индекса по messages.text нет
+FULLTEXT_MISSING_CODES = {1191, 1214}
+
+
+def is_fulltext_missing(error: Exception) -> bool:
+    if not isinstance(error, (OperationalError, ProgrammingError)):
+        return False
+    original = getattr(error, "orig", None)
+    if isinstance(original, pymysql.MySQLError) and original.args:
+        return original.args[0] in FULLTEXT_MISSING_CODES
+    return False
+
+
+def is_fts5() -> bool:
+    return settings.TEXT_SEARCH_BACKEND == "fts5"
+
+
+async def _search_mariadb(
+    db: AsyncSession, q: str, public_only: bool, offset: int, limit: int, sort: str
+) -> tuple[list[str], int]:
+    safe_q = q.translate({ord(c): None for c in BOOLEAN_MODE_CHARS}).strip()
+    if not safe_q:
+        return [], 0
+
+    relevance = match(Message.text, against=safe_q).in_boolean_mode()
+    stmt = select(Message.id).join(Group, Message.group_id == Group.id)
+    if public_only:
+        stmt = stmt.where(Group.is_public == True)
+
+    try:
+        total = (await db.execute(
+            select(func.count()).select_from(stmt.where(relevance).subquery())
+        )).scalar() or 0
+        order = [Message.timestamp.desc()] if sort == "date" else [relevance.desc(), Message.timestamp.desc()]
+        rows = (await db.execute(
+            stmt.where(relevance).order_by(*order).offset(offset).limit(limit)
+        )).scalars().all()
+    except (OperationalError, ProgrammingError) as e:
+        if not is_fulltext_missing(e):
+            raise
+        # Fallback на LIKE если FULLTEXT-индекс ещё не создан
+        logger.warning("FULLTEXT-индекс по messages.text не найден, поиск через LIKE")
+        like = stmt.where(Message.text.like(f"%{q}%"))
+        total = (await db.execute(select(func.count()).select_from(like.subquery()))).scalar() or 0
+        rows = (await db.execute(
+            like.order_by(Message.timestamp.desc()).offset(offset).limit(limit)
+        )).scalars().all()
+
+    return [str(mid) for mid in rows], total
+
+
+async def _search_fts5(
+    db: AsyncSession, q: str, public_only: bool, offset: int, limit: int, sort: str
+) -> tuple[list[str], int]:
+    group_ids = None
+    if public_only:
+        res = await db.execute(select(Group.id).where(Group.is_public == True))
+        group_ids = [str(gid) for gid in res.scalars().all()]
+    return await asyncio.to_thread(text_index.search, q, group_ids, offset, limit, sort)
+
+
+async def search_message_ids(
+    db: AsyncSession, q: str, public_only: bool, offset: int, limit: int, sort: str = "relevance"
+) -> tuple[list[str], int]:
+    if is_fts5():
+        return await _search_fts5(db, q, public_only, offset, limit, sort)
+    return await _search_mariadb(db, q, public_only, offset, limit, sort)
+
+
+def message_index_row(msg: Message) -> dict:
+    return {
+        "id": msg.id,
+        "group_id": msg.group_id,
+        "timestamp": msg.timestamp,
+        "text": msg.text,
+        "document_text": msg.document_text,
+    }
+
+
+async def index_messages(messages: list[Message]):
+    """
+    Инкрементально добавляет новые сообщения в индекс FTS5 (для mariadb — no-op).
+    Ошибка индекса не должна ронять приём сообщения: пропуски закрывает rebuild_text_index.py.
+    """
+    if not is_fts5() or not messages:
+        return
+    rows = [message_index_row(msg) for msg in messages]
+    try:
+        await asyncio.to_thread(text_index.index_messages, rows)
+    except Exception as e:
+        logger.warning("Не удалось проиндексировать %d сообщений: %s", len(rows), e)
+
+
+async def delete_messages(message_ids: list[str]):
+    if not is_fts5() or not message_ids:
+        return
+    try:
+        await asyncio.to_thread(text_index.delete_messages, message_ids)
+    except Exception as e:
+        logger.warning("Не удалось удалить %d сообщений из индекса: %s", len(message_ids), e)
@@ -0,0 +1,102 @@
+"""
+Лёгкий стеммер для украинского и русского: отрезает типовые окончания
+и возвратные суффиксы. Не словарный — цель только свести словоформы
+("розшукується", "розшукуються", "розшук") к общей основе для индекса.
+"""
+import re
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# Апостроф внутри украинских слов (м'ясо, з'явився) не должен их разрывать
+APOSTROPHE_RE = re.compile(r"(?<=\w)['ʼ’](?=\w)")
+CYRILLIC_RE = re.compile(r"[а-яёіїєґ]")
+
+# Минимальная длина основы после отрезания окончания
+MIN_STEM = 3
+# Для окончаний прошедшего времени на -л- (зник-ла, зник-лий) — длиннее:
+# иначе короткие существительные теряют корень (сто-ла вместо стол-а)
+MIN_PAST_STEM = 4
+# Беглая гласная: будин(о)к — будинку, хлоп(е)ць — хлопця
+FLEETING_VOWEL_RE = re.compile(r"(?<=[бвгґджзклмнпрстфхцчшщ])[оеє](?=[кц]$)")
+
+REFLEXIVE = ("ся", "сь")
+
+ADJECTIVE = (
+    "ого", "ому", "ими", "ыми", "ему", "его", "ій", "ий", "ый", "ой", "ая", "яя",
+    "ое", "ее", "ые", "ие", "іх", "их", "ых", "ім", "им", "ым", "ою", "ею", "юю", "ую", "ої",
+)
+# Суффиксы причастий перед окончанием прилагательного: зник-л-ий, пропа-вш-ий
+PARTICIPLE = ("л", "вш", "авш", "ивш", "ывш", "евш")
+
+ENDINGS = tuple(sorted({
+    *ADJECTIVE,
+    *(suffix + ending for suffix in PARTICIPLE for ending in ADJECTIVE),
+    # существительные
+    "ами", "ями", "ах", "ях", "ам", "ям", "ом", "ем", "ов", "ев", "ей", "ів", "їв",
+    "ия", "ію", "ія", "ові", "еві", "єві",
+    # глаголы
+    "ешь", "ете", "ишь", "ите", "ить", "ать", "ять", "еть", "уть", "ють", "ити", "ати",
+    "яти", "іти", "ала", "али", "ало", "ила", "или", "ило", "ела", "ели", "ело",
+    "ув", "ав", "ив", "ла", "ли", "ло", "ть", "ти", "ує", "ят", "ат", "ут", "ют",
+    "ємо", "емо", "имо",
+    # глаголы на -ати/-яти в настоящем: шук-аю, шук-ають (как шук-ати, шук-али)
+    "аю", "ає", "аєш", "аємо", "аєте", "ають", "яю", "яє", "яєш", "яємо", "яєте", "яють",
+    # глаголы на -увати: розшук-ую, розшук-ують, розшук-ував; -уєть — от -ується
+    "ую", "уєш", "уєть", "уємо", "уєте", "ують", "ував", "увала", "ували", "увало", "увати",
+    # односимвольные
+    "а", "я", "о", "е", "є", "и", "і", "ї", "ы", "у", "ю", "ь", "й",
+}, key=len, reverse=True))
+
+
+def stem(word: str) -> str:
+    """
+    Сначала возвратный суффикс, затем одно самое длинное окончание,
+    после которого остаётся не меньше MIN_STEM букв. Формы одного слова
+    должны давать одну основу:
+
+    >>> [stem(w) for w in ("зник", "зниклий", "зникла", "зникли", "зниклого")]
+    ['зник', 'зник', 'зник', 'зник', 'зник']
+    >>> [stem(w) for w in ("розшук", "розшуку", "розшукується", "розшукуються", "розшукувала")]
+    ['розшук', 'розшук', 'розшук', 'розшук', 'розшук']
+    >>> [stem(w) for w in ("пропав", "пропала", "пропавший", "пропавшая", "пропавшего")]
+    ['проп', 'проп', 'проп', 'проп', 'проп']
+    >>> [stem(w) for w in ("білий", "біла", "білого")]
+    ['біл', 'біл', 'біл']
+    >>> [stem(w) for w in ("стол", "стола", "столу", "столи")]
+    ['стол', 'стол', 'стол', 'стол']
+    >>> [stem(w) for w in ("будинок", "будинку", "будинком")]
+    ['будинк', 'будинк', 'будинк']
+    >>> [stem(w) for w in ("хлопець", "хлопця", "хлопцем")]
+    ['хлопц', 'хлопц', 'хлопц']
+    >>> [stem(w) for w in ("шукаю", "шукає", "шукають", "шукали", "шукати", "шукав")]
+    ['шук', 'шук', 'шук', 'шук', 'шук', 'шук']
+    """
+    word = word.lower().replace("ё", "е")
+    if not CYRILLIC_RE.search(word):
+        return word
+
+    for suffix in REFLEXIVE:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM + 1:
+            word = word[: -len(suffix)]
+            break
+
+    for suffix in ENDINGS:
+        min_stem = MIN_PAST_STEM if suffix.startswith("л") else MIN_STEM
+        if word.endswith(suffix) and len(word) - len(suffix) >= min_stem:
+            word = word[: -len(suffix)]
+            break
+
+    if len(word) > MIN_STEM:
+        word = FLEETING_VOWEL_RE.sub("", word)
+    return word
+
+
+def tokenize(text: str) -> list[str]:
+    """Разбивает текст на слова и возвращает их основы."""
+    if not text:
+        return []
+    return [stem(token) for token in TOKEN_RE.findall(APOSTROPHE_RE.sub("", text))]
+
+
+def stem_text(text: str) -> str:
+    """Текст, приведённый к основам, — то, что хранится в индексе."""
+    return " ".join(tokenize(text))
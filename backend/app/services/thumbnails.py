@@ -0,0 +1,148 @@
+"""
+Превью фото и кропов для галерей: уменьшенные WebP/JPEG в локальном кэше (THUMB_CACHE_DIR, SSD).
+
+Источник — путь относительно QNAP_MOUNT_PATH, как в /files. Кропы из pack-хранилища
+(facepacks/{face_id}.jpg) читаются через индекс face_crops. Имя файла в кэше —
+хеш от (путь, версия источника, размер, формат); версия — mtime файла или положение
+кропа в pack, поэтому изменённый источник получает новое превью и новый ETag.
+Превью создаются лениво при первом запросе или заранее воркером (THUMB_EAGER_SIZES).
+
+mtime превью — время последнего запроса (обновляется не чаще TOUCH_INTERVAL):
+prune_thumbnails.py удаляет давно не запрошенные и самые старые сверх THUMB_CACHE_MAX_BYTES.
+"""
+import hashlib
+import io
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Callable
+
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+from app.services import face_pack_store
+from app.services.storage_service import get_qnap_path
+
+FORMATS = {"webp": ("WEBP", "image/webp"), "jpeg": ("JPEG", "image/jpeg")}
+# Попадание в кэш обновляет mtime, если он старше суток: одна запись на превью в день, а не на запрос
+TOUCH_INTERVAL = 24 * 3600
+
+
+class ThumbnailSourceNotFound(Exception):
+    pass
+
+
+def relative_path(path: str) -> str:
+    """Абсолютный путь на QNAP → путь для /files (без префикса QNAP_MOUNT_PATH)."""
+    root = str(get_qnap_path()).rstrip("/") + "/"
+    return path[len(root):] if path.startswith(root) else path.lstrip("/")
+
+
+def _source_file(rel_path: str) -> Path:
+    root = get_qnap_path().resolve()
+    path = (root / rel_path).resolve()
+    if root not in path.parents:
+        raise ThumbnailSourceNotFound(rel_path)
+    return path
+
+
+def pack_crop_id(rel_path: str) -> uuid.UUID | None:
+    prefix = face_pack_store.VIRTUAL_DIR + "/"
+    if not rel_path.startswith(prefix) or not rel_path.endswith(".jpg") or "/" in rel_path[len(prefix):]:
+        return None
+    try:
+        return uuid.UUID(rel_path[len(prefix):-len(".jpg")])
+    except ValueError:
+        return None
+
+
+def thumb_key(rel_path: str, version: str, size: int, fmt: str) -> str:
+    return hashlib.sha1(f"{rel_path}\0{version}\0{size}\0{fmt}".encode()).hexdigest()
+
+
+def thumb_file(key: str, fmt: str) -> Path:
+    return Path(settings.THUMB_CACHE_DIR) / key[:2] / f"{key}.{fmt}"
+
+
+def render(image: Image.Image, size: int, fmt: str) -> bytes:
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((size, size))
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buf = io.BytesIO()
+    image.save(buf, format=FORMATS[fmt][0], quality=settings.THUMB_QUALITY)
+    return buf.getvalue()
+
+
+def _store(key: str, fmt: str, data: bytes) -> Path:
+    path = thumb_file(key, fmt)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex[:8]}.part")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _touch(path: Path) -> bool:
+    """Отмечает запрос превью для очистки по давности. False — превью нет (или его только что удалили)."""
+    try:
+        if time.time() - path.stat().st_mtime > TOUCH_INTERVAL:
+            os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def file_version(path: Path) -> str:
+    try:
+        return str(path.stat().st_mtime_ns)
+    except FileNotFoundError:
+        raise ThumbnailSourceNotFound(str(path))
+
+
+def get_thumbnail(
+    rel_path: str, version: str, size: int, fmt: str, load_source: Callable[[], bytes]
+) -> tuple[Path, str]:
+    """
+    Возвращает (файл превью, ключ-ETag); при промахе кэша читает источник через
+    load_source() → bytes и сохраняет превью. Синхронно — вызывать в пуле потоков.
+    """
+    key = thumb_key(rel_path, version, size, fmt)
+    path = thumb_file(key, fmt)
+    if not _touch(path):
+        with Image.open(io.BytesIO(load_source())) as image:
+            path = _store(key, fmt, render(image, size, fmt))
+    return path, key
+
+
+def load_file(rel_path: str) -> tuple[str, Callable[[], bytes]]:
+    """Версия и загрузчик обычного файла на QNAP."""
+    path = _source_file(rel_path)
+    return file_version(path), path.read_bytes
+
+
+def load_pack_crop(crop) -> tuple[str, Callable[[], bytes]]:
+    """Версия и загрузчик кропа из pack (crop — строка face_crops)."""
+    return (
+        f"{crop.pack}:{crop.pack_offset}",
+        lambda: face_pack_store.read_crop(crop.pack, crop.pack_offset, crop.length),
+    )
+
+
+def pregenerate(photo_path: str, img_bgr):
+    """
+    Воркер: превью THUMB_EAGER_SIZES из уже декодированного изображения (BGR),
+    чтобы первый просмотр галереи не читал оригинал с QNAP.
+    """
+    if not settings.THUMB_EAGER_SIZES:
+        return
+    rel_path = relative_path(photo_path)
+    version = file_version(_source_file(rel_path))
+    image = Image.fromarray(img_bgr[:, :, ::-1])
+    for size in settings.THUMB_EAGER_SIZES:
+        for fmt in settings.THUMB_EAGER_FORMATS:
+            key = thumb_key(rel_path, version, size, fmt)
+            if not thumb_file(key, fmt).exists():
+                _store(key, fmt, render(image.copy(), size, fmt))
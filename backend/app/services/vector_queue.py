@@ -0,0 +1,170 @@
+"""
+Write-behind очередь векторов лиц: воркеры кладут (face_id, vector, payload) в outbox
+своей транзакции, outbox_relay.py дописывает их в Redis stream, а vector_flusher.py
+пачками выгружает их в Qdrant.
+
+В {stream}:dead попадают только записи, которые не прошли сами по себе: нечитаемые
+или отвергнутые Qdrant (4xx). Недоступность Qdrant/БД записи не «тратит» — они
+остаются в списке ожидания и перечитываются. replay_dead_letters() возвращает
+разобранные записи в очередь (vector_flusher.py --replay-dead).
+"""
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+import redis
+
+from app.core.config import settings
+
+CONSUMER_GROUP = "qdrant_flushers"
+
+logger = logging.getLogger(__name__)
+
+_redis = None
+_redis_pid = None
+_redis_lock = threading.Lock()
+
+
+def get_redis() -> redis.Redis:
+    """Синхронный Redis-клиент, один на процесс (пересоздаётся после fork)."""
+    global _redis, _redis_pid
+    pid = os.getpid()
+    if _redis is None or _redis_pid != pid:
+        with _redis_lock:
+            if _redis is None or _redis_pid != pid:
+                _redis = redis.Redis.from_url(settings.REDIS_URL)
+                _redis_pid = pid
+    return _redis
+
+
+def _fields(face_id: str, vector: list[float], payload: dict) -> dict:
+    return {
+        "face_id": face_id,
+        "vector": np.asarray(vector, dtype=np.float32).tobytes(),
+        "payload": json.dumps(payload),
+    }
+
+
+def enqueue_face_vectors(items: list[tuple[str, list[float], dict]]) -> int:
+    """Дописывает векторы в stream одним pipeline. Вектор хранится как float32-байты."""
+    if not items:
+        return 0
+    pipe = get_redis().pipeline(transaction=False)
+    for face_id, vector, payload in items:
+        pipe.xadd(settings.VECTOR_QUEUE_STREAM, _fields(face_id, vector, payload))
+    pipe.execute()
+    return len(items)
+
+
+def _ensure_group(client: redis.Redis):
+    try:
+        client.xgroup_create(settings.VECTOR_QUEUE_STREAM, CONSUMER_GROUP, id="0", mkstream=True)
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def dead_letter_stream() -> str:
+    return f"{settings.VECTOR_QUEUE_STREAM}:dead"
+
+
+def _dead_letter(client: redis.Redis, entries: list[tuple[bytes, dict]], reason: str):
+    """Переносит записи в {stream}:dead (для разбора вручную) и убирает из основной очереди."""
+    if not entries:
+        return
+    pipe = client.pipeline(transaction=False)
+    for entry_id, fields in entries:
+        pipe.xadd(dead_letter_stream(), {**(fields or {}), b"entry_id": entry_id, b"reason": reason})
+    ids = [entry_id for entry_id, _ in entries]
+    pipe.xack(settings.VECTOR_QUEUE_STREAM, CONSUMER_GROUP, *ids)
+    pipe.xdel(settings.VECTOR_QUEUE_STREAM, *ids)
+    pipe.execute()
+    logger.error("В %s перенесено %d записей: %s", dead_letter_stream(), len(entries), reason)
+
+
+def read_face_vectors(consumer: str, count: int, block_ms: int = 1000) -> list[tuple[bytes, str, list[float], dict]]:
+    """
+    Читает пачку записей для consumer. Сначала забирает себе записи, зависшие у любых
+    consumer дольше VECTOR_CLAIM_IDLE_MS (XAUTOCLAIM — например, у контейнера, которого
+    больше нет), и перечитывает свои недоподтверждённые, затем — новые.
+    Нечитаемая запись уходит в {stream}:dead и не блокирует очередь.
+    Возвращает [(entry_id, face_id, vector, payload)].
+    """
+    client = get_redis()
+    _ensure_group(client)
+
+    client.xautoclaim(
+        settings.VECTOR_QUEUE_STREAM, CONSUMER_GROUP, consumer,
+        min_idle_time=settings.VECTOR_CLAIM_IDLE_MS, start_id="0-0", count=count,
+    )
+    response = client.xreadgroup(CONSUMER_GROUP, consumer, {settings.VECTOR_QUEUE_STREAM: "0"}, count=count)
+    messages = response[0][1] if response else []
+    if not messages:
+        response = client.xreadgroup(
+            CONSUMER_GROUP, consumer, {settings.VECTOR_QUEUE_STREAM: ">"}, count=count, block=block_ms,
+        )
+        for _, stream_messages in response or []:
+            messages.extend(stream_messages)
+
+    entries = []
+    broken = []
+    for entry_id, fields in messages:
+        if not fields:
+            # Запись удалена из stream, но осталась в списке ожидания
+            ack_face_vectors([entry_id])
+            continue
+        try:
+            entries.append((
+                entry_id,
+                fields[b"face_id"].decode(),
+                np.frombuffer(fields[b"vector"], dtype=np.float32).tolist(),
+                json.loads(fields[b"payload"]),
+            ))
+        except (KeyError, ValueError, UnicodeDecodeError):
+            broken.append((entry_id, fields))
+    _dead_letter(client, broken, "unreadable entry")
+    return entries
+
+
+def reject_face_vectors(entries: list[tuple[bytes, str, list[float], dict]], reason: str):
+    """Записи, которые Qdrant отверг (см. read_face_vectors), — в {stream}:dead."""
+    _dead_letter(
+        get_redis(),
+        [(entry_id, _fields(face_id, vector, payload)) for entry_id, face_id, vector, payload in entries],
+        reason,
+    )
+
+
+def replay_dead_letters(batch: int = 1000) -> int:
+    """Возвращает все записи из {stream}:dead в основную очередь. Возвращает их число."""
+    client = get_redis()
+    replayed = 0
+    while True:
+        entries = client.xrange(dead_letter_stream(), count=batch)
+        if not entries:
+            return replayed
+        pipe = client.pipeline(transaction=False)
+        for _, fields in entries:
+            pipe.xadd(
+                settings.VECTOR_QUEUE_STREAM,
+                {key: value for key, value in fields.items() if key not in (b"entry_id", b"reason")},
+            )
+        pipe.xdel(dead_letter_stream(), *[entry_id for entry_id, _ in entries])
+        pipe.execute()
+        replayed += len(entries)
+
+
+def ack_face_vectors(entry_ids: list[bytes]):
+    """Подтверждает и удаляет обработанные записи из stream."""
+    if not entry_ids:
+        return
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.xack(settings.VECTOR_QUEUE_STREAM, CONSUMER_GROUP, *entry_ids)
+    pipe.xdel(settings.VECTOR_QUEUE_STREAM, *entry_ids)
+    pipe.execute()
+
+
+def queue_length() -> int:
+    return get_redis().xlen(settings.VECTOR_QUEUE_STREAM)
@@ -5,7 +5,7 @@ celery_app = Celery(
     "facewatch",
     broker=settings.REDIS_URL,
     backend=settings.REDIS_URL,
-    include=["app.worker.tasks"],
+    include=["app.worker.tasks", "app.worker.import_tasks"],
 )
 
 celery_app.conf.update(
@@ -26,4 +26,6 @@ celery_app.conf.update(
     # Аcks — только после завершения
     task_acks_late=True,
     worker_cancel_long_running_tasks_on_connection_loss=True,
+    # Импорт архивов — в своей очереди, его слушает только сервис celery_import
+    task_routes={"import_telegram_archive": {"queue": "imports"}},
 )
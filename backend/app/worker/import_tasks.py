@@ -0,0 +1,79 @@
+"""
+Фоновый импорт архивов Telegram Desktop, загруженных через /api/import.
+
+Задачи идут в отдельную очередь imports (сервис celery_import, concurrency=1,
+max-tasks-per-child=1): импорт длится часами и не должен занимать воркеры распознавания.
+Конвейер — app.services.telegram_import; прогресс пишется в import_jobs.
+Файл состояния лежит рядом с архивом, поэтому задача, повторно доставленная после
+падения воркера, продолжает с последней пачки. Архив и файл состояния удаляются только
+после успешного импорта; после ошибки они остаются, и POST /api/import/jobs/{id}/retry
+ставит ту же задачу заново — она продолжит с последней сохранённой пачки.
+"""
+import asyncio
+import logging
+import os
+import uuid
+
+from app.core.config import settings
+from app.worker.celery_app import celery_app
+
+logger = logging.getLogger(__name__)
+
+
+async def _run_job(job_id: str, zip_path: str, group_id: str):
+    from app.core.database import engine
+    from app.services import import_jobs
+    from app.services.telegram_import import ImportCheckpoint, default_state_path, run_import
+
+    job = await import_jobs.get_job(job_id)
+    if job is None or job["status"] in import_jobs.TERMINAL:
+        # Повторная доставка уже завершённой задачи
+        return
+
+    async def on_progress(event: dict):
+        await import_jobs.update_job(
+            job_id,
+            stats=event["stats"],
+            progress={
+                "members_done": event["members_done"],
+                "members_total": event["members_total"],
+                "member": event.get("member"),
+            },
+        )
+
+    await import_jobs.update_job(job_id, status=import_jobs.RUNNING)
+    checkpoint = None
+    try:
+        checkpoint = ImportCheckpoint(default_state_path(zip_path), zip_path, group_id)
+        if os.path.exists(checkpoint.path):
+            checkpoint.load()
+            logger.info("Импорт %s продолжается по %s", job_id, checkpoint.path)
+        stats = await run_import(
+            zip_path, uuid.UUID(group_id), checkpoint,
+            workers=settings.IMPORT_WORKERS, batch_size=settings.IMPORT_BATCH_SIZE, on_progress=on_progress,
+        )
+        await import_jobs.update_job(job_id, status=import_jobs.DONE, stats=stats)
+        logger.info("Импорт %s завершён: %s", job_id, stats)
+    except Exception as e:
+        logger.exception("Импорт %s завершился ошибкой", job_id)
+        stats = checkpoint.stats if checkpoint is not None else job["stats"]
+        await import_jobs.update_job(job_id, status=import_jobs.FAILED, stats=stats, error=str(e))
+        return
+    finally:
+        await engine.dispose()
+
+    checkpoint.remove()
+    try:
+        os.remove(zip_path)
+    except FileNotFoundError:
+        pass
+
+
+@celery_app.task(
+    name="import_telegram_archive",
+    bind=True,
+    soft_time_limit=settings.IMPORT_TASK_TIME_LIMIT,
+    time_limit=settings.IMPORT_TASK_TIME_LIMIT + 600,
+)
+def import_telegram_archive(self, job_id: str, zip_path: str, group_id: str):
+    asyncio.run(_run_job(job_id, zip_path, group_id))
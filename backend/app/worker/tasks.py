@@ -2,9 +2,7 @@ import gc
 import uuid
 import os
 import logging
-import threading
 from datetime import datetime
-import onnxruntime as ort
 
 from app.worker.celery_app import celery_app
 from app.core.config import settings
@@ -23,9 +21,10 @@ os.environ.setdefault("MKL_NUM_THREADS", str(ORT_THREADS))
 os.environ.setdefault("OPENBLAS_NUM_THREADS", str(ORT_THREADS))
 os.environ.setdefault("NUMEXPR_NUM_THREADS", str(ORT_THREADS))
 
-# ── Lazy singleton для InsightFace (по одному инстансу на det_size) ──
-_face_apps = {}
-_face_app_lock = threading.Lock()
+from app.services.face_models import FaceModelRegistry  # noqa: E402
+
+# ── Один набор ONNX-сессий на воркер-процесс (создаётся лениво уже после fork) ──
+_face_models = FaceModelRegistry(ORT_THREADS, ORT_INTER_THREADS)
 
 
 def _expand_face_bbox(bbox: list[float], image_width: int, image_height: int, padding_ratio: float) -> tuple[int, int, int, int]:
@@ -43,53 +42,9 @@ def _expand_face_bbox(bbox: list[float], image_width: int, image_height: int, pa
     return expanded_x1, expanded_y1, expanded_x2, expanded_y2
 
 
-def _get_face_app(det_size: tuple[int, int]):
-    """Возвращает кэшированный FaceAnalysis для конкретного det_size."""
-    global _face_apps
-    if det_size not in _face_apps:
-        with _face_app_lock:
-            if det_size not in _face_apps:
-                from insightface.app import FaceAnalysis
-
-                # Настраиваем ONNX session options для многопоточности
-                sess_options = ort.SessionOptions()
-                sess_options.intra_op_num_threads = ORT_THREADS
-                sess_options.inter_op_num_threads = ORT_INTER_THREADS
-                sess_options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
-
-                logger.info(
-                    "Инициализация InsightFace (det_size=%s, ORT threads: intra=%d, inter=%d)...",
-                    det_size, ORT_THREADS, ORT_INTER_THREADS,
-                )
-                app = FaceAnalysis(
-                    name="buffalo_l",
-                    providers=["CPUExecutionProvider"],
-                    provider_options=[{}],
-                )
-                # Применяем session options ко всем моделям InsightFace
-                app.prepare(ctx_id=-1, det_size=det_size)
-                for model in app.models:
-                    if hasattr(model, 'session') and model.session is not None:
-                        # Пересоздаём сессию с нашими настройками потоков
-                        model_path = model.session._model_path if hasattr(model.session, '_model_path') else None
-                        if model_path:
-                            model.session = ort.InferenceSession(
-                                model_path,
-                                sess_options=sess_options,
-                                providers=["CPUExecutionProvider"],
-                            )
-
-                _face_apps[det_size] = app
-                logger.info("InsightFace модель загружена для det_size=%s (ORT %s).", det_size, ort.__version__)
-    return _face_apps[det_size]
-
-
-def _detect_faces_adaptive(img):
-    for det_size in ((320, 320), (160, 160), (640, 640)):
-        faces = _get_face_app(det_size).get(img)
-        if faces:
-            return faces, det_size
-    return [], None
+def _analyze_images(images: list) -> list[list]:
+    """Детекция на масштабах FACE_DET_SCALES + батчевый ArcFace по всем лицам."""
+    return _face_models.analyze(images, settings.FACE_DET_SCALES, settings.FACE_REC_BATCH_SIZE)
 
 
 # ── Lazy DB engine (один раз на воркер-процесс) ──
@@ -108,6 +63,146 @@ def _get_session():
     return _SessionLocal()
 
 
+def _store_photo_faces(session, message, img, detected_faces, group_id: str, timestamp_str: str) -> list[tuple]:
+    """
+    Сохраняет лица одного фото: Face-записи и кропы на QNAP (файлы или pack, FACE_CROP_STORE).
+    Возвращает [(face, vector, payload), ...] для пакетной записи в Qdrant.
+    """
+    from app.models.models import Face
+    from app.services.face_pack_store import save_face_crop
+
+    image_height, image_width = img.shape[:2]
+    message_id = str(message.id)
+    pending = []
+    for face_data in detected_faces:
+        vector = face_data.embedding.tolist()
+        bbox = face_data.bbox.tolist()
+        confidence = float(face_data.det_score)
+
+        # Создаём Face запись
+        face = Face(
+            id=uuid.uuid4(),
+            message_id=message.id,
+            bbox=bbox,
+            confidence=confidence,
+        )
+        session.add(face)
+        session.flush()
+
+        # Сохраняем кроп лица на QNAP
+        try:
+            x1, y1, x2, y2 = _expand_face_bbox(
+                bbox,
+                image_width=image_width,
+                image_height=image_height,
+                padding_ratio=settings.FACE_CROP_PADDING,
+            )
+            crop = img[y1:y2, x1:x2]
+            if crop.size > 0:
+                face.crop_path = save_face_crop(session, crop, str(face.id))
+        except Exception as crop_err:
+            logger.warning("Не удалось сохранить кроп: %s", crop_err)
+
+        pending.append((face, vector, {
+            "face_id": str(face.id),
+            "message_id": message_id,
+            "group_id": group_id,
+            "group_ids": [group_id],
+            "timestamp": timestamp_str,
+        }))
+    return pending
+
+
+def _upsert_face_points(qdrant_client, pending: list[tuple]) -> list[dict]:
+    """
+    Пишет векторы всех лиц одним upsert и проставляет Face.qdrant_point_id.
+    Point id = face.id (как у write-behind флашера) — на него ссылается photo_face_results.
+    В режиме QDRANT_WRITE_BEHIND Qdrant не трогается: векторы уходят
+    в outbox через _stage_face_points в той же транзакции.
+    """
+    from app.services.qdrant_service import upsert_face_vectors
+
+    results = [{"face_id": str(face.id), "score": face.confidence} for face, _, _ in pending]
+    if not pending or settings.QDRANT_WRITE_BEHIND:
+        return results
+
+    point_ids = upsert_face_vectors(
+        qdrant_client,
+        [(str(face.id), vector, payload) for face, vector, payload in pending],
+        point_ids=[str(face.id) for face, _, _ in pending],
+    )
+    for (face, _, _), point_id in zip(pending, point_ids):
+        face.qdrant_point_id = uuid.UUID(point_id)
+    return results
+
+
+def _stage_face_points(session, pending: list[tuple]):
+    """
+    Write-behind: векторы лиц — в outbox той же транзакции, что и photo_processed_at
+    (outbox_relay.py отдаёт их флашеру, qdrant_point_id проставит он). Сбой Redis
+    после commit не теряет векторы.
+    """
+    if not pending or not settings.QDRANT_WRITE_BEHIND:
+        return
+    from app.services.outbox import stage_face_vectors
+
+    stage_face_vectors(session, [(str(face.id), vector, payload) for face, vector, payload in pending])
+
+
+def _skip_if_processed(session, message) -> dict | None:
+    """Возвращает результат-пропуск, если фото сообщения уже обработано."""
+    from app.models.models import Face
+
+    message_id = str(message.id)
+    if message.photo_processed_at is not None:
+        logger.info("Пропуск повторной обработки фото для message_id=%s: уже отмечено как обработанное", message_id)
+        return {"message_id": message_id, "skipped": True, "reason": "already_processed"}
+
+    existing_faces_count = session.query(Face).filter_by(message_id=message.id).count()
+    if existing_faces_count > 0:
+        # Коммит — на стороне вызывающего кода
+        message.photo_processed_at = datetime.utcnow()
+        logger.info(
+            "Пропуск повторной обработки фото для message_id=%s: лица уже существуют (%d)",
+            message_id,
+            existing_faces_count,
+        )
+        return {
+            "message_id": message_id,
+            "skipped": True,
+            "reason": "faces_already_exist",
+            "faces_processed": existing_faces_count,
+        }
+    return None
+
+
+def _pregenerate_thumbnails(photo_path: str, img):
+    """Превью THUMB_EAGER_SIZES из уже декодированного фото; ошибка не влияет на распознавание."""
+    if not settings.THUMB_EAGER_SIZES:
+        return
+    from app.services import thumbnails
+
+    try:
+        thumbnails.pregenerate(photo_path, img)
+    except Exception as e:
+        logger.warning("Не удалось создать превью для %s: %s", photo_path, e)
+
+
+def _reuse_photo_faces(session, message) -> list | None:
+    """Если фото с таким хешем уже распознано — привязывает его лица к сообщению без ONNX."""
+    from app.services import photo_faces
+
+    result = photo_faces.find_result(session, message.photo_hash)
+    if result is None:
+        return None
+    return photo_faces.attach_faces(session, message, result)
+
+
+def _reused_point_ids(faces: list) -> list[str]:
+    """Точки Qdrant переиспользованных лиц — собирать до commit (после него объекты expired)."""
+    return sorted({str(face.qdrant_point_id) for face in faces})
+
+
 @celery_app.task(name="process_photo", bind=True, max_retries=5)
 def process_photo(self, message_id: str, photo_path: str, group_id: str, timestamp_str: str):
     """
@@ -117,15 +212,38 @@ def process_photo(self, message_id: str, photo_path: str, group_id: str, timesta
     try:
         import cv2
 
-        from app.models.models import Face, Message
-        from app.services.qdrant_service import ensure_collection_exists, upsert_face_vector
-        from app.services.storage_service import save_face_crop_to_qnap
+        from app.models.models import Message
+        from app.services import photo_faces
+        from app.services.qdrant_service import ensure_collection_exists
 
         # Celery передаёт все параметры как строки (JSON) — конвертируем в UUID
         message_id_uuid = uuid.UUID(message_id) if isinstance(message_id, str) else message_id
 
         session = _get_session()
 
+        message = session.query(Message).filter_by(id=message_id_uuid).first()
+        if not message:
+            raise self.retry(
+                exc=ValueError(f"Message not found yet: {message_id}"),
+                countdown=5,
+            )
+
+        skipped = _skip_if_processed(session, message)
+        if skipped:
+            session.commit()
+            return skipped
+
+        # То же фото уже распознано (переслано из другой группы) — ONNX не нужен
+        reused = _reuse_photo_faces(session, message)
+        if reused is not None:
+            message.photo_processed_at = datetime.utcnow()
+            point_ids = _reused_point_ids(reused)
+            session.commit()
+            # После commit: группа нового сообщения попадает в group_ids точек
+            photo_faces.sync_point_groups(session, point_ids)
+            logger.info("Переиспользовано %d лиц по хешу фото для message_id=%s", len(reused), message_id)
+            return {"message_id": message_id, "faces_processed": len(reused), "reused": True}
+
         # Читаем изображение
         img = cv2.imread(photo_path)
         if img is None:
@@ -134,11 +252,11 @@ def process_photo(self, message_id: str, photo_path: str, group_id: str, timesta
         image_height, image_width = img.shape[:2]
 
         # Детекция лиц (кэшированная модель)
-        detected_faces, used_det_size = _detect_faces_adaptive(img)
+        [detected_faces] = _analyze_images([img])
         if detected_faces:
             logger.info(
-                "Найдено %d лиц для изображения %sx%s с det_size=%s",
-                len(detected_faces), image_width, image_height, used_det_size,
+                "Найдено %d лиц для изображения %sx%s (масштабы детектора %s)",
+                len(detected_faces), image_width, image_height, settings.FACE_DET_SCALES,
             )
         else:
             logger.warning(
@@ -146,84 +264,17 @@ def process_photo(self, message_id: str, photo_path: str, group_id: str, timesta
                 image_width, image_height, photo_path,
             )
 
-        # Qdrant клиент
-        qdrant_client = ensure_collection_exists()
-
-        message = session.query(Message).filter_by(id=message_id_uuid).first()
-        if not message:
-            raise self.retry(
-                exc=ValueError(f"Message not found yet: {message_id}"),
-                countdown=5,
-            )
-
-        if message.photo_processed_at is not None:
-            logger.info("Пропуск повторной обработки фото для message_id=%s: уже отмечено как обработанное", message_id)
-            return {"message_id": message_id, "skipped": True, "reason": "already_processed"}
-
-        existing_faces_count = session.query(Face).filter_by(message_id=message.id).count()
-        if existing_faces_count > 0:
-            message.photo_processed_at = datetime.utcnow()
-            session.commit()
-            logger.info(
-                "Пропуск повторной обработки фото для message_id=%s: лица уже существуют (%d)",
-                message_id,
-                existing_faces_count,
-            )
-            return {
-                "message_id": message_id,
-                "skipped": True,
-                "reason": "faces_already_exist",
-                "faces_processed": existing_faces_count,
-            }
-
-        results = []
-        for face_data in detected_faces:
-            vector = face_data.embedding.tolist()
-            bbox = face_data.bbox.tolist()
-            confidence = float(face_data.det_score)
-
-            # Создаём Face запись
-            face = Face(
-                id=uuid.uuid4(),
-                message_id=message.id,
-                bbox=bbox,
-                confidence=confidence,
-            )
-            session.add(face)
-            session.flush()
+        # Qdrant клиент (в режиме write-behind не нужен)
+        qdrant_client = None if settings.QDRANT_WRITE_BEHIND else ensure_collection_exists()
 
-            # Сохраняем кроп лица на QNAP
-            try:
-                x1, y1, x2, y2 = _expand_face_bbox(
-                    bbox,
-                    image_width=image_width,
-                    image_height=image_height,
-                    padding_ratio=settings.FACE_CROP_PADDING,
-                )
-                crop = img[y1:y2, x1:x2]
-                if crop.size > 0:
-                    crop_path = save_face_crop_to_qnap(crop, str(face.id))
-                    face.crop_path = crop_path
-            except Exception as crop_err:
-                logger.warning("Не удалось сохранить кроп: %s", crop_err)
-
-            # Сохраняем вектор в Qdrant
-            point_id = upsert_face_vector(
-                qdrant_client,
-                face_id=str(face.id),
-                vector=vector,
-                payload={
-                    "face_id": str(face.id),
-                    "message_id": message_id,
-                    "group_id": group_id,
-                    "timestamp": timestamp_str,
-                },
-            )
-            face.qdrant_point_id = uuid.UUID(point_id)
-            results.append({"face_id": str(face.id), "score": confidence})
+        pending = _store_photo_faces(session, message, img, detected_faces, group_id, timestamp_str)
+        photo_faces.record_result(session, message.photo_hash, [face for face, _, _ in pending])
+        results = _upsert_face_points(qdrant_client, pending)
+        _stage_face_points(session, pending)
 
         message.photo_processed_at = datetime.utcnow()
         session.commit()
+        _pregenerate_thumbnails(photo_path, img)
         logger.info("Обработано %d лиц для message_id=%s", len(results), message_id)
 
         # Освобождаем память изображения и запускаем GC
@@ -244,3 +295,165 @@ def process_photo(self, message_id: str, photo_path: str, group_id: str, timesta
     finally:
         if session:
             session.close()
+
+
+@celery_app.task(
+    name="process_photo_batch",
+    bind=True,
+    max_retries=3,
+    soft_time_limit=max(120, 20 * settings.PHOTO_BATCH_SIZE),
+    time_limit=max(180, 30 * settings.PHOTO_BATCH_SIZE),
+)
+def process_photo_batch(self, items: list[list[str]]):
+    """
+    Батчевый режим: N фото за одну задачу.
+    items — список [message_id, photo_path, group_id, timestamp_str] (аргументы process_photo).
+    Детекция идёт по каждому фото, распознавание — одним прогоном ArcFace на все лица.
+    Уже распознанные хеши (и повторы хеша внутри батча) берутся из photo_face_results.
+    """
+    session = None
+    images = []
+    try:
+        import cv2
+
+        from app.models.models import Message
+        from app.services import photo_faces
+        from app.services.qdrant_service import ensure_collection_exists
+
+        session = _get_session()
+
+        summary = {"processed": 0, "skipped": 0, "requeued": 0, "reused": 0, "faces_processed": 0}
+        to_analyze = []
+        deferred = []
+        reused_faces = []
+        analyzing_hashes = set()
+        for args in items:
+            message_id, photo_path, group_id, timestamp_str = args
+            message = session.query(Message).filter_by(id=uuid.UUID(message_id)).first()
+            if not message:
+                # Message ещё не виден — отдаём фото обычной задаче с её retry-логикой
+                process_photo.apply_async(args=args, countdown=5)
+                summary["requeued"] += 1
+                continue
+
+            if _skip_if_processed(session, message):
+                summary["skipped"] += 1
+                continue
+
+            if message.photo_hash and message.photo_hash in analyzing_hashes:
+                # То же фото уже распознаётся в этом батче — возьмём его результат
+                deferred.append((message, args))
+                continue
+
+            reused = _reuse_photo_faces(session, message)
+            if reused is not None:
+                message.photo_processed_at = datetime.utcnow()
+                reused_faces.extend(reused)
+                summary["reused"] += 1
+                continue
+
+            img = cv2.imread(photo_path)
+            if img is None:
+                logger.error("Не удалось открыть изображение: %s", photo_path)
+                continue
+            if message.photo_hash:
+                analyzing_hashes.add(message.photo_hash)
+            to_analyze.append((message, args))
+            images.append(img)
+
+        analyzed = _analyze_images(images) if images else []
+        logger.info(
+            "Батч: %d фото, %d лиц, переиспользовано %d",
+            len(images), sum(len(faces) for faces in analyzed), summary["reused"],
+        )
+
+        qdrant_client = None if settings.QDRANT_WRITE_BEHIND else ensure_collection_exists()
+
+        pending = []
+        for (message, args), img, detected_faces in zip(to_analyze, images, analyzed):
+            message_id, photo_path, group_id, timestamp_str = args
+            try:
+                with session.begin_nested():
+                    photo_pending = _store_photo_faces(session, message, img, detected_faces, group_id, timestamp_str)
+                    photo_faces.record_result(session, message.photo_hash, [face for face, _, _ in photo_pending])
+            except Exception as e:
+                logger.error("Ошибка сохранения лиц для message_id=%s: %s", message_id, e, exc_info=True)
+                process_photo.apply_async(args=args, countdown=15)
+                summary["requeued"] += 1
+                continue
+
+            message.photo_processed_at = datetime.utcnow()
+            pending.extend(photo_pending)
+            summary["processed"] += 1
+
+        for message, args in deferred:
+            reused = _reuse_photo_faces(session, message)
+            if reused is None:
+                # Первое фото с этим хешем не сохранилось — обычная задача распознает заново
+                process_photo.apply_async(args=args, countdown=15)
+                summary["requeued"] += 1
+                continue
+            message.photo_processed_at = datetime.utcnow()
+            reused_faces.extend(reused)
+            summary["reused"] += 1
+
+        # Все лица батча — одним upsert в Qdrant, затем один коммит
+        summary["faces_processed"] = len(_upsert_face_points(qdrant_client, pending))
+        _stage_face_points(session, pending)
+        reused_point_ids = _reused_point_ids(reused_faces)
+        session.commit()
+        photo_faces.sync_point_groups(session, reused_point_ids)
+        for (_, args), img in zip(to_analyze, images):
+            _pregenerate_thumbnails(args[1], img)
+
+        logger.info("Батч обработан: %s", summary)
+        return summary
+
+    except Retry:
+        raise
+    except Exception as e:
+        logger.error("Ошибка батчевой обработки (%d фото): %s", len(items), e, exc_info=True)
+        raise self.retry(exc=e, countdown=15)
+    finally:
+        images.clear()
+        gc.collect()
+        if session:
+            session.close()
+
+
+@celery_app.task(name="release_blobs")
+def release_blobs(photo_hashes: list[str]):
+    """Отложенное удаление blob без ссылок (см. blob_store.release_photos): ссылки перепроверяются."""
+    from app.services.blob_store import release_blobs_sync
+
+    session = _get_session()
+    try:
+        removed, deferred = release_blobs_sync(session, photo_hashes)
+    finally:
+        session.close()
+    if deferred:
+        release_blobs.apply_async(args=[deferred], countdown=settings.BLOB_RELEASE_GRACE_SECONDS)
+    if removed:
+        logger.info("Удалено %d blob без ссылок", removed)
+
+
+def enqueue_photo_tasks(task_args: list[tuple]) -> int:
+    """
+    Ставит задачи распознавания в очередь.
+    При PHOTO_BATCH_SIZE > 1 фото группируются в задачи process_photo_batch.
+    """
+    if not task_args:
+        return 0
+
+    batch_size = settings.PHOTO_BATCH_SIZE
+    # Один producer (одно соединение с брокером) на все публикации
+    with celery_app.producer_or_acquire() as producer:
+        if batch_size <= 1 or len(task_args) <= 1:
+            for args in task_args:
+                process_photo.apply_async(args=list(args), producer=producer)
+            return len(task_args)
+
+        for start in range(0, len(task_args), batch_size):
+            chunk = [list(args) for args in task_args[start:start + batch_size]]
+            process_photo_batch.apply_async(args=[chunk], producer=producer)
+    return len(task_args)
@@ -57,6 +57,15 @@ def main():
     )
     print("  ✓ group_id индекс создан")
 
+    # Создаём payload-индекс по group_ids (все группы пересланного фото)
+    print("Создаю payload-индекс: group_ids...")
+    client.create_payload_index(
+        collection_name=COLLECTION_NAME,
+        field_name="group_ids",
+        field_schema="keyword",
+    )
+    print("  ✓ group_ids индекс создан")
+
     # Проверяем результат
     info_after = client.get_collection(COLLECTION_NAME)
     schema = getattr(info_after, 'payload_schema', {})
@@ -12,7 +12,8 @@ import uuid
 from sqlalchemy import delete, func, select
 
 from app.core.database import AsyncSessionLocal
-from app.models.models import Message, MessagePhone
+from app.models.models import Message, MessagePhone, PhoneSuffix
+from app.services.phone_index import index_phones
 from app.services.phone_utils import extract_phones
 
 
@@ -48,6 +49,7 @@ async def main(reset: bool, dry_run: bool):
             )
             if not dry_run:
                 await db.execute(delete(MessagePhone))
+                await db.execute(delete(PhoneSuffix))
                 await db.commit()
 
         offset = 0
@@ -66,12 +68,14 @@ async def main(reset: bool, dry_run: bool):
                 break
 
             batch_rows = 0
+            batch_phones: set[str] = set()
             for message_id, text in rows:
                 phones = extract_phones(text)
                 if not phones:
                     continue
 
                 unique_phones_seen.update(phones)
+                batch_phones.update(phones)
                 if dry_run:
                     batch_rows += len(phones)
                     continue
@@ -81,6 +85,7 @@ async def main(reset: bool, dry_run: bool):
                     batch_rows += 1
 
             if not dry_run:
+                await index_phones(db, batch_phones)
                 await db.commit()
 
             inserted_rows += batch_rows
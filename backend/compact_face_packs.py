@@ -0,0 +1,263 @@
+"""
+Обслуживание pack-хранилища кропов лиц (FACE_CROP_STORE=pack).
+
+Компактизация: pack-файлы старше --min-age-hours, в которых живых данных меньше
+--max-live-ratio, переписываются — живые кропы копируются в новый pack, индекс
+face_crops обновляется одной транзакцией, старый файл переименовывается в *.dead:
+запросы, успевшие прочитать старый индекс, дочитывают его. *.dead старше
+DEAD_PACK_GRACE_SECONDS удаляются в начале следующего запуска.
+Кроп жив, пока на него ссылается лицо: Face.id или Face.qdrant_point_id
+(лица, переиспользованные по хешу фото) либо photo_face_results.
+
+--import-legacy переносит старые кропы faces/{shard}/{face_id}.jpg в pack-файлы
+и переписывает Face.crop_path; исходные файлы удаляются после commit пачки.
+
+Примеры:
+    python compact_face_packs.py --dry-run
+    python compact_face_packs.py --max-live-ratio 0.6
+    python compact_face_packs.py --import-legacy --batch 2000
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, delete, or_, select, update
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.models.models import Face, FaceCrop, PhotoFaceResult
+from app.services import face_pack_store
+
+LEGACY_MARKER = "/faces/"
+ID_CHUNK = 1000
+# Дольше этого запрос /files/facepacks не держит прочитанный индекс
+DEAD_PACK_GRACE_SECONDS = 600
+
+
+def _make_session_factory():
+    sync_db_url = settings.DATABASE_URL.replace("mysql+aiomysql", "mysql+pymysql")
+    engine = create_engine(sync_db_url, pool_pre_ping=True, pool_size=2, max_overflow=0)
+    return sessionmaker(bind=engine)
+
+
+def _chunks(items: list, size: int = ID_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _referenced_by_faces(session, face_ids: list[uuid.UUID]) -> set[uuid.UUID]:
+    referenced = set()
+    for chunk in _chunks(face_ids):
+        rows = session.execute(
+            select(Face.id, Face.qdrant_point_id).where(or_(Face.id.in_(chunk), Face.qdrant_point_id.in_(chunk)))
+        ).all()
+        for face_id, point_id in rows:
+            referenced.add(face_id)
+            if point_id is not None:
+                referenced.add(point_id)
+    return referenced
+
+
+def _referenced_by_results(session, candidates: set[uuid.UUID], batch: int) -> set[uuid.UUID]:
+    """Кропы из photo_face_results: переиспользование по хешу скопирует их crop_path в новые лица."""
+    referenced = set()
+    last_hash = None
+    while candidates:
+        stmt = select(PhotoFaceResult.photo_hash, PhotoFaceResult.faces).order_by(PhotoFaceResult.photo_hash).limit(batch)
+        if last_hash is not None:
+            stmt = stmt.where(PhotoFaceResult.photo_hash > last_hash)
+        rows = session.execute(stmt).all()
+        if not rows:
+            break
+        for _, faces in rows:
+            for item in faces:
+                point_id = uuid.UUID(item["point_id"])
+                if point_id in candidates:
+                    referenced.add(point_id)
+        last_hash = rows[-1].photo_hash
+    return referenced
+
+
+def _remove_dead_packs(packs_dir: Path, dry_run: bool) -> int:
+    """Удаляет pack-файлы, переписанные прошлыми запусками. Возвращает освобождённые байты."""
+    cutoff = time.time() - DEAD_PACK_GRACE_SECONDS
+    freed = 0
+    for path in packs_dir.glob(f"*.pack{face_pack_store.DEAD_SUFFIX}"):
+        stat = path.stat()
+        if stat.st_mtime >= cutoff:
+            continue
+        if not dry_run:
+            os.remove(path)
+        freed += stat.st_size
+    if freed:
+        print(f"🗑️  Pack-файлы прошлых запусков: {freed / (1024 * 1024):.1f} MB")
+    return freed
+
+
+def compact(SessionLocal, min_age_hours: float, max_live_ratio: float, batch: int, dry_run: bool):
+    packs_dir = face_pack_store.packs_dir()
+    if not packs_dir.exists():
+        print(f"⚠️  {packs_dir} не найден — pack-файлов нет")
+        return
+
+    freed = _remove_dead_packs(packs_dir, dry_run)
+    writer = face_pack_store.get_writer()
+    cutoff = time.time() - min_age_hours * 3600
+    packs = sorted(p for p in packs_dir.glob("*.pack") if p.stat().st_mtime < cutoff)
+    print(f"📦 Pack-файлов старше {min_age_hours} ч: {len(packs)}")
+
+    for path in packs:
+        size = path.stat().st_size
+        with SessionLocal() as session:
+            rows = session.execute(
+                select(FaceCrop.face_id, FaceCrop.pack_offset, FaceCrop.length).where(FaceCrop.pack == path.name)
+            ).all()
+            face_ids = [row.face_id for row in rows]
+            referenced = _referenced_by_faces(session, face_ids)
+            unreferenced = set(face_ids) - referenced
+            if unreferenced:
+                referenced |= _referenced_by_results(session, unreferenced, batch)
+
+            live = [row for row in rows if row.face_id in referenced]
+            dead = [row.face_id for row in rows if row.face_id not in referenced]
+            live_bytes = sum(face_pack_store.RECORD_HEADER.size + row.length for row in live)
+            ratio = live_bytes / size if size else 0.0
+            if ratio > max_live_ratio:
+                continue
+
+            print(f"   {path.name}: живых {len(live)}/{len(rows)}, {ratio:.0%} от {size / (1024 * 1024):.1f} MB")
+            if dry_run:
+                freed += size - live_bytes
+                continue
+
+            moved = []
+            for row in live:
+                data = face_pack_store.read_crop(path.name, row.pack_offset, row.length)
+                pack, offset = writer.append(str(row.face_id), data)
+                moved.append({"face_id": row.face_id, "pack": pack, "pack_offset": offset})
+            if moved:
+                session.execute(update(FaceCrop), moved)
+            for chunk in _chunks(dead):
+                session.execute(delete(FaceCrop).where(FaceCrop.face_id.in_(chunk)))
+            session.commit()
+
+        # Не удаляем сразу: читатели со старым индексом дочитывают .dead (см. read_crop)
+        dead_path = path.with_name(path.name + face_pack_store.DEAD_SUFFIX)
+        os.rename(path, dead_path)
+        os.utime(dead_path)
+        freed += size - live_bytes
+
+    writer.close()
+    verb = "Можно освободить" if dry_run else "Освобождено"
+    print(f"🎉 {verb}: {freed / (1024 * 1024):.1f} MB")
+
+
+def _pack_legacy_file(session, writer, legacy_path: str) -> str | None:
+    """Кроп faces/{shard}/{face_id}.jpg → pack; face_id берётся из имени файла (общий у переиспользованных лиц)."""
+    crop_id = Path(legacy_path).stem
+    if session.get(FaceCrop, uuid.UUID(crop_id)) is None:
+        try:
+            with open(legacy_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        pack, offset = writer.append(crop_id, data)
+        session.add(FaceCrop(face_id=uuid.UUID(crop_id), pack=pack, pack_offset=offset, length=len(data)))
+        session.flush()
+    return face_pack_store.crop_path(crop_id)
+
+
+def _import_faces(SessionLocal, writer, batch: int) -> int:
+    done = 0
+    last_id = None
+    while True:
+        with SessionLocal() as session:
+            stmt = (
+                select(Face.id, Face.crop_path)
+                .where(Face.crop_path.like(f"%{LEGACY_MARKER}%"))
+                .order_by(Face.id)
+                .limit(batch)
+            )
+            if last_id is not None:
+                stmt = stmt.where(Face.id > last_id)
+            rows = session.execute(stmt).all()
+            if not rows:
+                return done
+
+            packed = {}
+            for row in rows:
+                if row.crop_path not in packed:
+                    packed[row.crop_path] = _pack_legacy_file(session, writer, row.crop_path)
+            updates = [
+                {"id": row.id, "crop_path": packed[row.crop_path]} for row in rows if packed[row.crop_path]
+            ]
+            if updates:
+                session.execute(update(Face), updates)
+            session.commit()
+
+        for legacy_path, new_path in packed.items():
+            if new_path:
+                try:
+                    os.remove(legacy_path)
+                except FileNotFoundError:
+                    pass
+        done += len(rows)
+        last_id = rows[-1].id
+        print(f"   Перенесено кропов: {done}")
+
+
+def _import_results(SessionLocal, batch: int) -> int:
+    """Переписывает crop_path в photo_face_results на виртуальные пути pack-хранилища."""
+    done = 0
+    last_hash = None
+    while True:
+        with SessionLocal() as session:
+            stmt = select(PhotoFaceResult).order_by(PhotoFaceResult.photo_hash).limit(batch)
+            if last_hash is not None:
+                stmt = stmt.where(PhotoFaceResult.photo_hash > last_hash)
+            results = session.execute(stmt).scalars().all()
+            if not results:
+                return done
+            for result in results:
+                if any(LEGACY_MARKER in (item.get("crop_path") or "") for item in result.faces):
+                    result.faces = [
+                        {**item, "crop_path": face_pack_store.crop_path(Path(item["crop_path"]).stem)}
+                        if LEGACY_MARKER in (item.get("crop_path") or "") else item
+                        for item in result.faces
+                    ]
+                    done += 1
+            last_hash = results[-1].photo_hash
+            session.commit()
+
+
+def import_legacy(SessionLocal, batch: int):
+    writer = face_pack_store.get_writer()
+    print("📥 Перенос кропов faces/ в pack-файлы...")
+    total = _import_faces(SessionLocal, writer, batch)
+    print("🔁 Обновление photo_face_results...")
+    results = _import_results(SessionLocal, batch)
+    # Лица, переиспользованные со старым путём, пока шёл перенос
+    total += _import_faces(SessionLocal, writer, batch)
+    writer.close()
+    print(f"🎉 Перенесено кропов: {total}, обновлено результатов по хешу: {results}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Компактизация pack-файлов кропов лиц")
+    parser.add_argument("--min-age-hours", type=float, default=24, help="Не трогать pack-файлы моложе (в них ещё пишут)")
+    parser.add_argument("--max-live-ratio", type=float, default=0.7, help="Переписывать pack, если живых данных не больше доли")
+    parser.add_argument("--batch", type=int, default=1000, help="Строк за один проход")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет переписано")
+    parser.add_argument("--import-legacy", action="store_true", help="Перенести кропы faces/*.jpg в pack-файлы")
+    args = parser.parse_args()
+
+    SessionLocal = _make_session_factory()
+    if args.import_legacy:
+        import_legacy(SessionLocal, args.batch)
+    else:
+        compact(SessionLocal, args.min_age_hours, args.max_live_ratio, args.batch, args.dry_run)
@@ -3,15 +3,16 @@ import os
 import hashlib
 from collections import defaultdict
 from qdrant_client import AsyncQdrantClient
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, func
 from sqlalchemy.orm import selectinload
 
 import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app.core.database import AsyncSessionLocal
-from app.models.models import Message, Face, MessagePhone
+from app.models.models import Message, Face, MessagePhone, PhotoFaceResult
 from app.core.config import settings
+from app.services.qdrant_service import record_changes, wait_for_writes
 
 COLLECTION_NAME = "faces"
 
@@ -45,7 +46,8 @@ async def main():
         total_msgs = len(messages)
         print(f"📸 Найдено сообщений с фотографиями: {total_msgs}")
 
-        # Группируем по хэшу
+        # Группируем по (группа, хэш): одно фото в разных группах — не дубликат,
+        # такие сообщения делят лица и точки Qdrant (photo_face_results)
         hash_to_msgs = defaultdict(list)
         missing_files = 0
         hashed_count = 0
@@ -57,7 +59,7 @@ async def main():
 
             # ОПТИМИЗАЦИЯ: Если хэш уже в базе, используем его
             if msg.photo_hash:
-                hash_to_msgs[msg.photo_hash].append(msg)
+                hash_to_msgs[(msg.group_id, msg.photo_hash)].append(msg)
                 pre_hashed_count += 1
                 continue
 
@@ -69,7 +71,7 @@ async def main():
             try:
                 with open(path, "rb") as f:
                     file_hash = hashlib.sha256(f.read()).hexdigest()
-                hash_to_msgs[file_hash].append(msg)
+                hash_to_msgs[(msg.group_id, file_hash)].append(msg)
                 hashed_count += 1
                 
                 if hashed_count % 1000 == 0:
@@ -90,7 +92,7 @@ async def main():
 
         print("🧹 Начинаем удаление дубликатов...")
 
-        for file_hash, msg_group in hash_to_msgs.items():
+        for (_, file_hash), msg_group in hash_to_msgs.items():
             # Самое старое сообщение оставляем как оригинал
             original_msg = msg_group[0]
             if original_msg.photo_hash != file_hash:
@@ -114,8 +116,17 @@ async def main():
                 faces_res = await db.execute(select(Face).where(Face.message_id == dup_id))
                 faces = faces_res.scalars().all()
                 for face in faces:
+                    # Кроп и точка Qdrant могут быть общими с сообщениями других групп
+                    shared = False
+                    if face.qdrant_point_id:
+                        shared = (await db.execute(
+                            select(func.count(Face.id)).where(
+                                Face.qdrant_point_id == face.qdrant_point_id, Face.message_id != dup_id
+                            )
+                        )).scalar() > 0
+
                     # Удаляем кроп с физического диска QNAP
-                    if face.crop_path and os.path.exists(face.crop_path):
+                    if not shared and face.crop_path and os.path.exists(face.crop_path):
                         try:
                             file_size = os.path.getsize(face.crop_path)
                             os.remove(face.crop_path)
@@ -124,13 +135,18 @@ async def main():
                             pass
                     
                     # Удаляем вектор из Qdrant (ИСПРАВЛЕНО: COLLECTION_NAME)
-                    if face.qdrant_point_id:
+                    if face.qdrant_point_id and not shared:
                         try:
+                            # Не удаляем, пока migrate_qdrant_collection.py переключает коллекцию
+                            await asyncio.to_thread(wait_for_writes)
                             await qdrant_client.delete(
                                 collection_name=COLLECTION_NAME,
                                 points_selector=[str(face.qdrant_point_id)]
                             )
+                            await asyncio.to_thread(record_changes, [str(face.qdrant_point_id)])
                             deleted_qdrant_points += 1
+                            # Результат по хешу мог ссылаться на эту точку — следующее фото распознается заново
+                            await db.execute(delete(PhotoFaceResult).where(PhotoFaceResult.photo_hash == file_hash))
                         except Exception as e:
                             print(f"Ошибка удаления точки Qdrant {face.qdrant_point_id}: {e}")
                             
@@ -1,37 +1,66 @@
+"""
+Локальный импорт больших ZIP-архивов Telegram Desktop (десятки GB) прямо с QNAP.
+
+Конвейер (разбор → пул копирования фото → пакетная запись в БД) — app/services/telegram_import.py,
+тот же, что у фоновых задач /api/import.
+
+После каждой пачки прогресс (файл сообщений и позиция в нём) сохраняется в файл состояния
+рядом с архивом (<zip>.import-state.json или --state). При обрыве (сбой NAS, БД)
+запуск с --resume продолжает с последней сохранённой пачки; повтор пачки безопасен —
+сообщения с теми же telegram_message_id и фото с тем же хешем пропускаются.
+
+Примеры:
+    python import_local.py /mnt/qnap_photos/backup/export.zip --group "Моя группа"
+    python import_local.py /mnt/qnap_photos/backup/export.zip --group "Моя группа" --resume
+    python import_local.py export.zip --group "Моя группа" --workers 16 --batch 1000
+"""
 import asyncio
 import os
 import sys
 import uuid
-import re
-import shutil
-import zipfile
 import traceback
-from pathlib import Path
-from datetime import datetime
 import argparse
 
 # Добавляем путь, чтобы импорты приложения работали
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app.core.database import AsyncSessionLocal
-from app.models.models import Group, Message
-from app.core.config import settings
-from app.api.endpoints.imports import parse_telegram_messages_html
-from app.worker.tasks import process_photo
+from app.models.models import Group
+from app.services.telegram_import import ImportArchiveError, ImportCheckpoint, default_state_path, run_import
 from sqlalchemy import select
 
-async def import_backup_local(zip_path: str, group_name: str, extract_dir: str = "/mnt/qnap_photos/backup/temp_extract"):
+
+async def _print_progress(event: dict):
+    if event["event"] == "start":
+        print(f"📊 В базе уже есть {event['existing']} сообщений для этой группы. Они будут пропущены.")
+        print(f"📋 Найдено {event['members_total']} файлов с сообщениями, готово: {event['members_done']}.")
+    elif event["event"] == "member":
+        print(f"👉 Парсинг {event['member']}...")
+        if event["resume_from"] >= 0:
+            print(f"   ⏩ Продолжаем с позиции {event['resume_from'] + 1}")
+    elif event["event"] == "member_done":
+        print(f"   Файл {event['member']} успешно обработан: {event['written']} новых сообщений")
+
+
+async def import_backup_local(
+    zip_path: str,
+    group_name: str,
+    workers: int = 8,
+    batch_size: int = 500,
+    resume: bool = False,
+    state_path: str | None = None,
+):
     if not os.path.exists(zip_path):
         print(f"❌ Файл {zip_path} не найден.")
         return
 
     print(f"🚀 Начинаем импорт из {zip_path} в группу '{group_name}'")
-    
+
     # 1. Создаем или находим группу
     async with AsyncSessionLocal() as db:
         result = await db.execute(select(Group).where(Group.name == group_name))
         group = result.scalar_one_or_none()
-        
+
         if not group:
             group = Group(id=uuid.uuid4(), name=group_name)
             db.add(group)
@@ -41,146 +70,53 @@ async def import_backup_local(zip_path: str, group_name: str, extract_dir: str =
         else:
             print(f"📁 Используем существующую группу: {group_name} (ID: {group.id})")
 
-    print("🔍 Получаем список уже загруженных сообщений для предотвращения дубликатов...")
-    async with AsyncSessionLocal() as db:
-        result = await db.execute(select(Message.telegram_message_id).where(Message.group_id == group.id, Message.telegram_message_id.isnot(None)))
-        existing_msg_ids = set(row[0] for row in result.all())
-    print(f"📊 В базе уже есть {len(existing_msg_ids)} сообщений для этой группы. Они будут пропущены.")
-
-    # 2. Распаковка архива
-    zip_dir = os.path.join(extract_dir, f"extract_{uuid.uuid4().hex[:8]}")
-    os.makedirs(zip_dir, exist_ok=True)
-    
-    try:
-        print(f"⏳ Распаковка архива в {zip_dir}...")
-        print("   (Для файлов размером ~40GB этот процесс может занять от 10 минут до часа в зависимости от диска)")
-        with zipfile.ZipFile(zip_path, "r") as z:
-            z.extractall(zip_dir)
-        print("✅ Распаковка завершена.")
-
-        # 3. Поиск файлов сообщений
-        export_dir = None
-        html_files = []
-        for root, dirs, files in os.walk(zip_dir):
-            for file_name in files:
-                if re.match(r"^messages.*\.html$", file_name):
-                    export_dir = root
-                    html_files.append(file_name)
-
-        if not export_dir or not html_files:
-            print("❌ Файлы сообщений (messages*.html) не найдены в архиве.")
+    checkpoint = ImportCheckpoint(state_path or default_state_path(zip_path), zip_path, str(group.id))
+    if resume and os.path.exists(checkpoint.path):
+        try:
+            checkpoint.load()
+        except ValueError as e:
+            print(f"❌ Нельзя продолжить: {e}")
             return
-
-        def sort_key(filename):
-            match = re.search(r"messages(\d*)\.html", filename)
-            if not match: return 0
-            num_str = match.group(1)
-            return int(num_str) if num_str else 0
-
-        html_files.sort(key=sort_key)
-        photos_dir = os.path.join(export_dir, "photos")
-        
-        print(f"📋 Найдено {len(html_files)} файлов с сообщениями (HTML).")
-
-        # 4. Обработка файлов по очереди, чтобы избежать OOM (вылета по оперативной памяти)
-        stats = {"messages": 0, "photos": 0, "faces_queued": 0}
-        
-        for html_file in html_files:
-            print(f"👉 Парсинг {html_file}...")
-            html_path = os.path.join(export_dir, html_file)
-            
-            with open(html_path, "r", encoding="utf-8") as f:
-                html_content = f.read()
-                
-            messages_data = parse_telegram_messages_html(html_content, photos_dir if os.path.exists(photos_dir) else "")
-            print(f"   Найдено {len(messages_data)} сообщений. Идет сохранение в Базу Данных и копирование фото...")
-            
-            # Открываем новую сессию БД для каждого файла, чтобы не держать огромные транзакции
-            async with AsyncSessionLocal() as db:
-                queued_tasks = []
-                for msg_data in messages_data:
-                    tg_msg_id = int(msg_data["message_id"]) if msg_data["message_id"] else None
-                    if tg_msg_id and tg_msg_id in existing_msg_ids:
-                        # Пропускаем дубликаты
-                        continue
-
-                    has_photo = bool(msg_data["photo_rel_path"])
-                    photo_hash = None
-                    if has_photo and os.path.exists(photos_dir):
-                        src_photo = os.path.join(export_dir, msg_data["photo_rel_path"])
-                        if os.path.isfile(src_photo):
-                            import hashlib
-                            with open(src_photo, "rb") as photo_file:
-                                photo_hash = hashlib.sha256(photo_file.read()).hexdigest()
-                                
-                            dup_photo = await db.execute(select(Message).where(Message.photo_hash == photo_hash))
-                            if dup_photo.scalars().first():
-                                # Дубликат, пропускаем всё сообщение
-                                continue
-
-                            ts_str = msg_data["timestamp"].strftime("%Y-%m") if msg_data["timestamp"] else "unknown"
-                            dest_dir = Path(settings.QNAP_MOUNT_PATH) / "photos" / str(group.id) / ts_str
-                            dest_dir.mkdir(parents=True, exist_ok=True)
-                            dest_file = dest_dir / f"{msg_data['message_id']}_{uuid.uuid4().hex[:8]}.jpg"
-                            
-                            shutil.copy2(src_photo, str(dest_file))
-                            photo_qnap_path = str(dest_file)
-                            stats["photos"] += 1
-
-                    msg = Message(
-                        id=uuid.uuid4(),
-                        group_id=group.id,
-                        telegram_message_id=tg_msg_id,
-                        sender_name=msg_data["sender_name"],
-                        text=msg_data["text"],
-                        has_photo=has_photo,
-                        photo_path=photo_qnap_path,
-                        photo_hash=photo_hash,
-                        timestamp=msg_data["timestamp"],
-                        imported_from_backup=True,
-                        photo_processed_at=None,
-                    )
-                    db.add(msg)
-                    if tg_msg_id:
-                        existing_msg_ids.add(tg_msg_id)
-                    stats["messages"] += 1
-
-                    # Ставим задачи в очередь только после commit, иначе воркер может
-                    # успеть прочитать БД до появления Message и вернуть Message not found.
-                    if photo_qnap_path:
-                        queued_tasks.append((
-                            str(msg.id),
-                            photo_qnap_path,
-                            str(group.id),
-                            msg_data["timestamp"].isoformat() if msg_data["timestamp"] else "",
-                        ))
-                        
-                await db.commit()
-                for task_args in queued_tasks:
-                    process_photo.delay(*task_args)
-                stats["faces_queued"] += len(queued_tasks)
-                print(f"   Файл {html_file} успешно обработан!")
-
+        print(f"⏯️  Продолжаем импорт: готово файлов сообщений {len(checkpoint.state['completed'])}, состояние {checkpoint.path}")
+    elif resume:
+        print(f"⚠️  Файл состояния {checkpoint.path} не найден — начинаем сначала")
+    elif os.path.exists(checkpoint.path):
+        print(f"⚠️  Найден файл состояния {checkpoint.path}; без --resume импорт начнётся сначала")
+
+    # 2. Архив читается напрямую: JSON/HTML разбирается потоково, фото копируются только по ссылкам
+    print(f"🔍 Потоков копирования фото: {workers}, сообщений в пачке: {batch_size}")
+    try:
+        stats = await run_import(
+            zip_path, group.id, checkpoint, workers=workers, batch_size=batch_size, on_progress=_print_progress
+        )
         print("\n==================================")
         print("🎉 ИМПОРТ УСПЕШНО ЗАВЕРШЕН!")
         print(f"✉️  Сообщений добавлено: {stats['messages']}")
         print(f"📸 Фотографий скопировано на QNAP: {stats['photos']}")
+        print(f"♻️  Пропущено дублей фото: {stats['duplicates']}")
         print(f"🤖 Отправлено задач в Celery на распознавание: {stats['faces_queued']}")
         print("==================================\n")
-        
+
+    except ImportArchiveError as e:
+        print(f"❌ {e}")
     except Exception as e:
         print(f"\n❌ ПРОИЗОШЛА КРИТИЧЕСКАЯ ОШИБКА: {e}")
         traceback.print_exc()
-    finally:
-        print(f"🧹 Очистка временных файлов ({zip_dir}). Пожалуйста, подождите...")
-        shutil.rmtree(zip_dir, ignore_errors=True)
+        print(f"💾 Прогресс сохранён в {checkpoint.path}; продолжить: --resume")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Локальный скрипт для импорта ОГРОМНЫХ ZIP-архивов Telegram Desktop (создан специально для больших файлов, например >40GB).")
     parser.add_argument("zip_path", help="Абсолютный путь к ZIP архиву, например, /mnt/qnap_photos/backup/my_export.zip")
     parser.add_argument("--group", required=True, help="Название группы в которую нужно импортировать данные (или к которой нужно добавить данные)")
-    
+    parser.add_argument("--workers", type=int, default=8, help="Потоков копирования и хеширования фото")
+    parser.add_argument("--batch", type=int, default=500, help="Сообщений в одной транзакции БД")
+    parser.add_argument("--resume", action="store_true", help="Продолжить прерванный импорт по файлу состояния")
+    parser.add_argument("--state", help="Путь к файлу состояния (по умолчанию <zip>.import-state.json)")
+
     args = parser.parse_args()
-    
-    asyncio.run(import_backup_local(args.zip_path, args.group))
+
+    asyncio.run(import_backup_local(
+        args.zip_path, args.group,
+        workers=args.workers, batch_size=args.batch, resume=args.resume, state_path=args.state,
+    ))
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Перестраивает коллекцию 'faces' в новый профиль (int8 / int8_disk / binary / default)
+без остановки поиска: данные копируются в новую коллекцию, а 'faces' становится
+алиасом на неё.
+
+Порядок:
+    1. создаётся faces_<profile>_<YYYYmmddHHMM> с параметрами профиля и payload-индексами;
+    2. включается учёт изменений: писатели (воркеры, vector_flusher.py, sync_point_groups,
+       delete_duplicate_photos.py) после каждой записи кладут id точек в qdrant:changed_points;
+    3. все точки копируются scroll → upsert (id и payload сохраняются);
+    4. без остановки записи докопируется дельта: точки из qdrant:changed_points перечитываются
+       из источника (изменённый payload — group_ids после sync_point_groups) или удаляются
+       из новой коллекции, если в источнике их уже нет; повторяется, пока дельта не станет
+       меньше пачки;
+    5. запись в Qdrant ставится на паузу (флаг qdrant:writes_paused — его ждут те же писатели,
+       а ensure_collection_exists не создаёт пустую faces); после паузы на завершение
+       текущих записей докопируется только остаток дельты — пауза не зависит от размера коллекции;
+    6. переключение: если 'faces' уже алиас — атомарная замена алиаса;
+       если 'faces' — физическая коллекция, она удаляется и сразу создаётся алиас
+       (поиск недоступен только между этими двумя запросами);
+    7. пауза и учёт изменений снимаются. Если скрипт упал, флаги истекут сами через --pause-ttl секунд.
+
+Параметры поиска (rescoring/oversampling) сервис берёт из конфигурации коллекции за алиасом,
+поэтому QDRANT_COLLECTION_PROFILE влияет только на создание коллекции в новых установках.
+
+Примеры:
+    python3 migrate_qdrant_collection.py --profile int8
+    python3 migrate_qdrant_collection.py --profile int8 --no-switch
+    python3 migrate_qdrant_collection.py --profile binary --drop-old
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from qdrant_client.models import (
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+    PointIdsList,
+    PointStruct,
+)
+
+from app.services.qdrant_service import (
+    COLLECTION_NAME,
+    COLLECTION_PROFILES,
+    build_collection_config,
+    create_payload_indexes,
+    get_qdrant_client,
+    pause_writes,
+    pop_changes,
+    resolve_alias,
+    resume_writes,
+    start_tracking_changes,
+    stop_tracking_changes,
+)
+
+# Сколько ждать после постановки паузы: запросы, начатые до неё (upsert wait=False), успевают примениться
+PAUSE_GRACE_SECONDS = 5
+
+
+def _to_points(records) -> list[PointStruct]:
+    return [PointStruct(id=r.id, vector=r.vector, payload=r.payload) for r in records]
+
+
+def copy_points(client, source: str, target: str, batch: int, keepalive) -> int:
+    """Копирует все точки source → target. keepalive() вызывается после каждой пачки."""
+    copied = 0
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=source,
+            limit=batch,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if not records:
+            break
+        client.upsert(collection_name=target, points=_to_points(records), wait=False)
+        keepalive()
+        copied += len(records)
+        if copied % (batch * 20) < len(records):
+            print(f"   скопировано {copied} точек...")
+        if offset is None:
+            break
+    return copied
+
+
+def sync_ids(client, source: str, target: str, ids: list[str]) -> set[str]:
+    """Переносит точки ids из source в target как есть; отсутствующие в source удаляет из target."""
+    records = client.retrieve(collection_name=source, ids=ids, with_payload=True, with_vectors=True)
+    if records:
+        client.upsert(collection_name=target, points=_to_points(records), wait=True)
+    absent = set(ids) - {str(r.id) for r in records}
+    if absent:
+        client.delete(collection_name=target, points_selector=PointIdsList(points=list(absent)), wait=True)
+    return absent
+
+
+def sync_changes(client, source: str, target: str, batch: int, keepalive, recheck: set[str]) -> int:
+    """
+    Докопирует дельту из qdrant:changed_points, пока она не опустеет. Возвращает число точек.
+    Отсутствующие в источнике id попадают в recheck: upsert с wait=False мог ещё не примениться,
+    окончательно они проверяются под паузой.
+    """
+    synced = 0
+    while True:
+        ids = pop_changes(batch)
+        if not ids:
+            return synced
+        recheck.update(sync_ids(client, source, target, ids))
+        keepalive()
+        synced += len(ids)
+
+
+def switch_alias(client, aliased_to: str | None, target: str):
+    """Направляет 'faces' на target: замена алиаса атомарна, физическая коллекция удаляется."""
+    if aliased_to:
+        client.update_collection_aliases(change_aliases_operations=[
+            DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=COLLECTION_NAME)),
+            CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=COLLECTION_NAME)),
+        ])
+        print(f"🔀 Алиас '{COLLECTION_NAME}' атомарно переключён: {aliased_to} → {target}")
+        return
+
+    client.delete_collection(COLLECTION_NAME)
+    client.update_collection_aliases(change_aliases_operations=[
+        CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=COLLECTION_NAME)),
+    ])
+    print(f"🔀 '{COLLECTION_NAME}' теперь алиас на {target}")
+
+
+def main(profile: str, batch: int, switch: bool, drop_old: bool, pause_ttl: int):
+    client = get_qdrant_client()
+
+    aliased_to = resolve_alias(client)
+    existing = [c.name for c in client.get_collections().collections]
+    if aliased_to:
+        source = aliased_to
+    elif COLLECTION_NAME in existing:
+        source = COLLECTION_NAME
+    else:
+        print(f"Коллекция '{COLLECTION_NAME}' не найдена! Запустите приложение сначала.")
+        sys.exit(1)
+
+    target = f"{COLLECTION_NAME}_{profile}_{datetime.utcnow().strftime('%Y%m%d%H%M')}"
+    source_info = client.get_collection(source)
+    print(f"Источник: '{source}' ({source_info.points_count} точек) → '{target}' (профиль {profile})")
+
+    client.create_collection(collection_name=target, **build_collection_config(profile))
+    create_payload_indexes(client, target)
+
+    def keepalive():
+        start_tracking_changes(pause_ttl)
+
+    keepalive()
+    recheck = set()
+    try:
+        # Записи, начатые до включения учёта, должны успеть попасть в источник до scroll
+        time.sleep(PAUSE_GRACE_SECONDS)
+        print("⏳ Копирование точек...")
+        copied = copy_points(client, source, target, batch, keepalive)
+        print(f"✅ Скопировано {copied} точек")
+
+        print("⏳ Дельта (точки, изменённые и удалённые за время копирования)...")
+        while True:
+            synced = sync_changes(client, source, target, batch, keepalive, recheck)
+            print(f"   докопировано {synced} точек")
+            if synced < batch:
+                break
+
+        if not switch:
+            print(f"Переключение пропущено (--no-switch). Новая коллекция: {target}")
+            return
+
+        print(f"⏸  Пауза записи в Qdrant (ждём {PAUSE_GRACE_SECONDS} с завершения текущих записей)...")
+        pause_writes(pause_ttl)
+        started = time.monotonic()
+        try:
+            time.sleep(PAUSE_GRACE_SECONDS)
+
+            def paused_keepalive():
+                keepalive()
+                pause_writes(pause_ttl)
+
+            synced = sync_changes(client, source, target, batch, paused_keepalive, recheck)
+            absent = sorted(recheck)
+            for start in range(0, len(absent), batch):
+                sync_ids(client, source, target, absent[start:start + batch])
+            print(f"✅ Остаток дельты: {synced} точек, перепроверено отсутствующих: {len(recheck)}")
+            switch_alias(client, aliased_to, target)
+        finally:
+            resume_writes()
+            print(f"▶️  Запись возобновлена (пауза {time.monotonic() - started:.1f} с)")
+    finally:
+        stop_tracking_changes()
+
+    if aliased_to and drop_old:
+        client.delete_collection(source)
+        print(f"🗑 Старая коллекция '{source}' удалена")
+
+    info = client.get_collection(target)
+    print(f"\nГотово! '{target}': {info.points_count} точек, статус {info.status}")
+    print("Не забудьте выставить QDRANT_COLLECTION_PROFILE для новых установок.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Перестройка коллекции Qdrant 'faces' в новый профиль")
+    parser.add_argument("--profile", required=True, choices=sorted(COLLECTION_PROFILES), help="Целевой профиль коллекции")
+    parser.add_argument("--batch", type=int, default=1000, help="Размер пачки scroll/upsert")
+    parser.add_argument("--no-switch", action="store_true", help="Только скопировать, не переключать 'faces'")
+    parser.add_argument("--drop-old", action="store_true", help="Удалить старую коллекцию после переключения алиаса")
+    parser.add_argument("--pause-ttl", type=int, default=300, help="TTL флагов паузы и учёта изменений (продлеваются, пока идёт копирование)")
+    args = parser.parse_args()
+    main(args.profile, args.batch, switch=not args.no_switch, drop_old=args.drop_old, pause_ttl=args.pause_ttl)
@@ -0,0 +1,119 @@
+"""
+Relay transactional outbox (TASK_OUTBOX_ENABLED=true): публикует задачи из task_outbox в Celery.
+
+Строки забираются пачками через SELECT ... FOR UPDATE SKIP LOCKED, поэтому можно
+запускать несколько relay. sent_at проставляется в той же транзакции после публикации;
+при падении между публикацией и commit задача уйдёт повторно — process_photo
+пропускает уже обработанные сообщения.
+
+Примеры:
+    python outbox_relay.py
+    python outbox_relay.py --once
+    python outbox_relay.py --batch 1000 --cleanup-days 3
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, delete, select, update
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.models.models import TaskOutbox
+from app.services.outbox import FACE_VECTORS, PROCESS_PHOTO
+from app.services.vector_queue import enqueue_face_vectors
+from app.worker.celery_app import celery_app
+from app.worker.tasks import enqueue_photo_tasks
+
+logger = logging.getLogger("outbox_relay")
+
+
+def _make_session_factory():
+    sync_db_url = settings.DATABASE_URL.replace("mysql+aiomysql", "mysql+pymysql")
+    engine = create_engine(sync_db_url, pool_pre_ping=True, pool_size=2, max_overflow=0)
+    return sessionmaker(bind=engine)
+
+
+def relay_once(SessionLocal, batch_size: int) -> int:
+    with SessionLocal() as session:
+        rows = session.execute(
+            select(TaskOutbox.id, TaskOutbox.task_name, TaskOutbox.args)
+            .where(TaskOutbox.sent_at.is_(None))
+            .order_by(TaskOutbox.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not rows:
+            session.rollback()
+            return 0
+
+        # Фото публикуются через enqueue_photo_tasks — с учётом PHOTO_BATCH_SIZE
+        photo_args = [tuple(args) for _, task_name, args in rows if task_name == PROCESS_PHOTO]
+        enqueue_photo_tasks(photo_args)
+        # Векторы лиц write-behind — прямо в Redis stream (повтор безопасен: point id = face_id)
+        enqueue_face_vectors([tuple(item) for _, task_name, args in rows if task_name == FACE_VECTORS for item in args])
+        for _, task_name, args in rows:
+            if task_name not in (PROCESS_PHOTO, FACE_VECTORS):
+                celery_app.send_task(task_name, args=args)
+
+        session.execute(
+            update(TaskOutbox)
+            .where(TaskOutbox.id.in_([row_id for row_id, _, _ in rows]))
+            .values(sent_at=datetime.now())
+        )
+        session.commit()
+        return len(rows)
+
+
+def cleanup(SessionLocal, days: int) -> int:
+    """Удаляет отправленные строки старше days дней."""
+    with SessionLocal() as session:
+        result = session.execute(
+            delete(TaskOutbox).where(TaskOutbox.sent_at < datetime.now() - timedelta(days=days))
+        )
+        session.commit()
+        return result.rowcount or 0
+
+
+def main(batch_size: int, once: bool, interval: float, cleanup_days: int):
+    SessionLocal = _make_session_factory()
+    logger.info("Outbox relay запущен (пачка %d)", batch_size)
+    last_cleanup = 0.0
+    while True:
+        try:
+            relayed = relay_once(SessionLocal, batch_size)
+            if relayed:
+                logger.info("Опубликовано задач: %d", relayed)
+            elif once:
+                return
+
+            if time.monotonic() - last_cleanup > 3600:
+                removed = cleanup(SessionLocal, cleanup_days)
+                if removed:
+                    logger.info("Удалено отправленных строк outbox: %d", removed)
+                last_cleanup = time.monotonic()
+
+            # Полная пачка — сразу за следующей, иначе ждём новые строки
+            if relayed < batch_size:
+                time.sleep(interval)
+        except Exception as e:
+            logger.error("Ошибка relay: %s", e, exc_info=True)
+            if once:
+                raise
+            time.sleep(5)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Публикация задач из task_outbox в Celery")
+    parser.add_argument("--batch", type=int, default=settings.OUTBOX_RELAY_BATCH, help="Строк outbox за одну транзакцию")
+    parser.add_argument("--interval", type=float, default=0.5, help="Пауза при пустом outbox, секунд")
+    parser.add_argument("--cleanup-days", type=int, default=7, help="Хранить отправленные строки N дней")
+    parser.add_argument("--once", action="store_true", help="Опубликовать накопленное и завершиться")
+    args = parser.parse_args()
+    main(args.batch, args.once, args.interval, args.cleanup_days)
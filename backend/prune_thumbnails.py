@@ -0,0 +1,109 @@
+"""
+Очистка локального кэша превью (THUMB_CACHE_DIR).
+
+Превью создаются лениво и сами не удаляются; mtime файла — время последнего запроса
+(app.services.thumbnails обновляет его не чаще раза в сутки). Скрипт удаляет:
+    1. превью, не запрошенные дольше --keep-days (THUMB_CACHE_KEEP_DAYS);
+    2. если кэш всё ещё больше --max-gb (THUMB_CACHE_MAX_BYTES) — самые давно запрошенные,
+       пока объём не уложится в лимит;
+    3. брошенные временные файлы *.part.
+Удалённое превью просто создастся заново при следующем запросе.
+Запускать по расписанию (cron раз в сутки) на хосте backend.
+
+Примеры:
+    python prune_thumbnails.py --dry-run
+    python prune_thumbnails.py --keep-days 14 --max-gb 20
+"""
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import settings
+
+# Временные файлы _store старше часа — от упавших процессов
+PART_MAX_AGE = 3600
+# Гранулярность подсчёта объёма по давности: память не зависит от числа файлов
+BUCKET_SECONDS = 3600
+
+
+def _cache_files(root: Path):
+    """(путь, mtime, размер) всех файлов кэша: root/ab/<key>.<fmt>."""
+    for shard in os.scandir(root):
+        if not shard.is_dir():
+            continue
+        for entry in os.scandir(shard.path):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            yield entry.path, stat.st_mtime, stat.st_size
+
+
+def _remove(path: str, dry_run: bool) -> bool:
+    if dry_run:
+        return True
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def prune(keep_days: float, max_bytes: int, dry_run: bool):
+    root = Path(settings.THUMB_CACHE_DIR)
+    if not root.is_dir():
+        print(f"⚠️  {root} не найден — кэша превью нет")
+        return
+
+    now = time.time()
+    expire_before = now - keep_days * 86400
+    removed = freed = 0
+    kept_bytes = 0
+    buckets = defaultdict(int)
+
+    print(f"🔍 Проход 1: превью старше {keep_days:g} дн. и временные файлы...")
+    def expired(path: str, mtime: float) -> bool:
+        return mtime < expire_before or (path.endswith(".part") and mtime < now - PART_MAX_AGE)
+
+    for path, mtime, size in _cache_files(root):
+        if expired(path, mtime) and _remove(path, dry_run):
+            removed += 1
+            freed += size
+        else:
+            kept_bytes += size
+            buckets[int(mtime // BUCKET_SECONDS)] += size
+    print(f"   Удалено {removed} файлов, {freed / (1024 * 1024):.1f} MB; осталось {kept_bytes / (1024 ** 3):.2f} GB")
+
+    if kept_bytes > max_bytes:
+        # Граница по давности: всё старше неё удаляется, остаток укладывается в лимит
+        cutoff_bucket = None
+        for bucket in sorted(buckets):
+            if kept_bytes <= max_bytes:
+                break
+            kept_bytes -= buckets[bucket]
+            cutoff_bucket = bucket
+        cutoff = (cutoff_bucket + 1) * BUCKET_SECONDS
+        print(f"🔍 Проход 2: кэш больше {max_bytes / (1024 ** 3):.1f} GB, удаляем запрошенные раньше {time.ctime(cutoff)}...")
+        for path, mtime, size in _cache_files(root):
+            # expired() уже посчитаны в проходе 1 (при --dry-run они ещё на месте)
+            if mtime < cutoff and not expired(path, mtime) and _remove(path, dry_run):
+                removed += 1
+                freed += size
+
+    verb = "Будет освобождено" if dry_run else "Освобождено"
+    print(f"🎉 {verb}: {freed / (1024 * 1024):.1f} MB ({removed} файлов)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Очистка кэша превью галерей")
+    parser.add_argument("--keep-days", type=float, default=settings.THUMB_CACHE_KEEP_DAYS, help="Удалять превью, не запрошенные дольше")
+    parser.add_argument("--max-gb", type=float, default=settings.THUMB_CACHE_MAX_BYTES / (1024 ** 3), help="Предельный объём кэша")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет удалено")
+    args = parser.parse_args()
+
+    prune(args.keep_days, int(args.max_gb * 1024 ** 3), args.dry_run)
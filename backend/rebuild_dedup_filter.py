@@ -0,0 +1,65 @@
+"""
+Пересобирает Bloom-фильтр дубликатов в Redis (DEDUP_FILTER_ENABLED=true) из таблицы messages.
+
+Пока идёт пересборка, флаг готовности снят — приём проверяет дубликаты в БД,
+новые сообщения при этом продолжают попадать в фильтр.
+
+Примеры:
+    python rebuild_dedup_filter.py
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.models import Message
+from app.services import dedup_filter
+
+
+async def main(batch: int):
+    if not dedup_filter.is_enabled():
+        print("⚠️  DEDUP_FILTER_ENABLED=false — приём не пишет в фильтр, пересборка бессмысленна")
+        return
+
+    print(f"🧹 Сброс фильтра ({settings.DEDUP_BLOOM_BITS} бит, k={settings.DEDUP_BLOOM_HASHES})...")
+    await dedup_filter.reset()
+
+    async with AsyncSessionLocal() as db:
+        total = (await db.execute(select(func.count(Message.id)))).scalar() or 0
+        print(f"📊 Сообщений: {total}")
+
+        done = 0
+        last_id = None
+        while True:
+            stmt = (
+                select(Message.id, Message.group_id, Message.telegram_message_id,
+                       Message.external_message_id, Message.photo_hash)
+                .order_by(Message.id)
+                .limit(batch)
+            )
+            if last_id is not None:
+                stmt = stmt.where(Message.id > last_id)
+            rows = (await db.execute(stmt)).all()
+            if not rows:
+                break
+
+            await dedup_filter.fill([key for row in rows for key in dedup_filter.keys_for_message(row)])
+            done += len(rows)
+            last_id = rows[-1].id
+            print(f"   Добавлено {done}/{total}")
+
+    await dedup_filter.mark_ready()
+    print("🎉 Фильтр готов, приём больше не проверяет в БД отсутствующие ключи")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", type=int, default=5000, help="Сообщений за один проход")
+    args = parser.parse_args()
+    asyncio.run(main(batch=args.batch))
@@ -0,0 +1,75 @@
+"""
+Пересобирает локальный индекс FTS5 (TEXT_SEARCH_BACKEND=fts5) из таблицы messages.
+Без --reset дописывает/перезаписывает сообщения — удобно для догонки после импорта.
+
+Примеры:
+    python rebuild_text_index.py --reset
+    python rebuild_text_index.py --since 2025-01-01
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import func, or_, select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.models import Message
+from app.services import text_index
+
+
+BATCH = 5000
+
+
+async def main(reset: bool, since: datetime | None):
+    print(f"📂 Индекс: {settings.TEXT_INDEX_PATH}")
+    if reset:
+        print("🧹 Очистка индекса...")
+        await asyncio.to_thread(text_index.clear)
+
+    has_text = or_(Message.text.isnot(None), Message.document_text.isnot(None))
+    base = select(Message.id, Message.group_id, Message.timestamp, Message.text, Message.document_text).where(has_text)
+    if since:
+        base = base.where(Message.timestamp >= since)
+
+    async with AsyncSessionLocal() as db:
+        total = (
+            await db.execute(select(func.count()).select_from(base.subquery()))
+        ).scalar() or 0
+        print(f"📊 Сообщений с текстом: {total}")
+
+        done = 0
+        last_id = None
+        while True:
+            # Keyset по id: OFFSET на миллионах строк деградирует
+            stmt = base.order_by(Message.id).limit(BATCH)
+            if last_id is not None:
+                stmt = stmt.where(Message.id > last_id)
+            rows = (await db.execute(stmt)).all()
+            if not rows:
+                break
+
+            await asyncio.to_thread(text_index.index_messages, [
+                {"id": r.id, "group_id": r.group_id, "timestamp": r.timestamp, "text": r.text, "document_text": r.document_text}
+                for r in rows
+            ])
+            done += len(rows)
+            last_id = rows[-1].id
+            print(f"   Проиндексировано {done}/{total}")
+
+    print("🔧 Оптимизация сегментов FTS5...")
+    await asyncio.to_thread(text_index.optimize)
+    print("🎉 Готово")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reset", action="store_true", help="Очистить индекс перед пересборкой")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None,
+                        help="Индексировать только сообщения начиная с даты (ISO)")
+    args = parser.parse_args()
+    asyncio.run(main(reset=args.reset, since=args.since))
@@ -0,0 +1,56 @@
+import asyncio
+import uuid
+
+from sqlalchemy.dialects import mysql
+
+from app.models.models import Message
+from app.services import bulk_writer
+
+
+class _Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return self.rows
+
+
+class FakeSession:
+    """Записывает SQL и параметры; на SELECT id отдаёт inserted — «реально вставленные»."""
+
+    def __init__(self, inserted):
+        self.inserted = inserted
+        self.calls = []
+
+    async def execute(self, stmt, params=None):
+        self.calls.append((str(stmt.compile(dialect=mysql.dialect())), params))
+        return _Result(self.inserted)
+
+
+def _message(**fields) -> Message:
+    return Message(id=uuid.uuid4(), group_id=uuid.uuid4(), **fields)
+
+
+def test_message_rows_apply_python_defaults():
+    msg = _message(text="тест", source_type="import")
+    row = bulk_writer.message_rows([msg])[0]
+    assert "created_at" not in row
+    assert row["source_platform"] == "telegram"
+    assert row["has_photo"] is False
+    assert row["source_type"] == "import"
+    assert msg.source_platform == "telegram"
+
+
+def test_insert_skips_only_duplicate_keys():
+    new, duplicate = _message(text="тел 0501234567"), _message(text="тел 0679876543")
+    db = FakeSession([new.id])
+    inserted = asyncio.run(bulk_writer.insert_messages(db, [new, duplicate]))
+    assert inserted == {new.id}
+
+    insert_sql, rows = db.calls[0]
+    assert insert_sql.startswith("INSERT INTO messages")
+    assert insert_sql.endswith("ON DUPLICATE KEY UPDATE id = messages.id")
+    assert [row["id"] for row in rows] == [new.id, duplicate.id]
+
+    phone_rows = next(params for sql, params in db.calls if sql.startswith("INSERT INTO message_phones"))
+    assert {row["message_id"] for row in phone_rows} == {new.id}
@@ -0,0 +1,38 @@
+import uuid
+from types import SimpleNamespace
+
+from app.core.config import settings
+from app.services import dedup_filter
+
+GROUP_ID = uuid.UUID("00000000-0000-0000-0000-000000000001")
+
+
+def _message(**fields):
+    data = {"group_id": GROUP_ID, "telegram_message_id": None, "external_message_id": None, "photo_hash": None}
+    data.update(fields)
+    return SimpleNamespace(**data)
+
+
+def test_keys_for_message():
+    msg = _message(telegram_message_id=0, external_message_id="wa-1", photo_hash="ab" * 32)
+    assert dedup_filter.keys_for_message(msg) == [
+        f"tg:{GROUP_ID}:0",
+        f"ext:{GROUP_ID}:wa-1",
+        f"photo:{GROUP_ID}:{'ab' * 32}",
+    ]
+
+
+def test_message_without_ids_or_photo_has_no_keys():
+    assert dedup_filter.keys_for_message(_message(external_message_id="")) == []
+
+
+def test_photo_key_is_per_group():
+    other = uuid.uuid4()
+    assert dedup_filter.photo_key(GROUP_ID, "ff") != dedup_filter.photo_key(other, "ff")
+
+
+def test_bit_positions_skip_ready_bit():
+    positions = dedup_filter.bit_positions(f"tg:{GROUP_ID}:42")
+    assert positions == dedup_filter.bit_positions(f"tg:{GROUP_ID}:42")
+    assert len(positions) == settings.DEDUP_BLOOM_HASHES
+    assert all(dedup_filter.READY_BIT < pos < settings.DEDUP_BLOOM_BITS for pos in positions)
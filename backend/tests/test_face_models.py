@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+
+from app.services.face_models import FaceModelRegistry  # noqa: E402
+
+
+class FakeDetector:
+    """Детекции по масштабу; nms оставляет первую из пересекающихся (как у RetinaFace — по score)."""
+
+    input_size = None
+
+    def __init__(self, by_scale):
+        self.by_scale = by_scale
+
+    def detect(self, img, input_size, max_num, metric):
+        return self.by_scale[input_size[0]]
+
+    def nms(self, dets):
+        order = np.argsort(-dets[:, 4])
+        keep = []
+        for i in order:
+            if all(np.abs(dets[i, :4] - dets[j, :4]).max() > 10 for j in keep):
+                keep.append(i)
+        return keep
+
+
+def _registry(by_scale) -> FaceModelRegistry:
+    registry = FaceModelRegistry(intra_threads=1)
+    registry._models = {"detection": FakeDetector(by_scale)}
+    registry.load = lambda: None
+    return registry
+
+
+def _dets(*rows):
+    dets = np.array(rows, dtype=np.float32).reshape(-1, 5)
+    return dets, np.zeros((len(dets), 5, 2), dtype=np.float32)
+
+
+def test_multiscale_merges_overlapping_detections():
+    registry = _registry({
+        640: _dets([10, 10, 60, 60, 0.7]),
+        1024: _dets([12, 11, 61, 59, 0.9], [200, 200, 240, 240, 0.6]),
+    })
+    dets, kpss = registry.detect_multiscale(None, [640, 1024])
+    assert dets[:, 4].tolist() == pytest.approx([0.9, 0.6])
+    assert kpss.shape == (2, 5, 2)
+
+
+def test_multiscale_without_faces():
+    registry = _registry({640: _dets(), 1024: _dets()})
+    assert registry.detect_multiscale(None, [640, 1024]) == (None, None)
@@ -0,0 +1,31 @@
+import pytest
+
+from app.api.endpoints.files import _parse_range
+
+SIZE = 1000
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=900-5000", (900, 999)),
+    (" bytes=0-0 ", (0, 0)),
+    ("bytes=999-999", (999, 999)),
+])
+def test_valid_ranges(header, expected):
+    assert _parse_range(header, SIZE) == expected
+
+
+@pytest.mark.parametrize("header", [
+    "bytes=1000-",
+    "bytes=500-100",
+    "bytes=-0",
+    "bytes=-",
+    "bytes=0-99,200-299",
+    "items=0-99",
+    "bytes=a-b",
+])
+def test_unsatisfiable_or_unsupported_ranges(header):
+    assert _parse_range(header, SIZE) is None
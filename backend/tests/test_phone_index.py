@@ -0,0 +1,39 @@
+from sqlalchemy.dialects import mysql
+
+from app.services.phone_index import MIN_SUFFIX, phone_filter, phone_suffixes, suffix_rows, suffix_insert_stmt
+
+
+def test_suffixes_cover_every_substring_as_prefix():
+    phone = "380501234567"
+    suffixes = phone_suffixes(phone)
+    assert suffixes[0] == phone
+    assert suffixes[-1] == "567"
+    assert all(len(suffix) >= MIN_SUFFIX for suffix in suffixes)
+    substrings = {phone[i:j] for i in range(len(phone)) for j in range(i + MIN_SUFFIX, len(phone) + 1)}
+    assert all(any(suffix.startswith(sub) for suffix in suffixes) for sub in substrings)
+
+
+def test_short_phone_has_no_suffixes():
+    assert phone_suffixes("12") == []
+
+
+def test_suffix_rows_deduplicate_phones():
+    rows = suffix_rows(["12345", "12345"])
+    assert sorted(row["suffix"] for row in rows) == ["12345", "2345", "345"]
+    assert {row["phone"] for row in rows} == {"12345"}
+
+
+def test_suffix_insert_ignores_duplicates():
+    assert str(suffix_insert_stmt().compile(dialect=mysql.dialect())).startswith("INSERT IGNORE INTO phone_suffixes")
+
+
+def _sql(clause) -> str:
+    return str(clause.compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def test_partial_number_searches_suffix_range():
+    assert "phone_suffixes.suffix LIKE '6762%%'" in _sql(phone_filter("6762"))
+
+
+def test_full_number_is_exact_match():
+    assert _sql(phone_filter("380501234567", "380501234567")) == "message_phones.phone = '380501234567'"
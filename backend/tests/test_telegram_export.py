@@ -0,0 +1,91 @@
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+from app.services.telegram_export import parse_messages_stream, parse_result_json
+
+HTML = """
+<div class="history">
+ <div class="message service" id="message1"><div class="body details">Группа создана</div></div>
+ <div class="message default clearfix" id="message2">
+  <div class="body">
+   <div class="pull_right date details" title="05.03.2024 14:07:09 UTC+02:00">14:07</div>
+   <div class="from_name"> Іван &amp; Ко </div>
+   <div class="media_wrap clearfix">
+    <a class="photo_wrap clearfix pull_left" href="photos/photo_1.jpg"><img src="photos/photo_1_thumb.jpg"></a>
+   </div>
+   <div class="text"> Зник <b>хлопець</b>, 12 років </div>
+  </div>
+ </div>
+ <div class="message default clearfix joined" id="message3">
+  <div class="body">
+   <div class="pull_right date details" title="05.03.2024 14:08:00 UTC+02:00">14:08</div>
+   <div class="text">Друге</div>
+   <div class="text">не береться</div>
+  </div>
+ </div>
+</div>
+"""
+
+
+@pytest.mark.parametrize("chunk_size", [7, 64 * 1024])
+def test_html_messages_parse_the_same_for_any_chunk_size(chunk_size):
+    messages = list(parse_messages_stream(io.StringIO(HTML), chunk_size=chunk_size))
+    assert messages == [
+        {
+            "message_id": "2",
+            "sender_name": "Іван & Ко",
+            "sender_id": None,
+            "timestamp": datetime(2024, 3, 5, 14, 7, 9),
+            "text": "Зникхлопець, 12 років",
+            "photo_rel_path": "photos/photo_1.jpg",
+        },
+        {
+            "message_id": "3",
+            "sender_name": "Іван & Ко",
+            "sender_id": None,
+            "timestamp": datetime(2024, 3, 5, 14, 8),
+            "text": "Друге",
+            "photo_rel_path": None,
+        },
+    ]
+
+
+def _result_json(messages) -> io.BytesIO:
+    return io.BytesIO(json.dumps({"name": "Група", "messages": messages}, ensure_ascii=False).encode())
+
+
+def test_result_json_messages():
+    stream = _result_json([
+        {"id": 1, "type": "service", "action": "create_group"},
+        {
+            "id": 10,
+            "type": "message",
+            "date": "2024-03-05T14:07:09",
+            "from": "Іван",
+            "from_id": "user12345",
+            "photo": "photos/photo_1.jpg",
+            "text": ["Тел ", {"type": "phone", "text": "+380501234567"}, " "],
+        },
+        {"id": 11, "type": "message", "date": "bad", "from": "Канал", "from_id": "channel777", "text": ""},
+    ])
+    assert list(parse_result_json(stream)) == [
+        {
+            "message_id": "10",
+            "sender_name": "Іван",
+            "sender_id": 12345,
+            "timestamp": datetime(2024, 3, 5, 14, 7, 9),
+            "text": "Тел +380501234567",
+            "photo_rel_path": "photos/photo_1.jpg",
+        },
+        {
+            "message_id": "11",
+            "sender_name": "Канал",
+            "sender_id": None,
+            "timestamp": None,
+            "text": None,
+            "photo_rel_path": None,
+        },
+    ]
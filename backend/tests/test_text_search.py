@@ -0,0 +1,81 @@
+import asyncio
+import uuid
+
+import pymysql
+import pytest
+from sqlalchemy.dialects import mysql
+from sqlalchemy.exc import OperationalError
+
+from app.services import text_search
+
+
+class _Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalar(self):
+        return len(self.rows)
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    """Записывает SQL (диалект MySQL) и отдаёт ids; error — для запросов с MATCH."""
+
+    def __init__(self, rows, error=None):
+        self.rows = rows
+        self.error = error
+        self.sql = []
+
+    async def execute(self, stmt, params=None):
+        sql = str(stmt.compile(dialect=mysql.dialect()))
+        self.sql.append(sql)
+        if self.error is not None and "MATCH" in sql:
+            raise self.error
+        return _Result(self.rows)
+
+
+def _search(db, q="іван", sort="relevance"):
+    return asyncio.run(text_search._search_mariadb(db, q, False, 0, 20, sort))
+
+
+def _missing_index_error():
+    return OperationalError("SELECT", {}, pymysql.err.OperationalError(1191, "Can't find FULLTEXT index"))
+
+
+def test_relevance_orders_by_match_score():
+    ids = [uuid.uuid4(), uuid.uuid4()]
+    db = FakeSession(ids)
+    assert _search(db) == ([str(i) for i in ids], 2)
+    page_sql = db.sql[-1]
+    assert "WHERE MATCH (messages.text) AGAINST (%s IN BOOLEAN MODE)" in page_sql
+    assert "ORDER BY MATCH (messages.text) AGAINST (%s IN BOOLEAN MODE) DESC, messages.timestamp DESC" in page_sql
+
+
+def test_date_sort_orders_by_timestamp_only():
+    db = FakeSession([uuid.uuid4()])
+    _search(db, sort="date")
+    assert "ORDER BY messages.timestamp DESC" in db.sql[-1]
+
+
+def test_boolean_operators_only_query_returns_nothing():
+    db = FakeSession([uuid.uuid4()])
+    assert _search(db, q='+-"*') == ([], 0)
+    assert db.sql == []
+
+
+def test_missing_fulltext_index_falls_back_to_like():
+    db = FakeSession([uuid.uuid4()], error=_missing_index_error())
+    ids, total = _search(db)
+    assert total == 1
+    assert "LIKE" in db.sql[-1]
+
+
+def test_other_database_errors_are_not_swallowed():
+    error = OperationalError("SELECT", {}, pymysql.err.OperationalError(2013, "Lost connection"))
+    with pytest.raises(OperationalError):
+        _search(FakeSession([], error=error))
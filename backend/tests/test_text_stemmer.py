@@ -0,0 +1,50 @@
+import pytest
+
+from app.services.text_stemmer import stem, stem_text, tokenize
+
+# Формы одного слова → одна основа
+SAME_STEM = [
+    ("зник", "зниклий", "зникла", "зникли", "зниклого"),
+    ("розшук", "розшуку", "розшукується", "розшукуються", "розшукувала"),
+    ("пропав", "пропала", "пропавший", "пропавшая"),
+    ("стол", "стола", "столу", "столи", "столом"),
+    ("будинок", "будинку", "будинком"),
+    ("хлопець", "хлопця", "хлопцем"),
+    ("шукаю", "шукає", "шукають", "шукали", "шукати", "шукав"),
+    ("білий", "біла", "білого"),
+]
+
+
+@pytest.mark.parametrize("forms", SAME_STEM, ids=lambda forms: forms[0])
+def test_word_forms_share_stem(forms):
+    assert len({stem(form) for form in forms}) == 1, {form: stem(form) for form in forms}
+
+
+@pytest.mark.parametrize("word, expected", [
+    ("стола", "стол"),
+    ("будинок", "будинк"),
+    ("шукаю", "шук"),
+    ("Ёлка", "елк"),
+])
+def test_expected_stems(word, expected):
+    assert stem(word) == expected
+
+
+def test_short_stems_are_kept():
+    # Окончание не отрезается, если основа становится короче MIN_STEM
+    assert stem("сто") == "сто"
+    assert stem("мама") == "мам"
+
+
+def test_latin_and_digits_untouched():
+    assert stem("Telegram") == "telegram"
+    assert stem("0671234567") == "0671234567"
+
+
+def test_tokenize_keeps_apostrophe_words_whole():
+    assert tokenize("З'явився м’ясо") == [stem("зявився"), stem("мясо")]
+    assert tokenize("") == []
+
+
+def test_stem_text_joins_stems():
+    assert stem_text("Розшукується зникла дівчина") == "розшук зник дівчин"
@@ -0,0 +1,157 @@
+"""
+Флашер write-behind очереди векторов (QDRANT_WRITE_BEHIND=true).
+Забирает записи из Redis stream большими пачками, пишет в Qdrant одним upsert
+с wait=False и одним запросом проставляет faces.qdrant_point_id.
+
+Point id = face_id, поэтому повторная доставка после падения идемпотентна.
+Записи, зависшие у пропавшего consumer, забираются через XAUTOCLAIM.
+Пока Qdrant или БД недоступны, записи ждут в очереди, а флашер повторяет с растущей
+паузой (до ERROR_BACKOFF_MAX). Если Qdrant отвергает пачку (4xx), записи выгружаются
+по одной, и отвергнутые уходят в {stream}:dead; после разбора --replay-dead
+возвращает их в очередь.
+Upsert перезаписывает payload, поэтому после выгрузки group_ids переиспользованных
+по хешу точек (фото из нескольких групп) восстанавливается из БД.
+
+Примеры:
+    python vector_flusher.py
+    python vector_flusher.py --once
+    python vector_flusher.py --consumer flusher-2 --batch 2000
+    python vector_flusher.py --replay-dead
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+import uuid
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from qdrant_client.http.exceptions import UnexpectedResponse
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.models.models import Face
+from app.services import photo_faces
+from app.services.qdrant_service import ensure_collection_exists, upsert_face_vectors
+from app.services.vector_queue import (
+    ack_face_vectors,
+    queue_length,
+    read_face_vectors,
+    reject_face_vectors,
+    replay_dead_letters,
+)
+
+logger = logging.getLogger("vector_flusher")
+
+# Пауза после ошибки: 5, 10, 20... с, не больше ERROR_BACKOFF_MAX
+ERROR_BACKOFF_START = 5
+ERROR_BACKOFF_MAX = 300
+# 4xx, кроме этих, — Qdrant отверг сами точки; повтор той же записи не поможет
+RETRYABLE_STATUSES = {408, 429}
+
+
+def _make_session_factory():
+    sync_db_url = settings.DATABASE_URL.replace("mysql+aiomysql", "mysql+pymysql")
+    engine = create_engine(sync_db_url, pool_pre_ping=True, pool_size=2, max_overflow=0)
+    return sessionmaker(bind=engine)
+
+
+def _is_rejected(error: Exception) -> bool:
+    return (
+        isinstance(error, UnexpectedResponse)
+        and 400 <= error.status_code < 500
+        and error.status_code not in RETRYABLE_STATUSES
+    )
+
+
+def _upsert(client, entries: list):
+    upsert_face_vectors(
+        client,
+        [(face_id, vector, payload) for _, face_id, vector, payload in entries],
+        wait=False,
+        point_ids=[face_id for _, face_id, _, _ in entries],
+    )
+
+
+def _upsert_entries(client, entries: list) -> list:
+    """Upsert пачки; если Qdrant её отверг — по одной, отвергнутые записи — в :dead. Возвращает выгруженные."""
+    try:
+        _upsert(client, entries)
+        return entries
+    except Exception as e:
+        if not _is_rejected(e):
+            raise
+        logger.warning("Qdrant отверг пачку (%s), выгружаем по одной записи", e)
+
+    accepted = []
+    for entry in entries:
+        try:
+            _upsert(client, [entry])
+            accepted.append(entry)
+        except Exception as e:
+            if not _is_rejected(e):
+                raise
+            reject_face_vectors([entry], f"rejected by Qdrant: {e}")
+    return accepted
+
+
+def flush_once(SessionLocal, consumer: str, batch_size: int, block_ms: int) -> int:
+    """Выгружает одну пачку. Возвращает число прочитанных записей (включая отвергнутые)."""
+    read = read_face_vectors(consumer, count=batch_size, block_ms=block_ms)
+    if not read:
+        return 0
+
+    client = ensure_collection_exists()
+    entries = _upsert_entries(client, read)
+    if not entries:
+        return len(read)
+    face_ids = [face_id for _, face_id, _, _ in entries]
+
+    with SessionLocal() as session:
+        session.execute(
+            update(Face),
+            [{"id": uuid.UUID(face_id), "qdrant_point_id": uuid.UUID(face_id)} for face_id in face_ids],
+        )
+        session.commit()
+        photo_faces.sync_point_groups(session, face_ids, min_groups=2)
+
+    ack_face_vectors([entry_id for entry_id, _, _, _ in entries])
+    return len(read)
+
+
+def main(consumer: str, batch_size: int, once: bool):
+    SessionLocal = _make_session_factory()
+    logger.info("Флашер %s запущен, в очереди %d векторов", consumer, queue_length())
+    failures = 0
+    while True:
+        try:
+            flushed = flush_once(SessionLocal, consumer, batch_size, block_ms=1000)
+            failures = 0
+            if flushed:
+                logger.info("Обработано векторов: %d", flushed)
+            elif once:
+                return
+        except Exception as e:
+            # Неподтверждённые записи остаются в очереди и будут перечитаны
+            failures += 1
+            delay = min(ERROR_BACKOFF_START * 2 ** (failures - 1), ERROR_BACKOFF_MAX)
+            logger.error("Ошибка выгрузки векторов (повтор через %d с): %s", delay, e, exc_info=True)
+            if once:
+                raise
+            time.sleep(delay)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Выгрузка write-behind очереди векторов лиц в Qdrant")
+    parser.add_argument("--consumer", default="flusher", help="Имя consumer в Redis group (зависшие записи других consumer забираются через XAUTOCLAIM)")
+    parser.add_argument("--batch", type=int, default=settings.VECTOR_FLUSH_BATCH, help="Размер пачки upsert")
+    parser.add_argument("--once", action="store_true", help="Выгрузить очередь и завершиться")
+    parser.add_argument("--replay-dead", action="store_true", help="Вернуть записи из {stream}:dead в очередь и завершиться")
+    args = parser.parse_args()
+    if args.replay_dead:
+        print(f"♻️  Возвращено в очередь: {replay_dead_letters()} записей")
+    else:
+        main(args.consumer, args.batch, args.once)
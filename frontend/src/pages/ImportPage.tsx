@@ -2,6 +2,9 @@ import { useState, useCallback, useEffect } from 'react';
 import { useDropzone } from 'react-dropzone';
 import { importApi, groupsApi } from '@/services/api';
 
+const JOB_POLL_MS = 3000;
+const isTerminal = (job: any) => job?.status === 'done' || job?.status === 'failed';
+
 export default function ImportPage() {
     const [groups, setGroups] = useState<any[]>([]);
     const [groupId, setGroupId] = useState('');
@@ -21,19 +24,65 @@ export default function ImportPage() {
 
     const { getRootProps, getInputProps, isDragActive } = useDropzone({ onDrop, accept: { 'application/zip': ['.zip'] }, maxFiles: 1 });
 
+    // Прогрес задачі: потік SSE, а якщо він недоступний або обірвався — опитування до done/failed
+    const trackJob = async (job: any) => {
+        let last = job;
+        setResult(job);
+        try {
+            await importApi.watchJob(job.id, j => { last = j; setResult(j); });
+        } catch { }
+        while (!isTerminal(last)) {
+            await new Promise(resolve => setTimeout(resolve, JOB_POLL_MS));
+            try {
+                const { data } = await importApi.job(job.id);
+                last = data;
+                setResult(data);
+            } catch (e: any) {
+                // 404 — задача зникла (TTL), далі опитувати немає сенсу
+                if (e.response?.status === 404) throw e;
+            }
+        }
+        if (last.status === 'failed') setResult({ ...last, error: last.error || 'Помилка імпорту' });
+    };
+
     const handleImport = async () => {
         if (!file) return;
         setLoading(true);
         setResult(null);
         try {
+            // Архив завантажується, сам імпорт іде у фоні
             const { data } = await importApi.upload(file, useExisting ? '' : newGroupName, useExisting ? groupId : '');
-            setResult(data);
+            await trackJob(data);
         } catch (e: any) {
             setResult({ error: e.response?.data?.detail || 'Помилка імпорту' });
         }
         setLoading(false);
     };
 
+    // Повтор упалого імпорту: архів лишився на сервері, імпорт продовжиться з останньої пачки
+    const handleRetry = async () => {
+        setLoading(true);
+        try {
+            const { data } = await importApi.retry(result.id);
+            await trackJob(data);
+        } catch (e: any) {
+            setResult({ ...result, error: e.response?.data?.detail || 'Помилка імпорту' });
+        }
+        setLoading(false);
+    };
+
+    const handleDiscard = async () => {
+        try {
+            await importApi.discard(result.id);
+            setResult(null);
+        } catch (e: any) {
+            setResult({ ...result, error: e.response?.data?.detail || 'Помилка імпорту' });
+        }
+    };
+
+    const jobDone = result?.status === 'done';
+    const progress = result?.progress;
+
     return (
         <div className="animate-fade-in">
             <h1 style={{ fontSize: '24px', fontWeight: 800, marginBottom: '24px', color: 'var(--fw-primary)', textTransform: 'uppercase', letterSpacing: '2px', textShadow: 'var(--fw-glow-primary)' }}>
@@ -51,7 +100,7 @@ export default function ImportPage() {
                     ) : (
                         <div>
                             <p style={{ fontSize: '16px', fontWeight: 700, marginBottom: '8px', textTransform: 'uppercase', color: 'var(--fw-primary)' }}>[ ПЕРЕТЯГНІТЬ ZIP-АРХІВ СЮДИ ]</p>
-                            <p style={{ fontSize: '13px', textTransform: 'uppercase', color: 'var(--fw-text-muted)' }}>ФОРМАТ: ЕКСПОРТ TELEGRAM DESKTOP (MESSAGES.HTML + PHOTOS/)</p>
+                            <p style={{ fontSize: '13px', textTransform: 'uppercase', color: 'var(--fw-text-muted)' }}>ФОРМАТ: ЕКСПОРТ TELEGRAM DESKTOP (MESSAGES.HTML АБО RESULT.JSON + PHOTOS/)</p>
                         </div>
                     )}
                 </div>
@@ -80,10 +129,29 @@ export default function ImportPage() {
             {result && (
                 <div className={`glass-card animate-slide-up`} style={{ padding: '20px' }}>
                     {result.error ? (
-                        <div style={{ color: 'var(--fw-danger)' }}>❌ {result.error}</div>
+                        <div>
+                            <div style={{ color: 'var(--fw-danger)' }}>❌ {result.error}</div>
+                            {result.id && result.status === 'failed' && (
+                                <div style={{ marginTop: '12px', display: 'flex', gap: '8px' }}>
+                                    <button className="btn-primary" onClick={handleRetry} disabled={loading}>
+                                        [ ПОВТОРИТИ ІМПОРТ ]
+                                    </button>
+                                    <button className="btn-secondary" onClick={handleDiscard} disabled={loading}>
+                                        [ ВИДАЛИТИ АРХІВ ]
+                                    </button>
+                                </div>
+                            )}
+                        </div>
                     ) : (
                         <div>
-                            <h3 style={{ fontSize: '18px', fontWeight: 600, marginBottom: '16px', color: '#22c55e', textTransform: 'uppercase', letterSpacing: '1px' }}>[ ІМПОРТ ЗАВЕРШЕНО ]</h3>
+                            <h3 style={{ fontSize: '18px', fontWeight: 600, marginBottom: '16px', color: jobDone ? '#22c55e' : 'var(--fw-primary)', textTransform: 'uppercase', letterSpacing: '1px' }}>
+                                {jobDone ? '[ ІМПОРТ ЗАВЕРШЕНО ]' : result.status === 'queued' ? '[ У ЧЕРЗІ... ]' : '[ ВИКОНУЄТЬСЯ ІМПОРТ... ]'}
+                            </h3>
+                            {!jobDone && progress?.members_total > 0 && (
+                                <p style={{ fontSize: '13px', color: 'var(--fw-text-muted)', marginBottom: '12px' }}>
+                                    Файлів оброблено: {progress.members_done} / {progress.members_total}{progress.member ? ` · ${progress.member}` : ''}
+                                </p>
+                            )}
                             <div style={{ display: 'grid', gridTemplateColumns: 'repeat(auto-fit, minmax(140px, 1fr))', gap: '12px' }}>
                                 <div className="stat-card">
                                     <span className="stat-value">{result.stats?.messages || 0}</span>
@@ -1,6 +1,6 @@
 import { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { messagesApi, groupsApi } from '@/services/api';
+import { messagesApi, groupsApi, thumbUrl } from '@/services/api';
 
 export default function MessagesPage() {
     const [messages, setMessages] = useState<any[]>([]);
@@ -134,7 +134,7 @@ export default function MessagesPage() {
                             )}
                             {msg.photo_path && (
                                 <img
-                                    src={`/files/${msg.photo_path.replace(/^\/mnt\/qnap_photos\//, '')}`}
+                                    src={thumbUrl(msg.photo_path, 640)}
                                     alt="photo"
                                     style={{ maxWidth: 300, borderRadius: 'var(--fw-radius-sm)', marginTop: '8px' }}
                                     onError={(e) => (e.currentTarget.style.display = 'none')}
@@ -2,7 +2,7 @@
 import { useState, useCallback, useEffect } from 'react';
 import { useDropzone } from 'react-dropzone';
 import { useSearchParams } from 'react-router-dom';
-import { searchApi } from '@/services/api';
+import { searchApi, fileUrl, thumbUrl } from '@/services/api';
 
 export default function SearchPage() {
     const [tab, setTab] = useState<'photo' | 'text' | 'phone'>('photo');
@@ -304,7 +304,7 @@ export default function SearchPage() {
 
                                                     <div style={{ width: '100%', aspectRatio: '1/1', background: '#000', borderRadius: '4px', overflow: 'hidden', marginBottom: '8px' }}>
                                                         <img
-                                                            src={`/files/${(match.crop_path || match.photo_path || '').replace(/^\/mnt\/qnap_photos\//, '')}`}
+                                                            src={thumbUrl(match.crop_path || match.photo_path, 320)}
                                                             alt="matched face"
                                                             style={{ width: '100%', height: '100%', objectFit: 'cover' }}
                                                             onError={(e) => { (e.target as HTMLImageElement).style.display = 'none'; }}
@@ -391,7 +391,7 @@ export default function SearchPage() {
                                 {r.photo_path && (
                                     <div style={{ flexShrink: 0, width: '80px', height: '80px', borderRadius: '8px', overflow: 'hidden', background: '#000' }}>
                                         <img
-                                            src={`/files/${(r.photo_path || '').replace(/^\/mnt\/qnap_photos\//, '')}`}
+                                            src={thumbUrl(r.photo_path, 160)}
                                             alt="photo"
                                             style={{ width: '100%', height: '100%', objectFit: 'cover' }}
                                             onError={(e) => { (e.target as HTMLImageElement).style.display = 'none'; }}
@@ -433,7 +433,7 @@ export default function SearchPage() {
                             {(expandedMatch.photo_path || expandedMatch.crop_path) && (
                                 <div style={{ flex: '1 1 500px', display: 'flex', flexDirection: 'column', gap: '16px', alignItems: 'center' }}>
                                     <img
-                                        src={`/files/${(expandedMatch.photo_path || expandedMatch.crop_path || '').replace(/^\/mnt\/qnap_photos\//, '')}`}
+                                        src={fileUrl(expandedMatch.photo_path || expandedMatch.crop_path)}
                                         alt="expanded match"
                                         style={{ width: '75%', borderRadius: 'var(--fw-radius)', border: expandedMatch.similarity !== null && expandedMatch.similarity !== undefined ? `3px solid ${expandedMatch.similarity > 80 ? 'var(--fw-success, #22c55e)' : 'var(--fw-warning, #f59e0b)'}` : '3px solid var(--fw-primary, #3b82f6)', objectFit: 'contain', maxHeight: '40vh' }}
                                     />
@@ -464,7 +464,7 @@ export default function SearchPage() {
                                                 {msg.sender_name && <b style={{ color: 'var(--fw-text)' }}>{msg.sender_name}: </b>}
                                                 {msg.text}
                                                 {msg.photo_path && (
-                                                    <img src={`/files/${msg.photo_path.replace(/^\/mnt\/qnap_photos\//, '')}`} alt="context before" style={{ width: '50%', borderRadius: '8px', marginTop: '8px', display: 'block', maxHeight: '200px', objectFit: 'contain' }} />
+                                                    <img src={thumbUrl(msg.photo_path, 320)} alt="context before" style={{ width: '50%', borderRadius: '8px', marginTop: '8px', display: 'block', maxHeight: '200px', objectFit: 'contain' }} />
                                                 )}
                                                 {!msg.text && !msg.photo_path && msg.has_photo && '📷 Фото (не завантажено)'}
                                             </div>
@@ -480,7 +480,7 @@ export default function SearchPage() {
                                             ★ {expandedMatch.context.message?.sender_name && <b style={{ color: 'var(--fw-text)' }}>{expandedMatch.context.message.sender_name}: </b>}
                                             {expandedMatch.context.message?.text}
                                             {expandedMatch.context.message?.photo_path && (
-                                                <img src={`/files/${expandedMatch.context.message.photo_path.replace(/^\/mnt\/qnap_photos\//, '')}`} alt="matched context" style={{ width: '50%', borderRadius: '8px', marginTop: '8px', display: 'block', maxHeight: '200px', objectFit: 'contain' }} />
+                                                <img src={thumbUrl(expandedMatch.context.message.photo_path, 320)} alt="matched context" style={{ width: '50%', borderRadius: '8px', marginTop: '8px', display: 'block', maxHeight: '200px', objectFit: 'contain' }} />
                                             )}
                                         </div>
 
@@ -490,7 +490,7 @@ export default function SearchPage() {
                                                 {msg.sender_name && <b style={{ color: 'var(--fw-text)' }}>{msg.sender_name}: </b>}
                                                 {msg.text}
                                                 {msg.photo_path && (
-                                                    <img src={`/files/${msg.photo_path.replace(/^\/mnt\/qnap_photos\//, '')}`} alt="context after" style={{ width: '50%', borderRadius: '8px', marginTop: '8px', display: 'block', maxHeight: '200px', objectFit: 'contain' }} />
+                                                    <img src={thumbUrl(msg.photo_path, 320)} alt="context after" style={{ width: '50%', borderRadius: '8px', marginTop: '8px', display: 'block', maxHeight: '200px', objectFit: 'contain' }} />
                                                 )}
                                                 {!msg.text && !msg.photo_path && msg.has_photo && '📷 Фото (не завантажено)'}
                                             </div>
@@ -29,6 +29,15 @@ api.interceptors.response.use(
 
 export default api;
 
+// ===== Files =====
+// Пути на QNAP → URL /files; превью — уменьшенные WebP из кэша backend (/files/thumb/{size}/...)
+const QNAP_PREFIX = /^\/mnt\/qnap_photos\//;
+
+export const fileUrl = (path?: string | null) => `/files/${(path || '').replace(QNAP_PREFIX, '')}`;
+
+export const thumbUrl = (path: string | null | undefined, size: 160 | 320 | 640) =>
+    `/files/thumb/${size}/${(path || '').replace(QNAP_PREFIX, '')}`;
+
 // ===== Auth =====
 export const authApi = {
     login: (username: string, password: string) =>
@@ -98,6 +107,34 @@ export const importApi = {
         if (groupId) fd.append('group_id', groupId);
         return api.post('/import/', fd);
     },
+    job: (jobId: string) => api.get(`/import/jobs/${jobId}`),
+    retry: (jobId: string) => api.post(`/import/jobs/${jobId}/retry`),
+    discard: (jobId: string) => api.delete(`/import/jobs/${jobId}`),
+    // Прогресс задачи импорта (SSE): onJob вызывается на каждое изменение, до done/failed
+    watchJob: async (jobId: string, onJob: (job: any) => void, signal?: AbortSignal) => {
+        const response = await fetch(`${API_BASE}/api/import/jobs/${jobId}/events`, {
+            headers: { Authorization: `Bearer ${localStorage.getItem('token') || ''}` },
+            signal,
+        });
+        if (!response.ok || !response.body) {
+            throw new Error(await response.text() || 'Import progress stream failed');
+        }
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            while (buffer.includes('\n\n')) {
+                const boundary = buffer.indexOf('\n\n');
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                const line = rawEvent.split('\n').find(part => part.startsWith('data: '));
+                if (line) onJob(JSON.parse(line.slice(6)));
+            }
+        }
+    },
 };
 
 // ===== Users =====
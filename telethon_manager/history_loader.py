@@ -1,6 +1,8 @@
 """
 history_loader.py — завантаження історії груп через Telethon.
 """
+import asyncio
+import json
 import logging
 import os
 
@@ -17,6 +19,16 @@ logger = logging.getLogger("history_loader")
 BACKEND_URL = os.getenv("BACKEND_URL", "http://backend:8000")
 TELETHON_API_KEY = os.getenv("TELETHON_API_KEY", "")
 LOCAL_TZ = ZoneInfo("Europe/Kyiv")
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "100"))
+# Повтори відправки пачки: пауза 2, 4, 8... с (не більше HISTORY_POST_MAX_DELAY)
+HISTORY_POST_RETRIES = int(os.getenv("HISTORY_POST_RETRIES", "6"))
+HISTORY_POST_MAX_DELAY = 60
+# 4xx, крім цих, — помилка в самих даних, повтор не допоможе
+RETRYABLE_STATUSES = {408, 425, 429}
+
+
+class HistoryBatchError(Exception):
+    """Backend не прийняв пачку: прогрес не просувається, наступний запуск продовжить з неї."""
 
 
 async def load_group_history(
@@ -33,109 +45,134 @@ async def load_group_history(
 
     count = 0
     last_seen_msg_id = last_message_id
+    # Буфер (поля, фото) — уходит в backend одним запросом /api/bot/messages:batch
+    batch: list[tuple[dict, bytes | None]] = []
 
-    async for msg in client.iter_messages(tg_entity, limit=None, reverse=True,
-                                          min_id=last_message_id or 0):
-        if not msg:
-            continue
-
-        ts = None
-        if msg.date:
-            ts = msg.date.astimezone(LOCAL_TZ).replace(tzinfo=None).isoformat()
+    async with httpx.AsyncClient(timeout=120) as hclient:
+        async for msg in client.iter_messages(tg_entity, limit=None, reverse=True,
+                                              min_id=last_message_id or 0):
+            if not msg:
+                continue
 
-        sender_name = ""
-        try:
-            sender = await msg.get_sender()
-            if sender:
-                sender_name = " ".join(filter(None, [
-                    getattr(sender, "first_name", ""),
-                    getattr(sender, "last_name", ""),
-                ]))
-        except Exception:
-            pass
-
-        base_data = {
-            "group_telegram_id": str(chat_id),
-            "group_name": chat_title,
-            "message_id": str(msg.id),
-            "sender_telegram_id": str(msg.sender_id or ""),
-            "sender_name": sender_name,
-            "timestamp": ts or "",
-            "source_account_id": account_id,
-            "source_type": "account",
-        }
+            ts = None
+            if msg.date:
+                ts = msg.date.astimezone(LOCAL_TZ).replace(tzinfo=None).isoformat()
 
-        posted = False
-        # Фото
-        if msg.media and isinstance(msg.media, MessageMediaPhoto):
+            sender_name = ""
             try:
-                file_bytes = await client.download_media(msg.media, bytes)
-                if file_bytes:
-                    base_data["text"] = msg.message or ""
-                    async with httpx.AsyncClient(timeout=60) as hclient:
-                        files = {"photo": ("photo.jpg", file_bytes, "image/jpeg")}
-                        response = await hclient.post(
-                            f"{BACKEND_URL}/api/bot/message",
-                            data=base_data,
-                            files=files,
-                        )
-                        if response.status_code >= 400:
-                            logger.error(f"Photo post failed: {response.status_code} {response.text}")
-                    posted = True
-            except Exception as e:
-                logger.error(f"Photo download error in history: {e}")
-
-        # Документ
-        if not posted and msg.media and isinstance(msg.media, MessageMediaDocument):
-            doc = msg.media.document
-            filename = ""
-            for attr in doc.attributes:
-                if hasattr(attr, "file_name"):
-                    filename = attr.file_name
-                    break
-            if filename.lower().endswith((".pdf", ".docx")):
+                sender = await msg.get_sender()
+                if sender:
+                    sender_name = " ".join(filter(None, [
+                        getattr(sender, "first_name", ""),
+                        getattr(sender, "last_name", ""),
+                    ]))
+            except Exception:
+                pass
+
+            base_data = {
+                "group_telegram_id": str(chat_id),
+                "group_name": chat_title,
+                "message_id": str(msg.id),
+                "sender_telegram_id": str(msg.sender_id or ""),
+                "sender_name": sender_name,
+                "timestamp": ts or "",
+                "source_account_id": account_id,
+                "source_type": "account",
+            }
+
+            queued = False
+            # Фото
+            if msg.media and isinstance(msg.media, MessageMediaPhoto):
                 try:
                     file_bytes = await client.download_media(msg.media, bytes)
                     if file_bytes:
-                        doc_text = extract_document_text(file_bytes, filename)
-                        if doc_text:
-                            base_data["text"] = msg.message or ""
-                            base_data["document_text"] = doc_text
-                            base_data["document_name"] = filename
-                            async with httpx.AsyncClient(timeout=30) as hclient:
-                                response = await hclient.post(
-                                    f"{BACKEND_URL}/api/bot/message",
-                                    data=base_data,
-                                )
-                                if response.status_code >= 400:
-                                    logger.error(f"Document post failed: {response.status_code} {response.text}")
-                            posted = True
+                        base_data["text"] = msg.message or ""
+                        batch.append((base_data, file_bytes))
+                        queued = True
                 except Exception as e:
-                    logger.error(f"Doc download error in history: {e}")
-
-        # Текст
-        if not posted and msg.message:
-            base_data["text"] = msg.message
-            try:
-                async with httpx.AsyncClient(timeout=30) as hclient:
-                    response = await hclient.post(f"{BACKEND_URL}/api/bot/message", data=base_data)
-                    if response.status_code >= 400:
-                        logger.error(f"Text post failed: {response.status_code} {response.text}")
-            except Exception as e:
-                logger.error(f"Post text error: {e}")
-
-        count += 1
-        last_seen_msg_id = msg.id
-
-        if count % 100 == 0:
-            logger.info(f"History progress: {count} messages for group {group_id}")
-            await _update_progress(account_id, group_id, count, last_seen_msg_id)
+                    logger.error(f"Photo download error in history: {e}")
+
+            # Документ
+            if not queued and msg.media and isinstance(msg.media, MessageMediaDocument):
+                doc = msg.media.document
+                filename = ""
+                for attr in doc.attributes:
+                    if hasattr(attr, "file_name"):
+                        filename = attr.file_name
+                        break
+                if filename.lower().endswith((".pdf", ".docx")):
+                    try:
+                        file_bytes = await client.download_media(msg.media, bytes)
+                        if file_bytes:
+                            doc_text = extract_document_text(file_bytes, filename)
+                            if doc_text:
+                                base_data["text"] = msg.message or ""
+                                base_data["document_text"] = doc_text
+                                base_data["document_name"] = filename
+                                batch.append((base_data, None))
+                                queued = True
+                    except Exception as e:
+                        logger.error(f"Doc download error in history: {e}")
+
+            # Текст
+            if not queued and msg.message:
+                base_data["text"] = msg.message
+                batch.append((base_data, None))
+
+            count += 1
+            last_seen_msg_id = msg.id
+
+            if len(batch) >= HISTORY_BATCH_SIZE:
+                if not await _post_batch(hclient, batch):
+                    raise HistoryBatchError(f"batch up to message {last_seen_msg_id} was not accepted")
+                batch = []
+                logger.info(f"History progress: {count} messages for group {group_id}")
+                await _update_progress(account_id, group_id, count, last_seen_msg_id)
+
+        if batch and not await _post_batch(hclient, batch):
+            raise HistoryBatchError(f"final batch up to message {last_seen_msg_id} was not accepted")
 
     # Завершення
     logger.info(f"History load complete: {count} messages for group {group_id}")
     await _update_progress(account_id, group_id, count, last_seen_msg_id, done=True)
 
 
+async def _post_batch(hclient: httpx.AsyncClient, batch: list[tuple[dict, bytes | None]]) -> bool:
+    """
+    Надсилає пачку повідомлень: NDJSON у частині messages, фото — окремими частинами.
+    Мережеві помилки та 5xx повторюються з паузою; True — backend прийняв пачку.
+    """
+    lines = []
+    files = {}
+    for index, (data, photo) in enumerate(batch):
+        item = dict(data)
+        if photo:
+            field = f"photo_{index}"
+            item["photo_field"] = field
+            files[field] = (f"{field}.jpg", photo, "image/jpeg")
+        lines.append(json.dumps(item, ensure_ascii=False))
+    files["messages"] = ("messages.ndjson", "\n".join(lines).encode(), "application/x-ndjson")
+
+    for attempt in range(1, HISTORY_POST_RETRIES + 1):
+        try:
+            response = await hclient.post(f"{BACKEND_URL}/api/bot/messages:batch", files=files)
+            if response.status_code < 400:
+                result = response.json()
+                logger.info(
+                    f"Batch posted: {result.get('received')} received, "
+                    f"{result.get('inserted')} inserted, {result.get('duplicates')} duplicates"
+                )
+                return True
+            logger.error(f"Batch post failed (attempt {attempt}): {response.status_code} {response.text}")
+            if response.status_code < 500 and response.status_code not in RETRYABLE_STATUSES:
+                return False
+        except Exception as e:
+            logger.error(f"Batch post error (attempt {attempt}): {e}")
+        if attempt < HISTORY_POST_RETRIES:
+            await asyncio.sleep(min(2 ** attempt, HISTORY_POST_MAX_DELAY))
+    return False
+
+
 async def _update_progress(
     account_id: str,
     group_id: str,